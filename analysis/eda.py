@@ -1,9 +1,10 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-from sqlalchemy import create_engine
 import logging
-from dashboard.config import DB_URL, OUTPUTS_PATH, LOG_PATH
+from dashboard.config import OUTPUTS_PATH, LOG_PATH
+from dashboard.backend import get_backend
+from dashboard.kpi_client import fetch_kpi
 
 # --- Setup logging ---
 EDA_LOG = LOG_PATH / "eda.log"
@@ -13,8 +14,8 @@ logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(message)s",
 )
 
-# --- Database engine ---
-engine = create_engine(DB_URL)
+# --- Query backend (raw rows); aggregates come from the shared KPI definitions ---
+backend = get_backend()
 
 # --- Output folder for plots ---
 PLOTS_PATH = OUTPUTS_PATH / "plots"
@@ -42,7 +43,7 @@ def summary_stats(df: pd.DataFrame, col: str):
 
 # --- EDA Functions ---
 def eda_delivery_times():
-    orders = pd.read_sql("SELECT * FROM orders_transformed", engine)
+    orders = backend.query("SELECT * FROM orders_transformed")
     stats = summary_stats(orders, "delivery_time_days")
     print("\n📊 Delivery Time Stats:", stats)
     fig, ax = plt.subplots(figsize=(8, 5))
@@ -51,7 +52,7 @@ def eda_delivery_times():
     save_plot(fig, "delivery_times_distribution.png")
 
 def eda_late_deliveries():
-    orders = pd.read_sql("SELECT * FROM orders_transformed", engine)
+    orders = backend.query("SELECT * FROM orders_transformed")
     fig, ax = plt.subplots(figsize=(6, 4))
     sns.countplot(x="late_delivery_flag", data=orders, ax=ax)
     ax.set_title("Late Delivery Flag Distribution")
@@ -62,14 +63,9 @@ def eda_late_deliveries():
     logging.info(f"% Late deliveries: {late_pct:.2f}%")
 
 def eda_revenue_trends():
-    orders = pd.read_sql(
-        "SELECT order_purchase_timestamp, payment_value FROM orders_transformed", engine
-    )
-    orders["order_purchase_timestamp"] = pd.to_datetime(orders["order_purchase_timestamp"])
-    orders["month"] = orders["order_purchase_timestamp"].dt.to_period("M")
-    monthly_revenue = orders.groupby("month")["payment_value"].sum().reset_index()
+    monthly_revenue = fetch_kpi("monthly_revenue")
     fig, ax = plt.subplots(figsize=(10, 5))
-    sns.lineplot(x="month", y="payment_value", data=monthly_revenue, marker="o", ax=ax)
+    sns.lineplot(x="month", y="total_revenue", data=monthly_revenue, marker="o", ax=ax)
     ax.set_title("Monthly Revenue Trend")
     ax.set_ylabel("Revenue (R$)")
     ax.set_xlabel("Month")
@@ -80,17 +76,7 @@ def eda_revenue_trends():
 
 # --- NEW KPI Plots ---
 def eda_revenue_by_category():
-    df = pd.read_sql(
-        """
-        SELECT p.product_category_name_english AS category,
-               SUM(oi.price + oi.freight_value) AS total_revenue
-        FROM order_items_fact oi
-        JOIN products_dim p ON oi.product_id = p.product_id
-        GROUP BY category
-        ORDER BY total_revenue DESC
-        LIMIT 15;
-        """, engine
-    )
+    df = fetch_kpi("revenue_by_category", limit=15)
     fig, ax = plt.subplots(figsize=(10, 6))
     sns.barplot(x="total_revenue", y="category", data=df, ax=ax)
     ax.set_title("Top 15 Categories by Revenue")
@@ -98,18 +84,7 @@ def eda_revenue_by_category():
     print("\n💰 Revenue by category plot saved.")
 
 def eda_top_products():
-    df = pd.read_sql(
-        """
-        SELECT p.product_category_name_english AS category,
-               oi.product_id,
-               SUM(oi.price + oi.freight_value) AS total_revenue
-        FROM order_items_fact oi
-        JOIN products_dim p ON oi.product_id = p.product_id
-        GROUP BY oi.product_id, category
-        ORDER BY total_revenue DESC
-        LIMIT 10;
-        """, engine
-    )
+    df = fetch_kpi("top_products", limit=10)
     fig, ax = plt.subplots(figsize=(10, 6))
     sns.barplot(x="total_revenue", y="product_id", data=df, ax=ax)
     ax.set_title("Top 10 Products by Revenue")
@@ -117,15 +92,7 @@ def eda_top_products():
     print("\n🏆 Top products plot saved.")
 
 def eda_conversion_funnel():
-    df = pd.read_sql(
-        """
-        SELECT
-            COUNT(DISTINCT order_id) AS placed_orders,
-            SUM(approved_flag) AS approved_orders,
-            SUM(delivered_flag) AS delivered_orders
-        FROM orders_transformed;
-        """, engine
-    )
+    df = fetch_kpi("conversion_funnel")
     stages = ["Placed", "Approved", "Delivered"]
     values = [df["placed_orders"][0], df["approved_orders"][0], df["delivered_orders"][0]]
     fig, ax = plt.subplots(figsize=(8, 5))
@@ -135,31 +102,29 @@ def eda_conversion_funnel():
     print("\n🔄 Conversion funnel plot saved.")
 
 def eda_avg_order_value():
-    df = pd.read_sql(
-        "SELECT ROUND(SUM(payment_value) * 1.0 / COUNT(DISTINCT order_id), 2) AS avg_order_value FROM orders_transformed;",
-        engine
-    )
+    df = fetch_kpi("average_order_value")
     avg_val = df["avg_order_value"][0]
     print(f"\n📦 Average Order Value: R$ {avg_val}")
     logging.info(f"Average order value = {avg_val}")
 
 def eda_repeat_purchase_rate():
-    df = pd.read_sql(
-        """
-        SELECT ROUND(
-            100.0 * SUM(CASE WHEN order_count > 1 THEN 1 ELSE 0 END) / COUNT(*), 2
-        ) AS repeat_purchase_rate_pct
-        FROM (
-            SELECT customer_id, COUNT(order_id) AS order_count
-            FROM orders_transformed
-            GROUP BY customer_id
-        );
-        """, engine
-    )
-    rate = df["repeat_purchase_rate_pct"][0]
+    df = fetch_kpi("repeat_purchase_rate")
+    rate = df["repeat_purchase_rate"][0]
     print(f"\n🔁 Repeat Purchase Rate: {rate}%")
     logging.info(f"Repeat purchase rate = {rate}%")
 
+def eda_cohort_retention():
+    df = fetch_kpi("cohort_retention", max_period=12)
+    df = df[df["period"] >= 1]
+    pivot = df.pivot(index="cohort_month", columns="period", values="retention_rate")
+    fig, ax = plt.subplots(figsize=(12, 6))
+    sns.heatmap(pivot, annot=True, fmt=".1f", cmap="YlGnBu", ax=ax)
+    ax.set_title("Monthly Cohort Retention (%)")
+    ax.set_xlabel("Months Since First Purchase")
+    ax.set_ylabel("Cohort")
+    save_plot(fig, "cohort_retention.png")
+    print("\n🧭 Cohort retention heatmap saved.")
+
 # --- Main Runner ---
 def run_eda():
     print("🔍 Running EDA...\n")
@@ -176,6 +141,7 @@ def run_eda():
     eda_conversion_funnel()
     eda_avg_order_value()
     eda_repeat_purchase_rate()
+    eda_cohort_retention()
 
     logging.info("Completed EDA analysis")
     print("\n✅ EDA finished! Plots saved to outputs/plots/")
@@ -0,0 +1,116 @@
+import time
+import logging
+import statistics
+import pandas as pd
+from dashboard.config import OUTPUTS_PATH
+from dashboard.backend import BACKENDS, get_backend
+
+# --- Logging setup ---
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+BENCH_PATH = OUTPUTS_PATH / "benchmarks"
+BENCH_PATH.mkdir(parents=True, exist_ok=True)
+
+# Aggregate KPI SQL, run unchanged on every backend
+KPI_QUERIES = {
+    "revenue_by_category": """
+        SELECT p.product_category_name_english AS category,
+               SUM(oi.price + oi.freight_value) AS total_revenue
+        FROM order_items_fact oi
+        JOIN products_dim p ON oi.product_id = p.product_id
+        GROUP BY category
+        ORDER BY total_revenue DESC
+        LIMIT 15;
+    """,
+    "average_order_value": """
+        SELECT ROUND(SUM(payment_value) * 1.0 / COUNT(DISTINCT order_id), 2) AS avg_order_value
+        FROM payments_fact;
+    """,
+    "payment_methods": """
+        SELECT payment_type, COUNT(*) AS count, SUM(payment_value) AS total_value
+        FROM payments_fact
+        GROUP BY payment_type
+        ORDER BY total_value DESC;
+    """,
+    "monthly_revenue": """
+        SELECT o.purchase_month AS month,
+               ROUND(SUM(oi.price + oi.freight_value), 2) AS total_revenue
+        FROM orders_transformed o
+        JOIN order_items_fact oi ON o.order_id = oi.order_id
+        GROUP BY month
+        ORDER BY month;
+    """,
+    "top_states": """
+        SELECT c.customer_state AS state,
+               ROUND(SUM(oi.price + oi.freight_value), 2) AS total_revenue
+        FROM order_items_fact oi
+        JOIN orders_fact o ON oi.order_id = o.order_id
+        JOIN customers_dim c ON o.customer_id = c.customer_id
+        GROUP BY state
+        ORDER BY total_revenue DESC
+        LIMIT 10;
+    """,
+    "top_sellers": """
+        SELECT s.seller_id,
+               COUNT(DISTINCT oi.order_id) AS order_count,
+               ROUND(SUM(oi.price + oi.freight_value), 2) AS total_revenue
+        FROM order_items_fact oi
+        JOIN sellers_dim s ON oi.seller_id = s.seller_id
+        GROUP BY s.seller_id
+        ORDER BY total_revenue DESC
+        LIMIT 10;
+    """,
+}
+
+
+def time_query(backend, sql: str, repeat: int):
+    """Run a query `repeat` times and return (median seconds, last result)."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = backend.query(sql)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), df
+
+
+def same_result(a: pd.DataFrame, b: pd.DataFrame) -> bool:
+    """Compare two results ignoring dtype differences between engines."""
+    if a.shape != b.shape:
+        return False
+    try:
+        pd.testing.assert_frame_equal(
+            a.reset_index(drop=True), b.reset_index(drop=True),
+            check_dtype=False, check_exact=False, rtol=1e-6
+        )
+    except AssertionError:
+        return False
+    return True
+
+
+def run_benchmark(backends=None, repeat: int = 5) -> pd.DataFrame:
+    """Time every KPI query on every backend and check the results agree."""
+    backends = [get_backend(name) for name in (backends or BACKENDS)]
+    rows = []
+    for name, sql in KPI_QUERIES.items():
+        results = {}
+        row = {"kpi": name}
+        for backend in backends:
+            row[f"{backend.name}_ms"], results[backend.name] = time_query(backend, sql, repeat)
+            row[f"{backend.name}_ms"] = round(row[f"{backend.name}_ms"] * 1000, 2)
+        frames = list(results.values())
+        row["results_match"] = all(same_result(frames[0], other) for other in frames[1:])
+        rows.append(row)
+        logger.info(f"⏱️ {row}")
+    report = pd.DataFrame(rows)
+    csv_path = BENCH_PATH / "backend_benchmark.csv"
+    report.to_csv(csv_path, index=False)
+    logger.info(f"✅ Benchmark saved to {csv_path}")
+    return report
+
+
+if __name__ == "__main__":
+    print(run_benchmark().to_string(index=False))
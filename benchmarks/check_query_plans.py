@@ -0,0 +1,212 @@
+import re
+import sys
+import json
+import logging
+import argparse
+from pathlib import Path
+import pandas as pd
+from dashboard.config import DB_URL, OUTPUTS_PATH
+from dashboard.backend import SQLiteBackend
+from dashboard.kpis import KPIS, EXPLORER_ENTITIES, kpi_params
+from etl.partitions import route_partitions
+from etl.seller_scorecard import SCORECARD_METRICS
+
+# --- Logging setup ---
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+BENCH_PATH = OUTPUTS_PATH / "benchmarks"
+BENCH_PATH.mkdir(parents=True, exist_ok=True)
+
+BASELINE_PATH = Path(__file__).resolve().parent / "query_plan_baseline.json"
+
+# Filters the date-filterable KPIs are also checked with (they route to month partitions)
+DATE_FILTER = {"start_date": "2017-03-01", "end_date": "2017-05-31"}
+SEARCH_TERM = "entrega"
+
+_PARTITION = re.compile(r"_p\d{6}\b")
+_SCAN = re.compile(r"^SCAN (\S+)(.*)$")
+_SEARCH = re.compile(r"^SEARCH (\S+) USING (.*?)(?: \(.*\))?$")
+_INDEX = re.compile(r"(?:COVERING )?INDEX (\S+)")
+
+
+class ExplainingBackend(SQLiteBackend):
+    """SQLite backend that records the EXPLAIN QUERY PLAN of every query it runs."""
+
+    def __init__(self, db_url: str = DB_URL):
+        super().__init__(db_url)
+        self.plans = []
+
+    def query(self, sql: str, params=None, date_bounds=None) -> pd.DataFrame:
+        with self.engine.connect() as conn:
+            if date_bounds:
+                sql = route_partitions(conn, sql, *date_bounds)
+            self.plans.append(
+                conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", tuple(params) if params else ()).fetchall()
+            )
+        return super().query(sql, params)
+
+
+def summarize_plan(rows) -> dict:
+    """EXPLAIN QUERY PLAN rows -> full scans, temp B-trees and indexes used.
+
+    Month partitions are folded into one name (orders_fact_p*), so the summary
+    does not depend on how many months the database holds. Scans of subqueries
+    and CTEs are not table scans; an automatic index is, since SQLite builds it
+    by scanning the table on every execution.
+    """
+    derived = {detail.split(" ", 1)[1] for *_, detail in rows if detail.startswith(("CO-ROUTINE ", "MATERIALIZE "))}
+    scans, temp_btrees, indexes = set(), set(), set()
+    for *_, detail in rows:
+        detail = _PARTITION.sub("_p*", detail)
+        if detail.startswith("USE TEMP B-TREE FOR "):
+            temp_btrees.add(detail[len("USE TEMP B-TREE FOR "):])
+        elif match := _SCAN.match(detail):
+            target, rest = match.groups()
+            if index := _INDEX.search(rest):
+                indexes.add(index.group(1))
+            elif target not in derived and "VIRTUAL TABLE" not in rest and target != "CONSTANT":
+                scans.add(target)
+        elif match := _SEARCH.match(detail):
+            target, how = match.groups()
+            if how.startswith("AUTOMATIC"):
+                scans.add(target)
+            elif index := _INDEX.search(how):
+                indexes.add(index.group(1))
+            else:
+                indexes.add(how)  # INTEGER PRIMARY KEY / PRIMARY KEY
+    return {"full_scans": sorted(scans), "temp_btrees": sorted(temp_btrees), "indexes": sorted(indexes)}
+
+
+def plan_cases(backend) -> dict:
+    """Case label -> (KPI, params): every KPI with defaults, plus the variants the dashboard issues."""
+    cases = {}
+
+    def add(name, label=None, **params):
+        cases[label or name + "".join(f"[{k}={v}]" for k, v in params.items())] = (name, params)
+
+    for name in KPIS:
+        declared = kpi_params(name)
+        if name == "review_search":
+            add(name, query=SEARCH_TERM)
+        elif name == "seller_detail":
+            continue
+        else:
+            add(name)
+        if "start_date" in declared:
+            add(name, f"{name}[dates]", **DATE_FILTER)
+
+    for metric in SCORECARD_METRICS:
+        for worst in (False, True):
+            add("seller_scorecard", metric=metric, worst=worst)
+    top_seller = backend.query("SELECT seller_id FROM seller_scorecard LIMIT 1;")["seller_id"]
+    if not top_seller.empty:
+        add("seller_detail", "seller_detail[seller]", seller_id=top_seller.iloc[0])
+    add("product_sentiment", worst=True)
+    add("late_risk_orders", band="high")
+
+    filters = backend.query("SELECT customer_state, category FROM distinct_sketches LIMIT 1;")
+    if not filters.empty:
+        add("distinct_counts", "distinct_counts[filtered]",
+            states=[filters.iloc[0, 0]], categories=[filters.iloc[0, 1]], **DATE_FILTER)
+        add("distinct_counts", "distinct_counts[filtered, exact]",
+            states=[filters.iloc[0, 0]], categories=[filters.iloc[0, 1]], exact=True, **DATE_FILTER)
+        add("late_risk_orders", "late_risk_orders[state]", states=[filters.iloc[0, 0]], min_risk=0.5)
+
+    # Every explorer sort, first page and a deeper page from the first page's last row
+    for entity, spec in EXPLORER_ENTITIES.items():
+        for sort in spec["sort"]:
+            for descending in (True, False):
+                params = {"entity": entity, "sort": sort, "descending": descending, "page_size": 5}
+                label = f"explore_page[{entity}, {sort} {'desc' if descending else 'asc'}]"
+                add("explore_page", label, **params)
+                page = KPIS["explore_page"]["compute"](backend, **params)
+                if len(page):
+                    cursor = [v.item() if hasattr(v, "item") else v for v in page[[sort, spec["key"]]].iloc[-1]]
+                    cursor = [str(v) if isinstance(v, pd.Timestamp) else v for v in cursor]
+                    add("explore_page", f"{label}[cursor]", **params, cursor=cursor)
+    return cases
+
+
+def collect_plans(db_url: str = DB_URL) -> dict:
+    """Run every case against the database and summarize the plans of the queries it issued."""
+    backend = ExplainingBackend(db_url)
+    plans = {}
+    try:
+        for label, (name, params) in plan_cases(backend).items():
+            backend.plans = []
+            KPIS[name]["compute"](backend, **params)
+            rows = [row for plan in backend.plans for row in plan]
+            plans[label] = {"kpi": name, **summarize_plan(rows), "plan": [_PARTITION.sub("_p*", r[-1]) for r in rows]}
+    finally:
+        backend.close()
+    return plans
+
+
+def compare(plans: dict, baseline: dict) -> pd.DataFrame:
+    """One row per case: new full scans / temp B-trees against the baseline."""
+    rows = []
+    for label, plan in plans.items():
+        base = baseline.get(label)
+        row = {"case": label, "kpi": plan["kpi"], "full_scans": ", ".join(plan["full_scans"]),
+               "temp_btrees": ", ".join(plan["temp_btrees"]), "indexes": ", ".join(plan["indexes"])}
+        if base is None:
+            row.update(status="new", detail="not in baseline")
+        else:
+            new_scans = sorted(set(plan["full_scans"]) - set(base["full_scans"]))
+            new_sorts = sorted(set(plan["temp_btrees"]) - set(base["temp_btrees"]))
+            lost = sorted(set(base["indexes"]) - set(plan["indexes"]))
+            problems = [f"full scan of {t}" for t in new_scans] + [f"temp B-tree for {s}" for s in new_sorts]
+            if problems:
+                row.update(status="regressed", detail="; ".join(problems + [f"lost index {i}" for i in lost]))
+            elif lost:
+                row.update(status="changed", detail="; ".join(f"lost index {i}" for i in lost))
+            else:
+                row.update(status="ok", detail="")
+        rows.append(row)
+    for label in sorted(set(baseline) - set(plans)):
+        rows.append({"case": label, "kpi": baseline[label]["kpi"], "status": "missing", "detail": "not run"})
+    return pd.DataFrame(rows)
+
+
+def check_query_plans(db_url: str = DB_URL, update: bool = False) -> bool:
+    """Compare every KPI query plan with the baseline (or rewrite it); True when nothing regressed."""
+    plans = collect_plans(db_url)
+    if update:
+        summary = {label: {k: v for k, v in plan.items() if k != "plan"} for label, plan in sorted(plans.items())}
+        BASELINE_PATH.write_text(json.dumps(summary, indent=2) + "\n")
+        logger.info(f"✅ Baseline of {len(plans)} query plans written to {BASELINE_PATH}")
+        return True
+
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    report = compare(plans, baseline)
+    csv_path = BENCH_PATH / "query_plans.csv"
+    report.to_csv(csv_path, index=False)
+    logger.info(f"✅ Query plan report saved to {csv_path}")
+
+    failed = report[report["status"].isin(["regressed", "new"])]
+    for row in report[report["status"] != "ok"].itertuples():
+        icon = "❌" if row.status in ("regressed", "new") else "⚠️"
+        logger.info(f"{icon} {row.case}: {row.status} ({row.detail})")
+        if row.case in plans:
+            for line in plans[row.case]["plan"]:
+                logger.info(f"      {line}")
+    if failed.empty:
+        logger.info(f"✅ {len(plans)} query plans match the baseline")
+        return True
+    logger.error(
+        f"❌ {len(failed)} of {len(plans)} query plans regressed or are not in the baseline "
+        "(run with --update once a new plan is intended)"
+    )
+    return False
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check KPI query plans against the committed baseline")
+    parser.add_argument("--db-url", default=DB_URL)
+    parser.add_argument("--update", action="store_true", help="rewrite the baseline from the current plans")
+    args = parser.parse_args()
+    sys.exit(0 if check_query_plans(args.db_url, args.update) else 1)
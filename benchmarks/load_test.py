@@ -0,0 +1,447 @@
+import sys
+import time
+import random
+import logging
+import argparse
+import threading
+import tracemalloc
+from pathlib import Path
+from datetime import datetime
+from urllib.error import URLError
+from urllib.request import urlopen
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, exc
+from streamlit.testing.v1 import AppTest
+from dashboard.config import DB_URL, OUTPUTS_PATH, QUERY_BACKEND
+from dashboard.backend import BACKENDS, SQLiteBackend, reset_backends
+from dashboard.kpi_client import KPI_SERVICE_URL, fetch_kpi
+from dashboard.kpi_store import KPIStore, result_to_frame
+from dashboard.kpis import KPIS, EXPLORER_ENTITIES, compute_kpi
+from etl.db import month_label
+from etl.forecasting import MAX_HORIZON
+from etl.seller_scorecard import SCORECARD_METRICS, refresh_seller_scorecard
+from etl.product_scorecard import refresh_product_scorecard
+
+try:
+    import resource
+except ImportError:  # not available on Windows; peak RSS is then not reported
+    resource = None
+
+# --- Logging setup ---
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+BENCH_PATH = OUTPUTS_PATH / "benchmarks"
+BENCH_PATH.mkdir(parents=True, exist_ok=True)
+
+APP_PATH = Path(__file__).resolve().parent.parent / "dashboard" / "app.py"
+SCRATCH_STORE_PATH = BENCH_PATH / "load_test_kpi_store.db"
+
+# --- Simulated analysts ---
+# A session loads the dashboard page_views times. Each page view picks fresh random
+# filters: a purchase-date window (or none), the fast-preview toggle, a seller
+# ranking, a distinct-count slice and sometimes a review search or an explorer
+# browse instead of the main page.
+NO_DATE_FILTER_SHARE = 0.3
+MAX_WINDOW_MONTHS = 6
+PREVIEW_SHARE = 0.3
+EXACT_COUNTS_SHARE = 0.2
+SEARCH_SHARE = 0.3
+EXPLORER_SHARE = 0.2
+MAX_EXPLORER_PAGES = 3
+SEARCH_TERMS = ["entrega", "produto", "recomendo", "atraso", "chegou", "qualidade", "nao recebi", "otimo"]
+
+# SQLite's own busy timeout, which the lock-timing backend waits out itself
+LOCK_TIMEOUT_SECONDS = 5
+LOCK_POLL_SECONDS = 0.005
+APP_TIMEOUT_SECONDS = 300
+PERCENTILES = [50, 95, 99]
+
+
+class LockTimingBackend(SQLiteBackend):
+    """SQLite backend that waits for locks itself, so every lock wait is counted and timed.
+
+    Its connections do not wait inside SQLite (busy timeout 0): a locked database
+    raises at once and the query is retried until LOCK_TIMEOUT_SECONDS.
+    """
+
+    def __init__(self, db_url: str = DB_URL):
+        self.engine = create_engine(db_url, connect_args={"timeout": 0})
+        self.lock_waits = 0
+        self.lock_wait_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def query(self, sql: str, params=None, date_bounds=None) -> pd.DataFrame:
+        deadline = time.perf_counter() + LOCK_TIMEOUT_SECONDS
+        waited = 0.0
+        try:
+            while True:
+                try:
+                    return super().query(sql, params, date_bounds)
+                # pandas re-raises driver errors of its own queries as DatabaseError
+                except (exc.OperationalError, pd.errors.DatabaseError) as e:
+                    if "database is locked" not in str(e) or time.perf_counter() > deadline:
+                        raise
+                start = time.perf_counter()
+                time.sleep(LOCK_POLL_SECONDS)
+                waited += time.perf_counter() - start
+        finally:
+            if waited:
+                with self._lock:
+                    self.lock_waits += 1
+                    self.lock_wait_seconds += waited
+
+
+def load_domain(backend) -> dict:
+    """Values the random filters are drawn from: purchase months, states and categories."""
+    bounds = backend.query(
+        "SELECT MIN(purchase_month) AS first, MAX(purchase_month) AS last FROM orders_transformed;"
+    )
+    months = pd.period_range(month_label(bounds["first"]).iloc[0], month_label(bounds["last"]).iloc[0], freq="M")
+    filters = compute_kpi(backend, "reach_filters")
+    return {
+        "months": list(months),
+        "states": sorted(filters["customer_state"].dropna().unique()),
+        "categories": sorted(filters["category"].dropna().unique()),
+    }
+
+
+def random_window(rng: random.Random, domain: dict):
+    """(first day, last day) of a random window of whole months, or (None, None) for no filter."""
+    if rng.random() < NO_DATE_FILTER_SHARE:
+        return None, None
+    months = domain["months"]
+    first = rng.randrange(len(months))
+    last = min(first + rng.randrange(MAX_WINDOW_MONTHS), len(months) - 1)
+    return months[first].start_time.date(), months[last].end_time.date()
+
+
+# --- Page views (data path) ---
+
+def _as_params(window):
+    """Date window -> the date strings sent as KPI parameters."""
+    return tuple(str(d) if d else None for d in window)
+
+
+def main_page(fetch, rng: random.Random, domain: dict):
+    """KPI requests of one load of dashboard/app.py, in the order the page issues them."""
+    start, end = _as_params(random_window(rng, domain))
+    fast_preview = rng.random() < PREVIEW_SHARE
+
+    def section(name, **params):
+        if fast_preview and "preview" in KPIS[name]:
+            fetch(KPIS[name]["preview"], **params)
+        return fetch(name, **params)
+
+    section("revenue_by_category", start_date=start, end_date=end, limit=15)
+    section("conversion_funnel")
+    section("average_order_value", start_date=start, end_date=end)
+    fetch("repeat_purchase_rate")
+    fetch("cohort_retention", max_period=12)
+    monthly_start, monthly_end = _as_params(random_window(rng, domain))
+    section("monthly_revenue", start_date=monthly_start, end_date=monthly_end)
+    fetch("reach_filters")
+    horizon = rng.randint(1, MAX_HORIZON)
+    fetch("revenue_forecast", category=rng.choice([None] + domain["categories"]),
+          state=rng.choice([None] + domain["states"]), horizon=horizon)
+    fetch("revenue_forecast_series", horizon=horizon, limit=15)
+    fetch("payment_methods", start_date=start, end_date=end)
+    section("top_states", limit=10)
+    sellers = fetch("seller_scorecard", metric=rng.choice(list(SCORECARD_METRICS)), limit=10,
+                    min_orders=rng.randint(1, 10), worst=rng.random() < 0.5)
+    if not sellers.empty:
+        # The drill-down shows the first ranked seller until another one is picked
+        fetch("seller_detail", seller_id=sellers["seller_id"].iloc[0])
+    fetch("late_risk_by_state")
+    fetch("late_risk_orders", states=rng.sample(domain["states"], rng.randint(0, 2)),
+          min_risk=rng.choice([0.0, 0.25, 0.5]), band=rng.choice([None, "high", "elevated"]), limit=50)
+    fetch("top_products", start_date=start, end_date=end, limit=10)
+    fetch("reach_filters")
+    reach_start, reach_end = _as_params(random_window(rng, domain))
+    fetch("distinct_counts", start_date=reach_start, end_date=reach_end,
+          states=rng.sample(domain["states"], rng.randint(0, 3)),
+          categories=rng.sample(domain["categories"], rng.randint(0, 2)),
+          exact=rng.random() < EXACT_COUNTS_SHARE)
+    fetch("review_sentiment_by_score")
+    fetch("product_sentiment", min_reviews=5, limit=10, worst=True)
+    if rng.random() < SEARCH_SHARE:
+        fetch("review_search", query=rng.choice(SEARCH_TERMS), limit=20)
+
+
+def explorer_page(fetch, rng: random.Random, domain: dict):
+    """A browse of dashboard/pages/explorer.py: a random view paged forward a few times."""
+    entity = rng.choice(list(EXPLORER_ENTITIES))
+    spec = EXPLORER_ENTITIES[entity]
+    sort, descending, page_size = rng.choice(spec["sort"]), rng.random() < 0.5, rng.choice([25, 50, 100])
+    cursor = None
+    for _ in range(rng.randint(1, MAX_EXPLORER_PAGES)):
+        page = fetch("explore_page", entity=entity, sort=sort, descending=descending, cursor=cursor,
+                     page_size=page_size)
+        if len(page) <= page_size:
+            break
+        last = page.iloc[page_size - 1]
+        cursor = [v.item() if hasattr(v, "item") else v for v in (last[sort], last[spec["key"]])]
+
+
+def data_session(session: int, fetch_kpi_frame, domain: dict, page_views: int, seed: int, record):
+    """One simulated analyst issuing the dashboard's KPI requests directly."""
+    rng = random.Random(seed + session)
+
+    def fetch(name, **params):
+        start = time.perf_counter()
+        try:
+            df = fetch_kpi_frame(name, **params)
+        except Exception as e:
+            record(session, "request", name, time.perf_counter() - start, error=e)
+            raise
+        record(session, "request", name, time.perf_counter() - start)
+        return df
+
+    for _ in range(page_views):
+        page = explorer_page if rng.random() < EXPLORER_SHARE else main_page
+        start = time.perf_counter()
+        try:
+            page(fetch, rng, domain)
+        except Exception as e:
+            record(session, "page_view", page.__name__, time.perf_counter() - start, error=e)
+        else:
+            record(session, "page_view", page.__name__, time.perf_counter() - start)
+
+
+# --- Page views (full script: data + rendering) ---
+
+def app_session(session: int, domain: dict, page_views: int, seed: int, record):
+    """One simulated analyst running dashboard/app.py headless: a page load, then a filter change."""
+    rng = random.Random(seed + session)
+    for _ in range(page_views):
+        at = AppTest.from_file(str(APP_PATH), default_timeout=APP_TIMEOUT_SECONDS)
+        for step in ["page_load", "filter_change"]:
+            if step == "filter_change":
+                at.sidebar.toggle[0].set_value(rng.random() < PREVIEW_SHARE)
+                start_date, end_date = random_window(rng, domain)
+                if start_date:
+                    at.sidebar.date_input[0].set_value((start_date, end_date))
+                rank_by = next(w for w in at.selectbox if w.label == "Rank sellers by")
+                rank_by.set_value(rng.choice(list(SCORECARD_METRICS)))
+            start = time.perf_counter()
+            try:
+                at.run()
+                if at.exception:
+                    raise RuntimeError(at.exception[0].value)
+            except Exception as e:
+                record(session, "page_view", step, time.perf_counter() - start, error=e)
+                break
+            record(session, "page_view", step, time.perf_counter() - start)
+
+
+def kpi_fetcher(path: str, backend):
+    """(name, **params) -> DataFrame answering data-mode requests the `path` way."""
+    if path == "service":
+        try:
+            urlopen(f"{KPI_SERVICE_URL}/health", timeout=5).close()
+        except (URLError, ConnectionError) as e:
+            raise SystemExit(
+                f"❌ KPI service not reachable at {KPI_SERVICE_URL} ({e}); start python -m dashboard.kpi_service"
+            )
+        return fetch_kpi
+    if path == "store":
+        # A fresh store, so the run starts cold and its hits are its own
+        SCRATCH_STORE_PATH.unlink(missing_ok=True)
+        store = KPIStore(backend, path=SCRATCH_STORE_PATH)
+        return lambda name, **params: result_to_frame(store.fetch(name, params)[0]["result"])
+    return lambda name, **params: compute_kpi(backend, name, **params)
+
+
+# --- Background writes ---
+
+def writer(engine_url: str, order_ids: list, interval: float, stop: threading.Event, stats: dict, seed: int):
+    """Micro-batch style refreshes of the scorecards for random orders every `interval` seconds.
+
+    The refreshes recompute from the full history, so the data does not change;
+    they only take the write locks (and bump the data version) like a real batch.
+    """
+    rng = random.Random(seed)
+    engine = create_engine(engine_url)
+    while not stop.wait(interval):
+        batch = rng.sample(order_ids, min(50, len(order_ids)))
+        start = time.perf_counter()
+        try:
+            refresh_seller_scorecard(batch, engine)
+            refresh_product_scorecard(batch, engine)
+            stats["writes"] += 1
+        except Exception as e:
+            stats["write_errors"] += 1
+            logger.warning(f"⚠️ Background write failed: {e}")
+        stats["write_seconds"] += time.perf_counter() - start
+    engine.dispose()
+
+
+# --- Run & report ---
+
+def _rss_mb():
+    """Peak resident set size of this process so far (MB), or None where unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def latency_summary(records: pd.DataFrame) -> pd.DataFrame:
+    """Count, errors and p50/p95/p99/max latency (ms) per page-view kind and KPI."""
+    rows = []
+    for (kind, name), group in records.groupby(["kind", "name"]):
+        rows.append(_latency_row(kind, name, group))
+    for kind, group in records.groupby("kind"):
+        rows.append(_latency_row(kind, "all", group))
+    return pd.DataFrame(rows).sort_values(["kind", "name"], ignore_index=True)
+
+
+def _latency_row(kind: str, name: str, group: pd.DataFrame) -> dict:
+    ok = group.loc[group["error"].isna(), "ms"].to_numpy()
+    row = {"kind": kind, "name": name, "count": len(group), "errors": int(group["error"].notna().sum())}
+    values = np.percentile(ok, PERCENTILES) if len(ok) else [np.nan] * len(PERCENTILES)
+    row.update({f"p{p}_ms": round(float(v), 2) for p, v in zip(PERCENTILES, values)})
+    row["max_ms"] = round(float(ok.max()), 2) if len(ok) else np.nan
+    return row
+
+
+def run_load_test(sessions: int = 20, page_views: int = 5, mode: str = "data", path: str = "store",
+                  backend_name: str = None, write_interval: float = 0.0, seed: int = 0,
+                  trace_memory: bool = False):
+    """Run `sessions` concurrent simulated analysts and return (latency summary, run metrics).
+
+    mode "data" issues the dashboard's KPI requests; `path` decides how they are
+    answered: "store" (KPI results store, fresh for the run), "direct" (every
+    request queries the database) or "service" (the running KPI service).
+    mode "app" runs dashboard/app.py itself headless, rendering included; its
+    requests go through the KPI service if it runs, else the shared KPI store.
+    """
+    backend_name = (backend_name or QUERY_BACKEND).lower()
+    backend = LockTimingBackend() if backend_name == "sqlite" else BACKENDS[backend_name]()
+    domain = load_domain(backend)
+
+    fetch_kpi_frame = kpi_fetcher(path, backend) if mode == "data" else None
+
+    records, records_lock = [], threading.Lock()
+
+    def record(session, kind, name, seconds, error=None):
+        with records_lock:
+            records.append({"session": session, "kind": kind, "name": name, "ms": seconds * 1000,
+                            "error": None if error is None else f"{type(error).__name__}: {error}"})
+
+    stop, write_stats = threading.Event(), {"writes": 0, "write_errors": 0, "write_seconds": 0.0}
+    write_thread = None
+    if write_interval > 0:
+        order_ids = backend.query("SELECT order_id FROM orders_transformed;")["order_id"].tolist()
+        write_thread = threading.Thread(
+            target=writer, args=(DB_URL, order_ids, write_interval, stop, write_stats, seed), daemon=True
+        )
+
+    rss_before = _rss_mb()
+    if trace_memory:
+        tracemalloc.start()
+    # The app reads through get_backend(); it builds the lock-timing backend while the run lasts
+    swapped = mode == "app" and backend_name == "sqlite"
+    if swapped:
+        original, BACKENDS["sqlite"] = BACKENDS["sqlite"], lambda: backend
+        reset_backends()
+
+    writes = f", writes every {write_interval}s" if write_interval > 0 else ""
+    logger.info(f"🚦 {sessions} sessions x {page_views} page views "
+                f"({mode} mode, {path if mode == 'data' else 'app'} path, {backend_name} backend{writes})")
+    started = time.perf_counter()
+    try:
+        if write_thread:
+            write_thread.start()
+        with ThreadPoolExecutor(max_workers=sessions, thread_name_prefix="session") as pool:
+            if mode == "app":
+                jobs = [pool.submit(app_session, i, domain, page_views, seed, record) for i in range(sessions)]
+            else:
+                jobs = [pool.submit(data_session, i, fetch_kpi_frame, domain, page_views, seed, record)
+                        for i in range(sessions)]
+            for job in jobs:
+                job.result()
+        wall = time.perf_counter() - started
+    finally:
+        stop.set()
+        if write_thread:
+            write_thread.join()
+        if swapped:
+            BACKENDS["sqlite"] = original
+            reset_backends()
+    heap_peak = tracemalloc.get_traced_memory()[1] / 1024 ** 2 if trace_memory else None
+    if trace_memory:
+        tracemalloc.stop()
+
+    df = pd.DataFrame(records, columns=["session", "kind", "name", "ms", "error"])
+    summary = latency_summary(df)
+    pages, requests = df[df["kind"] == "page_view"], df[df["kind"] == "request"]
+    page_ms = pages.loc[pages["error"].isna(), "ms"].to_numpy()
+    page_p = np.percentile(page_ms, PERCENTILES) if len(page_ms) else [np.nan] * len(PERCENTILES)
+    run = {
+        "run_at": datetime.now().isoformat(timespec="seconds"),
+        "mode": mode,
+        "path": path if mode == "data" else "app",
+        "backend": backend_name,
+        "sessions": sessions,
+        "page_views": len(pages),
+        "requests": len(requests),
+        "errors": int(df["error"].notna().sum()),
+        "wall_s": round(wall, 2),
+        "page_views_per_s": round(len(pages) / wall, 2),
+        "requests_per_s": round(len(requests) / wall, 2),
+        **{f"page_p{p}_ms": round(float(v), 2) for p, v in zip(PERCENTILES, page_p)},
+        "rss_before_mb": rss_before,
+        "peak_rss_mb": _rss_mb(),
+        "peak_heap_mb": round(heap_peak, 1) if heap_peak is not None else None,
+        "lock_waits": getattr(backend, "lock_waits", None),
+        "lock_wait_ms": (round(backend.lock_wait_seconds * 1000, 2)
+                         if hasattr(backend, "lock_wait_seconds") else None),
+        "writes": write_stats["writes"],
+        "write_errors": write_stats["write_errors"],
+    }
+    backend.close()
+    if mode == "data" and path == "service":
+        run["lock_waits"] = run["lock_wait_ms"] = None  # the service process runs the queries
+
+    summary.to_csv(BENCH_PATH / "load_test.csv", index=False)
+    runs_path = BENCH_PATH / "load_test_runs.csv"
+    pd.DataFrame([run]).to_csv(runs_path, mode="a", header=not runs_path.exists(), index=False)
+    logger.info(f"✅ Latencies saved to {BENCH_PATH / 'load_test.csv'}; run appended to {runs_path}")
+    return summary, run
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent-session load test of the dashboard data path")
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent simulated analysts (default: 20)")
+    parser.add_argument("--page-views", type=int, default=5, help="page views per session (default: 5)")
+    parser.add_argument("--mode", choices=["data", "app"], default="data",
+                        help="data: the dashboard's KPI requests; app: run dashboard/app.py headless (default: data)")
+    parser.add_argument("--path", choices=["store", "direct", "service"], default="store",
+                        help="how data-mode requests are answered (default: store)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=None,
+                        help="query backend (default: ECOM_QUERY_BACKEND)")
+    parser.add_argument("--write-interval", type=float, default=0.0,
+                        help="seconds between background scorecard refreshes; 0 disables writes (default: 0)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the simulated filters")
+    parser.add_argument("--trace-memory", action="store_true", help="also report the Python heap peak (slower)")
+    parser.add_argument("--max-p95-ms", type=float, default=None,
+                        help="exit with status 1 if the page-view p95 latency exceeds this target")
+    args = parser.parse_args()
+
+    summary, run = run_load_test(args.sessions, args.page_views, args.mode, args.path, args.backend,
+                                 args.write_interval, args.seed, args.trace_memory)
+    print(summary.to_string(index=False))
+    print()
+    print(pd.Series(run).to_string())
+    failed = run["errors"] > 0
+    if args.max_p95_ms is not None and not run["page_p95_ms"] <= args.max_p95_ms:
+        logger.error(f"❌ Page-view p95 {run['page_p95_ms']} ms exceeds the {args.max_p95_ms} ms target")
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -4,14 +4,19 @@ from pathlib import Path
 # Add project root to Python path BEFORE any imports that need it
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-from sqlalchemy import create_engine
 from matplotlib.ticker import FuncFormatter
-from config import DB_URL
+from dashboard.backend import reset_backends
+from dashboard.kpi_client import fetch_kpi
+from dashboard.kpis import KPIS
 from etl.clean_data import run_etl
+from etl.distinct_sketches import RELATIVE_STD_ERROR
+from etl.forecasting import MAX_HORIZON
+from etl.seller_scorecard import SCORECARD_METRICS
 
 # --- Page setup ---
 st.set_page_config(
@@ -24,91 +29,161 @@ st.title("📊 E-Commerce KPI Dashboard")
 if st.button("🔄 Refresh ETL Data"):
     with st.spinner("Running ETL pipeline..."):
         run_etl()
+        reset_backends()
     st.success("✅ ETL pipeline completed. Reloading dashboard...")
     st.experimental_rerun()
 
-# --- DB Connection ---
-engine = create_engine(DB_URL)
+# --- KPIs come from the shared KPI service (python -m dashboard.kpi_service) ---
+# Without a running service they are computed in-process on ECOM_QUERY_BACKEND.
 
 # --- Helper: Currency formatter ---
 def currency(x, pos):
     return f"R$ {x:,.0f}"
 
+# --- Sidebar: purchase-date filter for the fact-table KPIs ---
+fact_dates = st.sidebar.date_input(
+    "Purchase Date Range",
+    value=[],
+    help="Filters revenue, payment and product KPIs; only the matching monthly partitions are read"
+)
+fact_start, fact_end = (str(d) for d in fact_dates) if len(fact_dates) == 2 else (None, None)
+
+# --- Sidebar: fast preview ---
+# With the toggle on, the headline KPIs are first drawn from the stratified sample
+# tables (estimates with 95% intervals); the exact results are fetched in the
+# background and replace the estimates at the end of the script run.
+fast_preview = st.sidebar.toggle(
+    "⚡ Fast preview",
+    help="Show sample-based estimates with confidence intervals first, then switch to the exact results"
+)
+
+
+@st.cache_resource
+def exact_results_pool():
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="exact-kpi")
+
+
+pending_exact = {}
+
+
+def kpi_section(name, render, **params):
+    """Render a KPI into a placeholder; in fast-preview mode its estimate first, the exact result later."""
+    slot = st.empty()
+    if fast_preview:
+        with slot.container():
+            render(fetch_kpi(KPIS[name]["preview"], **params), approximate=True)
+        pending_exact[exact_results_pool().submit(fetch_kpi, name, **params)] = (slot, render)
+    else:
+        with slot.container():
+            render(fetch_kpi(name, **params), approximate=False)
+
+
+def margin_text(row, col, fmt):
+    """'≈ value ± margin' of an estimate with its interval bounds."""
+    margin = (row[f"{col}_high"] - row[f"{col}_low"]) / 2
+    return f"≈ {fmt.format(row[col])} ± {fmt.format(margin)}"
+
+
+def error_bars(ax, df, value, position):
+    """Horizontal/vertical 95% interval bars for an estimate plotted along `position`."""
+    err = [df[value] - df[f"{value}_low"], df[f"{value}_high"] - df[value]]
+    if position == "y":
+        ax.errorbar(df[value], range(len(df)), xerr=err, fmt="none", ecolor="black", capsize=3)
+    else:
+        ax.errorbar(range(len(df)), df[value], yerr=err, fmt="none", ecolor="black", capsize=3)
+
+
+PREVIEW_CAPTION = "⚡ Estimated from the stratified sample (95% intervals); exact figures are loading..."
+
 # --- KPI 1: Revenue by Category ---
 st.header("💰 Revenue by Category")
-query = """
-SELECT p.product_category_name_english AS category,
-       SUM(oi.price + oi.freight_value) AS total_revenue
-FROM order_items_fact oi
-JOIN products_dim p ON oi.product_id = p.product_id
-GROUP BY category
-ORDER BY total_revenue DESC
-LIMIT 15;
-"""
-df_revenue = pd.read_sql(query, engine)
-
-fig, ax = plt.subplots(figsize=(10, 5))
-sns.barplot(
-    x="total_revenue",
-    y="category",
-    data=df_revenue,
-    palette="viridis",
-    ax=ax
-)
-ax.set_xlabel("Revenue (R$)")
-ax.set_ylabel("")
-ax.xaxis.set_major_formatter(FuncFormatter(currency))
-ax.set_title("Top 15 Product Categories by Revenue")
-st.pyplot(fig)
+
+
+def render_revenue_by_category(df_revenue, approximate):
+    fig, ax = plt.subplots(figsize=(10, 5))
+    sns.barplot(
+        x="total_revenue",
+        y="category",
+        data=df_revenue,
+        palette="viridis",
+        ax=ax
+    )
+    if approximate:
+        error_bars(ax, df_revenue, "total_revenue", "y")
+    ax.set_xlabel("Revenue (R$)")
+    ax.set_ylabel("")
+    ax.xaxis.set_major_formatter(FuncFormatter(currency))
+    ax.set_title("Top 15 Product Categories by Revenue")
+    st.pyplot(fig)
+    if approximate:
+        st.caption(PREVIEW_CAPTION)
+
+
+kpi_section("revenue_by_category", render_revenue_by_category, start_date=fact_start, end_date=fact_end, limit=15)
 
 # --- KPI 2: Conversion Funnel ---
 st.header("🔄 Conversion Funnel")
-funnel_q = """
-SELECT
-    COUNT(DISTINCT order_id) AS placed_orders,
-    SUM(approved_flag) AS approved_orders,
-    SUM(delivered_flag) AS delivered_orders
-FROM orders_transformed;
-"""
-funnel = pd.read_sql(funnel_q, engine).iloc[0]
 
-col1, col2, col3 = st.columns(3)
-col1.metric("📦 Orders Placed", f"{funnel['placed_orders']:,}")
-col2.metric("✅ Orders Approved", f"{funnel['approved_orders']:,}")
-col3.metric("🚚 Orders Delivered", f"{funnel['delivered_orders']:,}")
-
-funnel_df = pd.DataFrame({
-    "Stage": ["Placed", "Approved", "Delivered"],
-    "Count": [funnel['placed_orders'], funnel['approved_orders'], funnel['delivered_orders']]
-})
-fig2, ax2 = plt.subplots(figsize=(8, 4))
-sns.barplot(x="Stage", y="Count", data=funnel_df, palette="magma", ax=ax2)
-ax2.set_ylabel("Number of Orders")
-st.pyplot(fig2)
+
+def render_conversion_funnel(df_funnel, approximate):
+    funnel = df_funnel.iloc[0]
+    stages = [("📦 Orders Placed", "placed_orders"), ("✅ Orders Approved", "approved_orders"),
+              ("🚚 Orders Delivered", "delivered_orders")]
+    for col, (label, key) in zip(st.columns(3), stages):
+        col.metric(label, margin_text(funnel, key, "{:,.0f}") if approximate else f"{funnel[key]:,}")
+
+    funnel_df = pd.DataFrame({
+        "Stage": ["Placed", "Approved", "Delivered"],
+        "Count": [funnel['placed_orders'], funnel['approved_orders'], funnel['delivered_orders']]
+    })
+    fig2, ax2 = plt.subplots(figsize=(8, 4))
+    sns.barplot(x="Stage", y="Count", data=funnel_df, palette="magma", ax=ax2)
+    if approximate:
+        bounds = pd.DataFrame({
+            "Count": funnel_df["Count"],
+            "Count_low": [funnel[f"{key}_low"] for _, key in stages],
+            "Count_high": [funnel[f"{key}_high"] for _, key in stages],
+        })
+        error_bars(ax2, bounds, "Count", "x")
+    ax2.set_ylabel("Number of Orders")
+    st.pyplot(fig2)
+    if approximate:
+        st.caption(PREVIEW_CAPTION)
+
+
+kpi_section("conversion_funnel", render_conversion_funnel)
 
 # --- KPI 3: Average Order Value ---
 st.header("📦 Average Order Value")
-aov_q = """
-SELECT ROUND(SUM(payment_value) * 1.0 / COUNT(DISTINCT order_id), 2) AS avg_order_value
-FROM payments_fact;
-"""
-aov = pd.read_sql(aov_q, engine).iloc[0, 0]
-st.metric(label="Average Order Value", value=f"R$ {aov:,.2f}")
+
+
+def render_average_order_value(df_aov, approximate):
+    aov = df_aov.iloc[0]
+    value = margin_text(aov, "avg_order_value", "R$ {:,.2f}") if approximate else f"R$ {aov['avg_order_value']:,.2f}"
+    st.metric(label="Average Order Value", value=value)
+    if approximate:
+        st.caption(PREVIEW_CAPTION)
+
+
+kpi_section("average_order_value", render_average_order_value, start_date=fact_start, end_date=fact_end)
 
 # --- KPI 4: Repeat Purchase Rate ---
 st.header("🔁 Repeat Purchase Rate")
-repeat_q = """
-SELECT ROUND(
-    100.0 * COUNT(DISTINCT CASE WHEN order_count > 1 THEN customer_id END) / COUNT(DISTINCT customer_id), 2
-) AS repeat_purchase_rate
-FROM (
-    SELECT customer_id, COUNT(order_id) AS order_count
-    FROM orders_transformed
-    GROUP BY customer_id
-) sub;
-"""
-repeat = pd.read_sql(repeat_q, engine).iloc[0, 0]
-st.metric(label="Repeat Purchase Rate", value=f"{repeat}%")
+repeat = fetch_kpi("repeat_purchase_rate").iloc[0, 0]
+st.metric(label="Repeat Purchase Rate (unique customers)", value=f"{repeat}%")
+
+# --- KPI 4b: Cohort Retention ---
+st.header("🧭 Monthly Cohort Retention")
+df_retention = fetch_kpi("cohort_retention", max_period=12)
+df_retention = df_retention[df_retention["period"] >= 1]
+retention_pivot = df_retention.pivot(index="cohort_month", columns="period", values="retention_rate")
+
+fig_ret, ax_ret = plt.subplots(figsize=(12, 6))
+sns.heatmap(retention_pivot, annot=True, fmt=".1f", cmap="YlGnBu", cbar_kws={"label": "% retained"}, ax=ax_ret)
+ax_ret.set_xlabel("Months Since First Purchase")
+ax_ret.set_ylabel("Cohort (first purchase month)")
+ax_ret.set_title("Customer Retention by Acquisition Cohort")
+st.pyplot(fig_ret)
 
 # --- KPI 5: Monthly Revenue Trend ---
 st.header("📈 Monthly Revenue Trend")
@@ -119,52 +194,89 @@ date_range = st.date_input(
     help="Filter the monthly revenue trend by purchase date"
 )
 
-monthly_q = """
-SELECT 
-    strftime('%Y-%m', order_purchase_timestamp) AS month,
-    ROUND(SUM(oi.price + oi.freight_value), 2) AS total_revenue
-FROM orders_transformed o
-JOIN order_items_fact oi 
-    ON o.order_id = oi.order_id
-WHERE 1=1
-"""
-if len(date_range) == 2:
-    start_date, end_date = date_range
-    monthly_q += f" AND date(order_purchase_timestamp) BETWEEN '{start_date}' AND '{end_date}' "
-monthly_q += " GROUP BY month ORDER BY month;"
-
-df_monthly = pd.read_sql(monthly_q, engine)
-
-if not df_monthly.empty:
-    last_month_revenue = df_monthly['total_revenue'].iloc[-1]
-    if last_month_revenue == 0 or pd.isna(last_month_revenue):
-        df_monthly = df_monthly.iloc[:-1]
-
-fig3, ax3 = plt.subplots(figsize=(12, 5))
-sns.lineplot(
-    x="month",
-    y="total_revenue",
-    data=df_monthly,
-    marker="o",
-    ax=ax3,
-    color="teal"
+monthly_start, monthly_end = date_range if len(date_range) == 2 else (None, None)
+
+
+def render_monthly_revenue(df_monthly, approximate):
+    if not df_monthly.empty:
+        last_month_revenue = df_monthly['total_revenue'].iloc[-1]
+        if last_month_revenue == 0 or pd.isna(last_month_revenue):
+            df_monthly = df_monthly.iloc[:-1]
+
+    fig3, ax3 = plt.subplots(figsize=(12, 5))
+    sns.lineplot(
+        x="month",
+        y="total_revenue",
+        data=df_monthly,
+        marker="o",
+        ax=ax3,
+        color="teal"
+    )
+    if approximate:
+        ax3.fill_between(df_monthly["month"], df_monthly["total_revenue_low"], df_monthly["total_revenue_high"],
+                         color="teal", alpha=0.2)
+    ax3.set_xlabel("Month")
+    ax3.set_ylabel("Revenue (R$)")
+    ax3.yaxis.set_major_formatter(FuncFormatter(currency))
+    ax3.set_title("Revenue Trend Over Time")
+    plt.xticks(rotation=45)
+    st.pyplot(fig3)
+    if approximate:
+        st.caption(PREVIEW_CAPTION)
+
+
+kpi_section("monthly_revenue", render_monthly_revenue, start_date=monthly_start, end_date=monthly_end)
+
+# --- KPI 5b: Revenue Forecast ---
+st.header("🔮 Revenue Forecast")
+forecast_filters = fetch_kpi("reach_filters")
+col1, col2, col3 = st.columns(3)
+forecast_category = col1.selectbox(
+    "Category", ["All"] + sorted(forecast_filters["category"].dropna().unique()), key="forecast_category"
+)
+forecast_state = col2.selectbox(
+    "State", ["All"] + sorted(forecast_filters["customer_state"].dropna().unique()), key="forecast_state"
+)
+forecast_horizon = col3.slider("Months ahead", 1, MAX_HORIZON, 6, key="forecast_horizon")
+
+df_forecast = fetch_kpi(
+    "revenue_forecast",
+    category=None if forecast_category == "All" else forecast_category,
+    state=None if forecast_state == "All" else forecast_state,
+    horizon=forecast_horizon,
 )
-ax3.set_xlabel("Month")
-ax3.set_ylabel("Revenue (R$)")
-ax3.yaxis.set_major_formatter(FuncFormatter(currency))
-ax3.set_title("Revenue Trend Over Time")
+actual = df_forecast[df_forecast["kind"] == "actual"]
+# The forecast line starts at the last actual month, so the two lines join
+ahead = pd.concat([actual.tail(1), df_forecast[df_forecast["kind"] == "forecast"]])
+
+fig_fc, ax_fc = plt.subplots(figsize=(12, 5))
+ax_fc.plot(actual["month"], actual["revenue"], marker="o", color="teal", label="Actual")
+ax_fc.plot(ahead["month"], ahead["revenue"], marker="o", linestyle="--", color="darkorange", label="Forecast")
+ax_fc.fill_between(ahead["month"], ahead["revenue_low"].fillna(ahead["revenue"]),
+                   ahead["revenue_high"].fillna(ahead["revenue"]), color="darkorange", alpha=0.2,
+                   label="95% interval")
+ax_fc.set_xlabel("Month")
+ax_fc.set_ylabel("Revenue (R$)")
+ax_fc.yaxis.set_major_formatter(FuncFormatter(currency))
+ax_fc.set_title(f"Revenue Forecast: {forecast_category} / {forecast_state}")
+ax_fc.legend()
 plt.xticks(rotation=45)
-st.pyplot(fig3)
+st.pyplot(fig_fc)
+
+st.subheader(f"Largest Category × State Series, Next {forecast_horizon} Months")
+df_series = fetch_kpi("revenue_forecast_series", horizon=forecast_horizon, limit=15)
+st.dataframe(df_series.rename(columns={
+    "category": "Category",
+    "state": "State",
+    "recent_revenue": f"Last {forecast_horizon} Months (R$)",
+    "forecast_revenue": f"Next {forecast_horizon} Months (R$)",
+    "growth_pct": "Growth %"
+}))
+st.caption("Damped-trend Holt-Winters fitted to every category × state series at once; refitted when the data changes")
 
 # --- KPI 6: Payment Method Distribution ---
 st.header("💳 Payment Method Distribution")
-payment_q = """
-SELECT payment_type, COUNT(*) AS count, SUM(payment_value) AS total_value
-FROM payments_fact
-GROUP BY payment_type
-ORDER BY total_value DESC;
-"""
-df_payment = pd.read_sql(payment_q, engine)
+df_payment = fetch_kpi("payment_methods", start_date=fact_start, end_date=fact_end)
 
 col1, col2 = st.columns(2)
 with col1:
@@ -205,73 +317,107 @@ with col2:
 
 # --- KPI 7: Top 10 States by Revenue ---
 st.header("🌎 Top 10 States by Revenue")
-state_q = """
-SELECT c.customer_state AS state,
-       ROUND(SUM(oi.price + oi.freight_value), 2) AS total_revenue
-FROM order_items_fact oi
-JOIN orders_transformed o ON oi.order_id = o.order_id
-JOIN customers_dim c ON o.customer_id = c.customer_id
-GROUP BY state
-ORDER BY total_revenue DESC
-LIMIT 10;
-"""
-df_states = pd.read_sql(state_q, engine)
-
-fig6, ax6 = plt.subplots(figsize=(10, 5))
-sns.barplot(x="total_revenue", y="state", data=df_states, palette="coolwarm", ax=ax6)
-ax6.set_xlabel("Revenue (R$)")
-ax6.set_ylabel("State")
-ax6.xaxis.set_major_formatter(FuncFormatter(currency))
-ax6.set_title("Top 10 States by Revenue")
-st.pyplot(fig6)
+
+
+def render_top_states(df_states, approximate):
+    fig6, ax6 = plt.subplots(figsize=(10, 5))
+    sns.barplot(x="total_revenue", y="state", data=df_states, palette="coolwarm", ax=ax6)
+    if approximate:
+        error_bars(ax6, df_states, "total_revenue", "y")
+    ax6.set_xlabel("Revenue (R$)")
+    ax6.set_ylabel("State")
+    ax6.xaxis.set_major_formatter(FuncFormatter(currency))
+    ax6.set_title("Top 10 States by Revenue")
+    st.pyplot(fig6)
+    if approximate:
+        st.caption(PREVIEW_CAPTION)
+
+
+kpi_section("top_states", render_top_states, limit=10)
 
 # --- KPI 8: Seller Performance ---
 st.header("🛒 Seller Performance")
-seller_q = """
-SELECT s.seller_id,
-       COUNT(DISTINCT oi.order_id) AS order_count,
-       ROUND(SUM(oi.price + oi.freight_value), 2) AS total_revenue
-FROM order_items_fact oi
-JOIN sellers_dim s ON oi.seller_id = s.seller_id
-GROUP BY s.seller_id
-ORDER BY total_revenue DESC
-LIMIT 10;
-"""
-df_sellers = pd.read_sql(seller_q, engine)
-df_sellers["seller_id"] = df_sellers["seller_id"].apply(lambda x: f"***{x[-4:]}")
+metric_labels = {metric: label for metric, (label, _) in SCORECARD_METRICS.items()}
+col1, col2, col3 = st.columns(3)
+rank_by = col1.selectbox("Rank sellers by", list(SCORECARD_METRICS), format_func=metric_labels.get)
+min_orders = col2.number_input("Minimum orders", min_value=1, value=5)
+worst_first = col3.checkbox("Worst first", key="sellers_worst")
+df_sellers = fetch_kpi("seller_scorecard", metric=rank_by, limit=10, min_orders=min_orders, worst=worst_first)
+df_sellers["Seller"] = df_sellers["seller_id"].apply(lambda x: f"***{x[-4:]}")
+st.caption("All-time seller scorecard maintained by the ETL (not affected by the purchase date filter)")
 
 col1, col2 = st.columns([2, 1])
 with col1:
     fig7, ax7 = plt.subplots(figsize=(10, 5))
-    sns.barplot(x="total_revenue", y="seller_id", data=df_sellers, palette="Blues_d", ax=ax7)
-    ax7.set_xlabel("Revenue (R$)")
+    sns.barplot(x=rank_by, y="Seller", data=df_sellers, palette="Blues_d", ax=ax7)
+    ax7.set_xlabel(metric_labels[rank_by])
     ax7.set_ylabel("Seller ID")
-    ax7.xaxis.set_major_formatter(FuncFormatter(currency))
-    ax7.set_title("Top Sellers by Revenue")
+    if rank_by == "revenue":
+        ax7.xaxis.set_major_formatter(FuncFormatter(currency))
+    ax7.set_title(f"Top Sellers by {metric_labels[rank_by]}")
     st.pyplot(fig7)
 
 with col2:
-    st.dataframe(df_sellers.rename(columns={
-        "seller_id": "Seller",
+    table_cols = list(dict.fromkeys(["Seller", rank_by, "order_count"]))
+    st.dataframe(df_sellers[table_cols].rename(columns={
         "order_count": "Orders",
-        "total_revenue": "Revenue (R$)"
+        rank_by: metric_labels[rank_by]
     }))
 
+seller_pick = st.selectbox(
+    "Seller drill-down", df_sellers["seller_id"],
+    format_func=lambda x: f"***{x[-4:]}"
+)
+if seller_pick:
+    seller = fetch_kpi("seller_detail", seller_id=seller_pick).iloc[0]
+    cols = st.columns(5)
+    cols[0].metric("Revenue", f"R$ {seller['revenue']:,.2f}")
+    cols[1].metric("Orders", f"{seller['order_count']:,}")
+    cols[2].metric("Late Deliveries", "n/a" if pd.isna(seller["late_delivery_rate"]) else f"{seller['late_delivery_rate']:.1f}%")
+    cols[3].metric("Avg Review", "n/a" if pd.isna(seller["avg_review_score"]) else f"{seller['avg_review_score']:.2f} ★")
+    cols[4].metric("Avg Delivery", "n/a" if pd.isna(seller["avg_delivery_days"]) else f"{seller['avg_delivery_days']:.1f} days")
+    st.caption(f"{seller['seller_city']} / {seller['seller_state']} · {seller['items_sold']:,} items sold")
+
+# --- KPI 8b: Late-Delivery Risk of Open Orders ---
+st.header("🚚 Late-Delivery Risk (Open Orders)")
+df_risk_states = fetch_kpi("late_risk_by_state")
+col1, col2, col3 = st.columns(3)
+risk_states = col1.multiselect("Customer states", sorted(df_risk_states["customer_state"].dropna()), key="risk_states")
+risk_band = col2.selectbox("Risk band", ["All", "high", "elevated", "low"], key="risk_band")
+min_risk = col3.slider("Minimum risk", 0.0, 1.0, 0.0, 0.05, key="risk_min")
+
+col1, col2 = st.columns([1, 2])
+with col1:
+    fig_risk, ax_risk = plt.subplots(figsize=(6, 5))
+    sns.barplot(x="high_risk_orders", y="customer_state", data=df_risk_states.head(10), palette="Reds_r", ax=ax_risk)
+    ax_risk.set_xlabel("High-Risk Open Orders")
+    ax_risk.set_ylabel("Customer State")
+    ax_risk.set_title("High-Risk Orders by State")
+    st.pyplot(fig_risk)
+
+with col2:
+    df_risk = fetch_kpi(
+        "late_risk_orders", states=risk_states, min_risk=min_risk,
+        band=None if risk_band == "All" else risk_band, limit=50
+    )
+    st.dataframe(df_risk.rename(columns={
+        "order_id": "Order",
+        "order_status": "Status",
+        "customer_state": "Customer State",
+        "seller_state": "Seller State",
+        "category": "Category",
+        "estimated_date": "Estimated Delivery",
+        "days_to_estimate": "Days Left",
+        "risk_score": "Late Risk",
+        "risk_band": "Band"
+    })[["Order", "Status", "Customer State", "Seller State", "Category", "Estimated Delivery", "Days Left",
+        "Late Risk", "Band"]])
+st.caption("Probability of arriving after the estimated date, from a model retrained on delivered orders by each "
+           "ETL run; days left count from the latest purchase date in the data")
+
 # --- KPI 9: Top 10 Products by Revenue ---
 st.header("📦 Top 10 Products by Revenue")
-product_q = """
-SELECT
-    oi.product_id AS product_id,
-    p.product_category_name_english AS category,
-    SUM(oi.price + oi.freight_value) AS total_revenue,
-    COUNT(DISTINCT oi.order_id) AS order_count
-FROM order_items_fact oi
-JOIN products_dim p ON oi.product_id = p.product_id
-GROUP BY oi.product_id, category
-ORDER BY total_revenue DESC
-LIMIT 10;
-"""
-df_products = pd.read_sql(product_q, engine)
+df_products = fetch_kpi("top_products", start_date=fact_start, end_date=fact_end, limit=10)
 
 df_products["Product"] = df_products.apply(
     lambda row: f"***{str(row['product_id'])[-4:]} - {row['category']}", axis=1
@@ -297,3 +443,82 @@ st.dataframe(df_products.rename(columns={
     "order_count": "Orders",
     "total_revenue": "Revenue (R$)"
 })[["Product", "Orders", "Revenue (R$)"]])
+
+# --- KPI 10: Distinct Orders, Customers & Sellers ---
+st.header("🔢 Distinct Orders, Customers & Sellers")
+reach_filters = fetch_kpi("reach_filters")
+col1, col2, col3 = st.columns(3)
+reach_dates = col1.date_input("Purchase Date Range", value=[], key="reach_dates")
+reach_states = col2.multiselect("States", sorted(reach_filters["customer_state"].dropna().unique()))
+reach_categories = col3.multiselect("Categories", sorted(reach_filters["category"].dropna().unique()))
+reach_exact = st.checkbox(
+    "Exact counts",
+    help=f"Default counts union HyperLogLog sketches (~{RELATIVE_STD_ERROR:.1%} standard error). "
+         "Exact mode runs COUNT(DISTINCT ...) over the fact tables."
+)
+
+reach_start, reach_end = reach_dates if len(reach_dates) == 2 else (None, None)
+reach = fetch_kpi(
+    "distinct_counts", start_date=reach_start, end_date=reach_end,
+    states=reach_states, categories=reach_categories, exact=reach_exact
+).iloc[0]
+approx = "" if reach_exact else "≈ "
+col1, col2, col3 = st.columns(3)
+col1.metric("📦 Distinct Orders", f"{approx}{reach['orders']:,}")
+col2.metric("🧑 Distinct Customers", f"{approx}{reach['customers']:,}")
+col3.metric("🏪 Distinct Sellers", f"{approx}{reach['sellers']:,}")
+
+# --- KPI 11: Review Sentiment & Search ---
+st.header("💬 Review Sentiment")
+df_sentiment = fetch_kpi("review_sentiment_by_score")
+
+col1, col2 = st.columns(2)
+with col1:
+    fig9, ax9 = plt.subplots(figsize=(6, 4))
+    sns.barplot(x="review_score", y="avg_sentiment", data=df_sentiment, palette="RdYlGn", ax=ax9)
+    ax9.set_xlabel("Review Score (stars)")
+    ax9.set_ylabel("Avg Comment Sentiment (-1 to 1)")
+    ax9.set_title("Comment Sentiment by Star Rating")
+    st.pyplot(fig9)
+
+with col2:
+    st.dataframe(df_sentiment.rename(columns={
+        "review_score": "Stars",
+        "reviews": "Reviews",
+        "commented_reviews": "With Comment",
+        "avg_sentiment": "Avg Sentiment",
+        "pct_positive": "% Positive",
+        "pct_negative": "% Negative"
+    }))
+
+st.subheader("Products with the Most Negative Comments")
+df_worst = fetch_kpi("product_sentiment", min_reviews=5, limit=10, worst=True)
+df_worst["product_id"] = df_worst["product_id"].apply(lambda x: f"***{str(x)[-4:]}")
+st.dataframe(df_worst.rename(columns={
+    "product_id": "Product",
+    "category": "Category",
+    "reviews": "Reviews",
+    "avg_review_score": "Avg Stars",
+    "avg_sentiment": "Avg Sentiment",
+    "negative_share": "Negative Share"
+}))
+
+review_query = st.text_input(
+    "🔎 Search review comments",
+    help="Full-text search over review titles and messages; accents are optional and words match by prefix"
+)
+if review_query:
+    df_reviews = fetch_kpi("review_search", query=review_query, limit=20)
+    st.caption(f"{len(df_reviews)} best-matching reviews")
+    st.dataframe(df_reviews.rename(columns={
+        "review_score": "Stars",
+        "sentiment": "Sentiment",
+        "title": "Title",
+        "excerpt": "Excerpt"
+    })[["Stars", "Sentiment", "Title", "Excerpt"]])
+
+# --- Fast preview: replace each estimate with its exact result as it arrives ---
+for future in as_completed(pending_exact):
+    slot, render = pending_exact[future]
+    with slot.container():
+        render(future.result(), approximate=False)
@@ -0,0 +1,109 @@
+import os
+import logging
+import pandas as pd
+from sqlalchemy import create_engine
+from dashboard.config import DB_URL, PARQUET_PATH, QUERY_BACKEND
+from etl.partitions import route_partitions
+
+try:
+    import duckdb
+except ImportError:  # optional dependency, only needed for the columnar backend
+    duckdb = None
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteBackend:
+    """Row-store backend reading the ETL's SQLite database."""
+
+    name = "sqlite"
+
+    def __init__(self, db_url: str = DB_URL):
+        self.engine = create_engine(db_url)
+
+    def query(self, sql: str, params=None, date_bounds=None) -> pd.DataFrame:
+        """Run a query and return the result as a DataFrame (`?` placeholders).
+
+        `date_bounds` (start, end) prunes the monthly fact partitions the query reads.
+        """
+        with self.engine.connect() as conn:
+            if date_bounds:
+                sql = route_partitions(conn, sql, *date_bounds)
+            return pd.read_sql(sql, conn, params=tuple(params) if params else None)
+
+    def data_version(self) -> str:
+        """Stamp that changes whenever a commit touches the database file."""
+        stamps = []
+        for path in (self.engine.url.database, f"{self.engine.url.database}-wal"):
+            if os.path.exists(path):
+                st = os.stat(path)
+                stamps.append(f"{st.st_mtime_ns}:{st.st_size}")
+        return "sqlite:" + "/".join(stamps)
+
+    def close(self):
+        self.engine.dispose()
+
+
+class DuckDBBackend:
+    """Embedded columnar backend: DuckDB views over the ETL's Parquet exports."""
+
+    name = "duckdb"
+
+    def __init__(self, parquet_path=PARQUET_PATH):
+        if duckdb is None:
+            raise ImportError("The duckdb backend requires the 'duckdb' package (pip install duckdb)")
+        files = sorted(parquet_path.glob("*.parquet"))
+        if not files:
+            raise FileNotFoundError(
+                f"No Parquet exports found in {parquet_path}. Run the ETL with duckdb installed first."
+            )
+        self.files = files
+        self.conn = duckdb.connect()
+        for f in files:
+            self.conn.execute(
+                f"CREATE OR REPLACE VIEW {f.stem} AS SELECT * FROM read_parquet('{f.as_posix()}')"
+            )
+        logger.info(f"🦆 DuckDB backend ready with {len(files)} tables from {parquet_path}")
+
+    def query(self, sql: str, params=None, date_bounds=None) -> pd.DataFrame:
+        """Run a query and return the result as a DataFrame (`?` placeholders).
+
+        `date_bounds` is accepted for interface parity; DuckDB prunes Parquet row groups itself.
+        """
+        # A cursor is a per-thread duplicate of the connection; Streamlit runs sessions in threads
+        with self.conn.cursor() as cur:
+            return cur.execute(sql, list(params) if params else []).df()
+
+    def data_version(self) -> str:
+        """Stamp that changes whenever the Parquet exports are rewritten."""
+        return "duckdb:" + "/".join(
+            f"{st.st_mtime_ns}:{st.st_size}" for st in (os.stat(f) for f in self.files if f.exists())
+        )
+
+    def close(self):
+        self.conn.close()
+
+
+BACKENDS = {
+    "sqlite": SQLiteBackend,
+    "duckdb": DuckDBBackend,
+}
+
+_instances = {}
+
+
+def get_backend(name: str = None):
+    """Return the shared backend instance for `name` (defaults to ECOM_QUERY_BACKEND)."""
+    name = (name or QUERY_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown query backend '{name}'. Choose from: {sorted(BACKENDS)}")
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
+
+
+def reset_backends():
+    """Close cached backends so the next call picks up freshly written data."""
+    for backend in _instances.values():
+        backend.close()
+    _instances.clear()
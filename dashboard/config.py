@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # Base directories
@@ -9,10 +10,33 @@ OUTPUTS_PATH = Path("outputs/")
 PROCESSED_PATH.mkdir(parents=True, exist_ok=True)
 OUTPUTS_PATH.mkdir(parents=True, exist_ok=True)
 
+# Drop folder for micro-batch ingestion of new order events
+INBOX_PATH = Path("data/inbox/")
+
 # SQLite database path
 DB_PATH = PROCESSED_PATH / "brazil_ecommerce.db"
 DB_URL = f"sqlite:///{DB_PATH}"
 
+# Columnar exports read by the embedded DuckDB backend
+PARQUET_PATH = PROCESSED_PATH / "parquet"
+
+# Analytical query backend: "sqlite" (default) or "duckdb"
+QUERY_BACKEND = os.getenv("ECOM_QUERY_BACKEND", "sqlite")
+
+# ETL worker processes; >1 transforms order_id hash shards in parallel
+ETL_SHARDS = int(os.getenv("ECOM_ETL_SHARDS", "1"))
+
+# Local KPI service shared by all dashboard sessions
+KPI_SERVICE_HOST = os.getenv("ECOM_KPI_HOST", "127.0.0.1")
+KPI_SERVICE_PORT = int(os.getenv("ECOM_KPI_PORT", "8765"))
+KPI_SERVICE_WORKERS = int(os.getenv("ECOM_KPI_WORKERS", "4"))
+
+# Persistent KPI results, shared by the service, dashboard, EDA and SQL exports
+KPI_STORE_PATH = PROCESSED_PATH / "kpi_store.db"
+
+# Share of each (month, state, category) stratum kept in the fast-preview sample tables
+SAMPLE_RATE = float(os.getenv("ECOM_SAMPLE_RATE", "0.05"))
+
 # Logging
 LOG_PATH = OUTPUTS_PATH / "logs"
 LOG_PATH.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,46 @@
+import json
+import logging
+import pandas as pd
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+from dashboard.config import KPI_SERVICE_HOST, KPI_SERVICE_PORT
+from dashboard.kpis import PARAM_ENCODERS
+from dashboard.kpi_store import get_store, result_to_frame
+
+logger = logging.getLogger(__name__)
+
+KPI_SERVICE_URL = f"http://{KPI_SERVICE_HOST}:{KPI_SERVICE_PORT}"
+TIMEOUT_SECONDS = 60
+
+_service_down = False
+
+
+def _encode(name: str, value) -> str:
+    if name in PARAM_ENCODERS:
+        return PARAM_ENCODERS[name](value)
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (list, tuple)):
+        return ",".join(str(v) for v in value)
+    return str(value)
+
+
+def fetch_kpi(name: str, **params) -> pd.DataFrame:
+    """Fetch a KPI from the local KPI service, or straight from the KPI store if the service is not running."""
+    global _service_down
+    query = urlencode({k: _encode(k, v) for k, v in params.items() if v is not None and v != []})
+    try:
+        with urlopen(f"{KPI_SERVICE_URL}/kpi/{name}?{query}", timeout=TIMEOUT_SECONDS) as resp:
+            result = json.load(resp)["result"]
+    except HTTPError as exc:
+        raise RuntimeError(f"KPI service error for '{name}': {exc.read().decode(errors='replace')}") from exc
+    except (URLError, ConnectionError) as exc:
+        if not _service_down:
+            logger.warning(f"⚠️ KPI service unreachable at {KPI_SERVICE_URL} ({exc}); reading the KPI store directly")
+            _service_down = True
+        payload, _ = get_store().fetch(name, params)
+        result = payload["result"]
+    else:
+        _service_down = False
+    return result_to_frame(result)
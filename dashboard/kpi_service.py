@@ -0,0 +1,133 @@
+import json
+import asyncio
+import logging
+import argparse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qsl
+from dashboard.config import KPI_SERVICE_HOST, KPI_SERVICE_PORT, KPI_SERVICE_WORKERS
+from dashboard.backend import get_backend
+from dashboard.kpis import KPIS, PARAM_PARSERS, canonical_params
+from dashboard.kpi_store import KPIStore
+
+# --- Logging setup ---
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+# Cached KPI results kept across all data versions (oldest evicted first)
+CACHE_SIZE = 512
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class KPIService:
+    """Serve KPIs over HTTP/JSON with request coalescing and a version-stamped cache.
+
+    Identical requests (same KPI, filters and data version) share one in-flight
+    computation; finished results are cached under the data version, so a new
+    ETL/micro-batch commit naturally invalidates them. Misses go to the shared
+    KPIStore, which other processes fill too. Queries run in a bounded thread
+    pool so the event loop never blocks on SQLite.
+    """
+
+    def __init__(self, backend=None, workers: int = KPI_SERVICE_WORKERS, cache_size: int = CACHE_SIZE):
+        self.backend = backend or get_backend()
+        self.store = KPIStore(self.backend)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kpi")
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.inflight = {}
+        self.stats = {"requests": 0, "cache_hits": 0, "coalesced": 0, "store_hits": 0, "computed": 0}
+
+    async def get(self, name: str, params: dict):
+        """Return (payload, "cache" | "coalesced" | "store" | "computed") for canonical KPI params."""
+        self.stats["requests"] += 1
+        loop = asyncio.get_running_loop()
+        # A stat() call; done inline so it never queues behind busy workers
+        version = self.backend.data_version()
+        key = (name, tuple(sorted((k, json.dumps(v, default=str)) for k, v in params.items())), version)
+
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.stats["cache_hits"] += 1
+            return self.cache[key], "cache"
+        if key in self.inflight:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(self.inflight[key]), "coalesced"
+
+        future = loop.run_in_executor(self.executor, self.store.fetch, name, params)
+        self.inflight[key] = future
+        try:
+            payload, source = await future
+        finally:
+            self.inflight.pop(key, None)
+        self.stats["store_hits" if source == "store" else "computed"] += 1
+        self.cache[key] = payload
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return payload, source
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Minimal HTTP/1.1: GET /kpi/<name>?filters, GET /kpis, GET /health."""
+        status, body = 500, {"error": "internal error"}
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass  # headers are not needed
+            method, target, _ = request_line.split(" ", 2)
+            url = urlsplit(target)
+            if method != "GET":
+                status, body = 405, {"error": "only GET is supported"}
+            elif url.path == "/health":
+                status, body = 200, {"status": "ok", "stats": self.stats, "store": self.store.stats}
+            elif url.path == "/kpis":
+                status, body = 200, {"kpis": sorted(KPIS)}
+            elif url.path.startswith("/kpi/"):
+                name = url.path[len("/kpi/"):]
+                if name not in KPIS:
+                    status, body = 404, {"error": f"unknown KPI '{name}'"}
+                else:
+                    try:
+                        params = canonical_params(
+                            name, {k: PARAM_PARSERS[k](v) for k, v in parse_qsl(url.query)}
+                        )
+                    except (KeyError, ValueError) as exc:
+                        status, body = 400, {"error": f"bad parameter: {exc}"}
+                    else:
+                        payload, source = await self.get(name, params)
+                        status, body = 200, {**payload, "source": source}
+            else:
+                status, body = 404, {"error": "not found"}
+        except Exception as exc:
+            logger.exception("❌ KPI request failed")
+            status, body = 500, {"error": str(exc)}
+
+        data = json.dumps(body, default=str).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            "Connection: close\r\n\r\n".encode() + data
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = KPI_SERVICE_HOST, port: int = KPI_SERVICE_PORT):
+        server = await asyncio.start_server(self.handle, host, port)
+        logger.info(f"📡 KPI service listening on http://{host}:{port} ({self.executor._max_workers} workers)")
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local KPI service for the dashboard")
+    parser.add_argument("--host", default=KPI_SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=KPI_SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=KPI_SERVICE_WORKERS)
+    args = parser.parse_args()
+    asyncio.run(KPIService(workers=args.workers).serve(args.host, args.port))
@@ -0,0 +1,126 @@
+import json
+import time
+import logging
+import pandas as pd
+from sqlalchemy import create_engine
+from dashboard.config import KPI_STORE_PATH
+from dashboard.backend import get_backend
+from dashboard.kpis import KPIS, canonical_params, compute_kpi
+
+logger = logging.getLogger(__name__)
+
+STORE_TABLE = "kpi_results"
+
+# A computation claimed longer ago than this is treated as abandoned and taken over
+CLAIM_TIMEOUT_SECONDS = 300
+POLL_SECONDS = 0.05
+
+
+def frame_to_result(df: pd.DataFrame) -> dict:
+    """DataFrame -> {"columns", "data"} of plain Python values (floats at full precision, NaN -> None)."""
+    return {"columns": list(df.columns), "data": df.astype(object).where(df.notna(), None).to_numpy().tolist()}
+
+
+def result_to_frame(result: dict) -> pd.DataFrame:
+    return pd.DataFrame(result["data"], columns=result["columns"])
+
+
+class KPIStore:
+    """KPI results computed at most once per (KPI, parameters, data version).
+
+    Lives in its own SQLite file, so writing results never changes the data
+    version of the database they were computed from. A computation is claimed
+    with an INSERT OR IGNORE of a pending row. Other processes asking for the
+    same result wait for it instead of running the query again.
+    """
+
+    def __init__(self, backend=None, path=KPI_STORE_PATH):
+        self._backend = backend
+        self.engine = create_engine(f"sqlite:///{path}", connect_args={"timeout": 30})
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+            conn.exec_driver_sql(
+                f"CREATE TABLE IF NOT EXISTS {STORE_TABLE} ("
+                "kpi TEXT, params TEXT, version TEXT, status TEXT, claimed_at REAL, "
+                "elapsed_ms REAL, result TEXT, PRIMARY KEY (kpi, params, version))"
+            )
+        self.stats = {"stored": 0, "computed": 0}
+
+    @property
+    def backend(self):
+        # Resolved per call so reset_backends() is picked up
+        return self._backend or get_backend()
+
+    def fetch(self, name: str, params: dict = None):
+        """Return (payload, "store" | "computed") for a KPI request."""
+        backend = self.backend
+        params = canonical_params(name, params or {})
+        version = backend.data_version()
+        if not KPIS[name].get("store", True):
+            return self._payload(name, version, *self._compute(backend, name, params)), "computed"
+
+        key = (name, json.dumps(params, sort_keys=True, default=str), version)
+        while True:
+            with self.engine.begin() as conn:
+                claimed = conn.exec_driver_sql(
+                    f"INSERT OR IGNORE INTO {STORE_TABLE} (kpi, params, version, status, claimed_at) "
+                    "VALUES (?, ?, ?, 'pending', ?)", (*key, time.time())
+                ).rowcount
+                if not claimed:
+                    status, claimed_at, elapsed_ms, result = conn.exec_driver_sql(
+                        f"SELECT status, claimed_at, elapsed_ms, result FROM {STORE_TABLE} "
+                        "WHERE kpi = ? AND params = ? AND version = ?", key
+                    ).fetchone()
+                    if status == "ready":
+                        self.stats["stored"] += 1
+                        return self._payload(name, version, elapsed_ms, json.loads(result)), "store"
+                    if time.time() - claimed_at > CLAIM_TIMEOUT_SECONDS:
+                        logger.warning(f"⚠️ Taking over abandoned computation of KPI '{name}'")
+                        claimed = conn.exec_driver_sql(
+                            f"UPDATE {STORE_TABLE} SET claimed_at = ? "
+                            "WHERE kpi = ? AND params = ? AND version = ? AND claimed_at = ?",
+                            (time.time(), *key, claimed_at)
+                        ).rowcount
+            if claimed:
+                break
+            time.sleep(POLL_SECONDS)
+
+        try:
+            elapsed_ms, result = self._compute(backend, name, params)
+        except Exception:
+            with self.engine.begin() as conn:
+                conn.exec_driver_sql(f"DELETE FROM {STORE_TABLE} WHERE kpi = ? AND params = ? AND version = ?", key)
+            raise
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql(
+                f"UPDATE {STORE_TABLE} SET status = 'ready', elapsed_ms = ?, result = ? "
+                "WHERE kpi = ? AND params = ? AND version = ?",
+                (elapsed_ms, json.dumps(result), *key)
+            )
+            # Results of older versions of the same backend can never be served again
+            conn.exec_driver_sql(
+                f"DELETE FROM {STORE_TABLE} WHERE version != ? AND version LIKE ?", (version, f"{backend.name}:%")
+            )
+        return self._payload(name, version, elapsed_ms, result), "computed"
+
+    def _compute(self, backend, name: str, params: dict):
+        start = time.perf_counter()
+        # JSON round trip so computed and stored results are the same plain values
+        result = json.loads(json.dumps(frame_to_result(compute_kpi(backend, name, **params)), default=str))
+        self.stats["computed"] += 1
+        return round((time.perf_counter() - start) * 1000, 2), result
+
+    @staticmethod
+    def _payload(name: str, version: str, elapsed_ms: float, result: dict) -> dict:
+        return {"kpi": name, "version": version, "elapsed_ms": elapsed_ms, "result": result}
+
+
+_store = None
+
+
+def get_store() -> KPIStore:
+    """Shared store for this process, on the configured backend."""
+    global _store
+    if _store is None:
+        _store = KPIStore()
+    return _store
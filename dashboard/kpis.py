@@ -0,0 +1,598 @@
+import json
+import inspect
+import numpy as np
+import pandas as pd
+from dashboard.backend import get_backend
+from etl.db import date_key, epoch_bounds, month_label
+from etl.distinct_sketches import distinct_counts as _distinct_counts
+from etl.forecasting import MAX_HORIZON, SERIES_KEYS, forecast_batch, series_mask
+from etl.review_text import FTS_TABLE, fts_query
+from etl.seller_scorecard import SCORECARD_METRICS
+from etl.stratified_sample import STRATUM_KEYS, estimate_ratio, estimate_totals
+
+# --- KPI definitions ---
+# Every dashboard/SQL-export KPI as a function of (backend, **filters) -> DataFrame.
+# The KPI service serves these by name; compute_kpi runs them in-process.
+
+
+def _fact_filter(alias: str, start_date=None, end_date=None):
+    """Join/where clauses restricting `alias` (a fact with order_id) to a purchase-date range."""
+    if not (start_date and end_date):
+        return "", "", [], None
+    return (
+        f"JOIN orders_fact fo ON {alias}.order_id = fo.order_id",
+        "WHERE fo.order_purchase_timestamp BETWEEN ? AND ?",
+        epoch_bounds(start_date, end_date),
+        (str(start_date), str(end_date)),
+    )
+
+
+def revenue_by_category(backend, start_date=None, end_date=None, limit=15):
+    join, where, params, bounds = _fact_filter("oi", start_date, end_date)
+    return backend.query(f"""
+        SELECT p.product_category_name_english AS category,
+               SUM(oi.price + oi.freight_value) AS total_revenue
+        FROM order_items_fact oi
+        JOIN products_dim p ON oi.product_id = p.product_id
+        {join}
+        {where}
+        GROUP BY category
+        ORDER BY total_revenue DESC
+        LIMIT {int(limit)};
+    """, params, date_bounds=bounds)
+
+
+def conversion_funnel(backend):
+    return backend.query("""
+        SELECT
+            COUNT(DISTINCT order_id) AS placed_orders,
+            SUM(approved_flag) AS approved_orders,
+            SUM(delivered_flag) AS delivered_orders
+        FROM orders_transformed;
+    """)
+
+
+def average_order_value(backend, start_date=None, end_date=None):
+    join, where, params, bounds = _fact_filter("pf", start_date, end_date)
+    return backend.query(f"""
+        SELECT ROUND(SUM(pf.payment_value) * 1.0 / COUNT(DISTINCT pf.order_id), 2) AS avg_order_value
+        FROM payments_fact pf
+        {join}
+        {where};
+    """, params, date_bounds=bounds)
+
+
+def repeat_purchase_rate(backend):
+    return backend.query("""
+        SELECT ROUND(
+            100.0 * SUM(CASE WHEN frequency > 1 THEN 1 ELSE 0 END) / COUNT(*), 2
+        ) AS repeat_purchase_rate
+        FROM customer_summary;
+    """)
+
+
+def customer_retention(backend):
+    return backend.query("""
+        SELECT
+            CASE WHEN frequency = 1 THEN 'First-time'
+                 ELSE 'Repeat'
+            END AS customer_type,
+            COUNT(*) AS num_customers
+        FROM customer_summary
+        GROUP BY customer_type;
+    """)
+
+
+def cohort_retention(backend, max_period=None):
+    where = f"WHERE period <= {int(max_period)}" if max_period is not None else ""
+    return backend.query(f"""
+        SELECT cohort_month, period, customers, cohort_size, retention_rate
+        FROM cohort_retention
+        {where}
+        ORDER BY cohort_month, period;
+    """)
+
+
+def rfm_segments(backend):
+    return backend.query("""
+        SELECT r_score, f_score, m_score,
+               COUNT(*) AS num_customers,
+               ROUND(SUM(monetary), 2) AS total_monetary
+        FROM customer_summary
+        GROUP BY r_score, f_score, m_score
+        ORDER BY r_score DESC, f_score DESC, m_score DESC;
+    """)
+
+
+def monthly_revenue(backend, start_date=None, end_date=None):
+    where, params = "", []
+    if start_date and end_date:
+        where, params = "WHERE purchase_date BETWEEN ? AND ?", [date_key(start_date), date_key(end_date)]
+    df = backend.query(f"""
+        SELECT purchase_month AS month,
+               ROUND(SUM(item_revenue), 2) AS total_revenue
+        FROM orders_transformed
+        {where}
+        GROUP BY month
+        ORDER BY month;
+    """, params)
+    return df.assign(month=month_label(df["month"]))
+
+
+def orders_over_time(backend):
+    df = backend.query("""
+        SELECT purchase_month AS month,
+               COUNT(DISTINCT order_id) AS total_orders,
+               SUM(delivered_flag) AS delivered_orders
+        FROM orders_transformed
+        GROUP BY month
+        ORDER BY month;
+    """)
+    return df.assign(month=month_label(df["month"]))
+
+
+def payment_methods(backend, start_date=None, end_date=None):
+    join, where, params, bounds = _fact_filter("pf", start_date, end_date)
+    return backend.query(f"""
+        SELECT pf.payment_type, COUNT(*) AS count, SUM(pf.payment_value) AS total_value
+        FROM payments_fact pf
+        {join}
+        {where}
+        GROUP BY pf.payment_type
+        ORDER BY total_value DESC;
+    """, params, date_bounds=bounds)
+
+
+def top_states(backend, limit=10):
+    return backend.query(f"""
+        SELECT customer_state AS state,
+               ROUND(SUM(item_revenue), 2) AS total_revenue
+        FROM orders_transformed
+        GROUP BY state
+        ORDER BY total_revenue DESC
+        LIMIT {int(limit)};
+    """)
+
+
+def delivery_performance_by_state(backend):
+    return backend.query("""
+        SELECT customer_state,
+               COUNT(*) AS total_orders,
+               ROUND(AVG(delivery_time_days), 2) AS avg_delivery_days,
+               ROUND(100.0 * SUM(late_delivery_flag) / SUM(delivered_flag), 2) AS pct_late
+        FROM orders_transformed
+        WHERE delivered_flag = 1
+        GROUP BY customer_state
+        ORDER BY avg_delivery_days ASC;
+    """)
+
+
+def top_sellers(backend, start_date=None, end_date=None, limit=10):
+    join, where, params, bounds = _fact_filter("oi", start_date, end_date)
+    return backend.query(f"""
+        SELECT s.seller_id,
+               COUNT(DISTINCT oi.order_id) AS order_count,
+               ROUND(SUM(oi.price + oi.freight_value), 2) AS total_revenue
+        FROM order_items_fact oi
+        JOIN sellers_dim s ON oi.seller_id = s.seller_id
+        {join}
+        {where}
+        GROUP BY s.seller_id
+        ORDER BY total_revenue DESC
+        LIMIT {int(limit)};
+    """, params, date_bounds=bounds)
+
+
+def top_products(backend, start_date=None, end_date=None, limit=10):
+    join, where, params, bounds = _fact_filter("oi", start_date, end_date)
+    return backend.query(f"""
+        SELECT
+            oi.product_id AS product_id,
+            p.product_category_name_english AS category,
+            SUM(oi.price + oi.freight_value) AS total_revenue,
+            COUNT(DISTINCT oi.order_id) AS order_count
+        FROM order_items_fact oi
+        JOIN products_dim p ON oi.product_id = p.product_id
+        {join}
+        {where}
+        GROUP BY oi.product_id, category
+        ORDER BY total_revenue DESC
+        LIMIT {int(limit)};
+    """, params, date_bounds=bounds)
+
+
+def seller_scorecard(backend, metric="revenue", limit=10, min_orders=1, worst=False):
+    """Top-k sellers by a scorecard metric, best first (or worst first)."""
+    if metric not in SCORECARD_METRICS:
+        raise ValueError(f"Unknown scorecard metric '{metric}'. Choose from: {sorted(SCORECARD_METRICS)}")
+    descending = SCORECARD_METRICS[metric][1] != worst
+    return backend.query(f"""
+        SELECT seller_id, seller_state, revenue, order_count, late_delivery_rate,
+               avg_review_score, avg_delivery_days
+        FROM seller_scorecard
+        WHERE {metric} IS NOT NULL AND order_count >= ?
+        ORDER BY {metric} {"DESC" if descending else "ASC"}
+        LIMIT {int(limit)};
+    """, [int(min_orders)])
+
+
+def seller_detail(backend, seller_id=None):
+    return backend.query("SELECT * FROM seller_scorecard WHERE seller_id = ?;", [seller_id])
+
+
+# --- Drill-down explorer ---
+# Entity -> table, unique key and columns. Every sort column has a (column, key)
+# index, so a page is an index range scan that starts after the previous page's
+# last (value, key) pair, however deep into the result it is.
+EXPLORER_ENTITIES = {
+    "sellers": {
+        "table": "seller_scorecard",
+        "key": "seller_id",
+        "columns": ["seller_id", "seller_city", "seller_state", "revenue", "order_count", "items_sold",
+                    "late_delivery_rate", "avg_delivery_days", "avg_review_score"],
+        "sort": ["revenue", "order_count", "late_delivery_rate", "avg_review_score", "avg_delivery_days"],
+    },
+    "products": {
+        "table": "product_scorecard",
+        "key": "product_id",
+        "columns": ["product_id", "category", "revenue", "order_count", "items_sold", "avg_price",
+                    "avg_review_score"],
+        "sort": ["revenue", "order_count", "items_sold", "avg_price", "avg_review_score"],
+    },
+    "orders": {
+        "table": "orders_transformed",
+        "key": "order_id",
+        "columns": ["order_id", "purchase_date", "order_status", "customer_state", "item_count",
+                    "item_revenue", "payment_value", "delivery_time_days", "late_delivery_flag"],
+        "sort": ["purchase_date", "item_revenue", "payment_value", "item_count", "delivery_time_days"],
+    },
+    "customers": {
+        "table": "customer_summary",
+        "key": "customer_unique_id",
+        "columns": ["customer_unique_id", "cohort_month", "first_purchase", "last_purchase", "frequency",
+                    "monetary", "rfm_score"],
+        "sort": ["monetary", "frequency", "last_purchase", "rfm_score"],
+    },
+}
+
+
+def explore_page(backend, entity="sellers", sort=None, descending=True, cursor=None, page_size=50):
+    """One page of `entity` ordered by (sort, key), starting after `cursor` = [sort value, key].
+
+    Returns up to page_size + 1 rows; the extra row only tells the caller a next page exists.
+    Rows with no value for the sort column are not listed.
+    """
+    if entity not in EXPLORER_ENTITIES:
+        raise ValueError(f"Unknown entity '{entity}'. Choose from: {sorted(EXPLORER_ENTITIES)}")
+    spec = EXPLORER_ENTITIES[entity]
+    sort = sort or spec["sort"][0]
+    if sort not in spec["sort"]:
+        raise ValueError(f"'{entity}' cannot be sorted by '{sort}'. Choose from: {spec['sort']}")
+    key, direction = spec["key"], "DESC" if descending else "ASC"
+    where, params = [f"{sort} IS NOT NULL"], []
+    if cursor:
+        # (sort, key) past the cursor, spelled as an index range on `sort` plus a tie-break
+        op = "<" if descending else ">"
+        where.append(f"{sort} {op}= ? AND ({sort} {op} ? OR {key} {op} ?)")
+        params = [cursor[0], cursor[0], cursor[1]]
+    return backend.query(f"""
+        SELECT {", ".join(spec["columns"])}
+        FROM {spec["table"]}
+        WHERE {" AND ".join(where)}
+        ORDER BY {sort} {direction}, {key} {direction}
+        LIMIT {int(page_size) + 1};
+    """, params)
+
+
+def reach_filters(backend):
+    return backend.query(
+        "SELECT DISTINCT customer_state, category FROM distinct_sketches ORDER BY customer_state, category;"
+    )
+
+
+def distinct_counts(backend, start_date=None, end_date=None, states=None, categories=None, exact=False):
+    counts = _distinct_counts(backend, start_date, end_date, states, categories, exact=exact)
+    return pd.DataFrame([counts])
+
+
+def review_search(backend, query=None, limit=20):
+    """Best-matching review comments (BM25); the FTS5 index only exists in SQLite."""
+    match = fts_query(query or "")
+    if not match:
+        return pd.DataFrame(columns=["review_id", "order_id", "review_score", "sentiment", "title", "excerpt"])
+    if backend.name != "sqlite":
+        backend = get_backend("sqlite")
+    return backend.query(f"""
+        SELECT s.review_id, s.order_id, r.review_score, r.sentiment, s.title, s.excerpt
+        FROM (
+            SELECT review_id, order_id, title,
+                   snippet({FTS_TABLE}, 1, '**', '**', '…', 16) AS excerpt, rank
+            FROM {FTS_TABLE}
+            WHERE {FTS_TABLE} MATCH ?
+            ORDER BY rank
+            LIMIT {int(limit)}
+        ) s
+        JOIN review_sentiment r ON r.review_id = s.review_id AND r.order_id = s.order_id
+        ORDER BY s.rank;
+    """, [match])
+
+
+def review_sentiment_by_score(backend):
+    return backend.query("""
+        SELECT review_score,
+               COUNT(*) AS reviews,
+               SUM(has_comment) AS commented_reviews,
+               ROUND(AVG(CASE WHEN has_comment = 1 THEN sentiment END), 3) AS avg_sentiment,
+               ROUND(100.0 * SUM(CASE WHEN sentiment_label = 'positive' THEN 1 ELSE 0 END) / COUNT(*), 2) AS pct_positive,
+               ROUND(100.0 * SUM(CASE WHEN sentiment_label = 'negative' THEN 1 ELSE 0 END) / COUNT(*), 2) AS pct_negative
+        FROM review_sentiment
+        GROUP BY review_score
+        ORDER BY review_score;
+    """)
+
+
+def product_sentiment(backend, min_reviews=5, limit=10, worst=False):
+    return backend.query(f"""
+        SELECT product_id, category, reviews, avg_review_score, avg_sentiment, negative_share
+        FROM product_review_sentiment
+        WHERE reviews >= ?
+        ORDER BY avg_sentiment {"ASC" if worst else "DESC"}, reviews DESC
+        LIMIT {int(limit)};
+    """, [int(min_reviews)])
+
+
+# --- Fast-preview estimates ---
+# Approximate versions of the headline KPIs answered from the stratified sample
+# tables. Each value comes with the bounds of its 95% interval (<column>_low /
+# <column>_high); the exact KPI is named by the "preview" entry of the registry.
+
+
+def _sample_units(backend, table, columns, start_date=None, end_date=None):
+    """Sample rows of `table` (with stratum keys and weight) and the stratum sizes."""
+    where, params = "", []
+    if start_date and end_date:
+        where, params = "WHERE purchase_date BETWEEN ? AND ?", [date_key(start_date), date_key(end_date)]
+    units = backend.query(f"""
+        SELECT {", ".join(STRATUM_KEYS)}, {columns}
+        FROM {table}
+        {where};
+    """, params)
+    strata = backend.query("SELECT * FROM sample_strata;")
+    return units, strata
+
+
+def revenue_by_category_estimate(backend, start_date=None, end_date=None, limit=15):
+    units, strata = _sample_units(backend, "sample_order_items",
+                                  "order_id, category, price + freight_value AS total_revenue",
+                                  start_date, end_date)
+    # Orders are the sampling units: one row per (order, category)
+    units = units.groupby(STRATUM_KEYS + ["order_id", "category"], as_index=False, dropna=False)[
+        "total_revenue"
+    ].sum()
+    est = estimate_totals(units, strata, "total_revenue", ["category"])
+    return est.sort_values("total_revenue", ascending=False).head(int(limit)).round(2).reset_index(drop=True)
+
+
+def conversion_funnel_estimate(backend):
+    units, strata = _sample_units(backend, "sample_orders",
+                                  "1 AS placed_orders, approved_flag AS approved_orders, "
+                                  "delivered_flag AS delivered_orders")
+    return pd.concat(
+        [estimate_totals(units, strata, col) for col in ["placed_orders", "approved_orders", "delivered_orders"]],
+        axis=1,
+    ).round(0)
+
+
+def average_order_value_estimate(backend, start_date=None, end_date=None):
+    units, strata = _sample_units(backend, "sample_orders",
+                                  "payment_value, CASE WHEN payment_count > 0 THEN 1 ELSE 0 END AS paid",
+                                  start_date, end_date)
+    return estimate_ratio(units, strata, "payment_value", "paid", "avg_order_value").round(2)
+
+
+def monthly_revenue_estimate(backend, start_date=None, end_date=None):
+    units, strata = _sample_units(backend, "sample_orders", "purchase_month AS month, item_revenue AS total_revenue",
+                                  start_date, end_date)
+    est = estimate_totals(units, strata, "total_revenue", ["month"]).round(2)
+    return est.assign(month=month_label(est["month"]))
+
+
+def top_states_estimate(backend, limit=10):
+    units, strata = _sample_units(backend, "sample_orders", "customer_state AS state, item_revenue AS total_revenue")
+    est = estimate_totals(units, strata, "total_revenue", ["state"])
+    return est.sort_values("total_revenue", ascending=False).head(int(limit)).round(2).reset_index(drop=True)
+
+
+# --- Revenue forecasts ---
+# Read from the batch forecast of every (category, state) series, which is fitted
+# once per data version; a slice sums the series it covers.
+
+
+def revenue_forecast(backend, category=None, state=None, horizon=6):
+    """Monthly revenue of a category/state slice (None = all), then its forecast with a 95% interval."""
+    batch = forecast_batch(backend)
+    mask = series_mask(batch, category, state)
+    horizon = min(int(horizon), MAX_HORIZON)
+    actual = pd.DataFrame({"month": batch["months"].astype(str), "kind": "actual",
+                           "revenue": batch["history"][mask].sum(axis=0)})
+    if batch["fit"] is None:
+        return actual.assign(revenue_low=np.nan, revenue_high=np.nan)
+    forecast = batch["fit"]["forecast"][mask, :horizon].sum(axis=0)
+    # Errors of the summed series are taken as independent, so interval half-widths add in quadrature
+    margin = np.sqrt((batch["fit"]["margin"][mask, :horizon] ** 2).sum(axis=0))
+    ahead = pd.DataFrame({"month": batch["future"][:horizon].astype(str), "kind": "forecast", "revenue": forecast,
+                          "revenue_low": np.clip(forecast - margin, 0, None), "revenue_high": forecast + margin})
+    return pd.concat([actual, ahead], ignore_index=True).round(2)
+
+
+def revenue_forecast_series(backend, horizon=6, limit=20):
+    """Series with the largest forecast revenue over the next `horizon` months, vs the last `horizon` months."""
+    batch = forecast_batch(backend)
+    horizon = min(int(horizon), MAX_HORIZON)
+    if batch["fit"] is None:
+        return pd.DataFrame(columns=SERIES_KEYS + ["recent_revenue", "forecast_revenue", "growth_pct"])
+    recent = batch["history"][:, -horizon:].sum(axis=1)
+    ahead = batch["fit"]["forecast"][:, :horizon].sum(axis=1)
+    df = batch["keys"].assign(
+        recent_revenue=recent,
+        forecast_revenue=ahead,
+        growth_pct=np.where(recent > 0, 100 * (ahead / np.where(recent > 0, recent, 1) - 1), np.nan),
+    )
+    return df.sort_values("forecast_revenue", ascending=False).head(int(limit)).round(2).reset_index(drop=True)
+
+
+# --- Late-delivery risk ---
+# Open orders scored by the ETL's late-delivery model; days to estimate count from
+# the latest purchase date in the data.
+
+
+def late_risk_orders(backend, states=None, min_risk=0.0, band=None, limit=50):
+    """Open orders most likely to arrive after their estimated date, riskiest first."""
+    where, params = ["risk_score >= ?"], [float(min_risk)]
+    if states:
+        where.append(f"customer_state IN ({', '.join('?' * len(states))})")
+        params += list(states)
+    if band:
+        where.append("risk_band = ?")
+        params.append(band)
+    df = backend.query(f"""
+        SELECT order_id, order_status, customer_state, seller_state, category,
+               purchase_date, estimated_date, risk_score, risk_band
+        FROM delivery_risk
+        WHERE {" AND ".join(where)}
+        ORDER BY risk_score DESC, order_id DESC
+        LIMIT {int(limit)};
+    """, params)
+    as_of = backend.query("SELECT MAX(purchase_date) AS as_of FROM orders_transformed;")["as_of"].iloc[0]
+    estimated = pd.to_datetime(df["estimated_date"].astype("Int64").astype(str), format="%Y%m%d", errors="coerce")
+    df["days_to_estimate"] = (estimated - pd.Timestamp(str(as_of))).dt.days
+    return df
+
+
+def late_risk_by_state(backend):
+    return backend.query("""
+        SELECT customer_state,
+               COUNT(*) AS open_orders,
+               COUNT(CASE WHEN risk_band = 'high' THEN 1 END) AS high_risk_orders,
+               ROUND(AVG(risk_score), 4) AS avg_risk
+        FROM delivery_risk
+        GROUP BY customer_state
+        ORDER BY high_risk_orders DESC, avg_risk DESC;
+    """)
+
+
+# --- KPI registry ---
+# Every KPI is declared once: its compute function (SQL inside, parameters are the
+# keyword arguments with their defaults) and the tables it reads. `store: False`
+# marks ad-hoc lookups (free-text search, pagination) that are not worth keeping
+# in the KPI results store. `preview` names the sample-based estimate of a KPI,
+# which takes the same parameters.
+KPIS = {
+    "revenue_by_category": {"compute": revenue_by_category, "preview": "revenue_by_category_estimate",
+                            "depends_on": ["order_items_fact", "products_dim", "orders_fact"]},
+    "conversion_funnel": {"compute": conversion_funnel, "preview": "conversion_funnel_estimate",
+                          "depends_on": ["orders_transformed"]},
+    "average_order_value": {"compute": average_order_value, "preview": "average_order_value_estimate",
+                            "depends_on": ["payments_fact", "orders_fact"]},
+    "repeat_purchase_rate": {"compute": repeat_purchase_rate, "depends_on": ["customer_summary"]},
+    "customer_retention": {"compute": customer_retention, "depends_on": ["customer_summary"]},
+    "cohort_retention": {"compute": cohort_retention, "depends_on": ["cohort_retention"]},
+    "rfm_segments": {"compute": rfm_segments, "depends_on": ["customer_summary"]},
+    "monthly_revenue": {"compute": monthly_revenue, "preview": "monthly_revenue_estimate",
+                        "depends_on": ["orders_transformed"]},
+    "orders_over_time": {"compute": orders_over_time, "depends_on": ["orders_transformed"]},
+    "payment_methods": {"compute": payment_methods, "depends_on": ["payments_fact", "orders_fact"]},
+    "top_states": {"compute": top_states, "preview": "top_states_estimate", "depends_on": ["orders_transformed"]},
+    "delivery_performance_by_state": {"compute": delivery_performance_by_state,
+                                      "depends_on": ["orders_transformed"]},
+    "top_sellers": {"compute": top_sellers, "depends_on": ["order_items_fact", "sellers_dim", "orders_fact"]},
+    "top_products": {"compute": top_products, "depends_on": ["order_items_fact", "products_dim", "orders_fact"]},
+    "seller_scorecard": {"compute": seller_scorecard, "depends_on": ["seller_scorecard"]},
+    "seller_detail": {"compute": seller_detail, "depends_on": ["seller_scorecard"]},
+    "explore_page": {"compute": explore_page, "store": False,
+                     "depends_on": [spec["table"] for spec in EXPLORER_ENTITIES.values()]},
+    "reach_filters": {"compute": reach_filters, "depends_on": ["distinct_sketches"]},
+    "distinct_counts": {"compute": distinct_counts,
+                        "depends_on": ["distinct_sketches", "orders_transformed", "order_items_fact", "products_dim"]},
+    "review_search": {"compute": review_search, "store": False, "depends_on": [FTS_TABLE, "review_sentiment"]},
+    "review_sentiment_by_score": {"compute": review_sentiment_by_score, "depends_on": ["review_sentiment"]},
+    "product_sentiment": {"compute": product_sentiment, "depends_on": ["product_review_sentiment"]},
+    "revenue_by_category_estimate": {"compute": revenue_by_category_estimate,
+                                     "depends_on": ["sample_order_items", "sample_strata"]},
+    "conversion_funnel_estimate": {"compute": conversion_funnel_estimate,
+                                   "depends_on": ["sample_orders", "sample_strata"]},
+    "average_order_value_estimate": {"compute": average_order_value_estimate,
+                                     "depends_on": ["sample_orders", "sample_strata"]},
+    "monthly_revenue_estimate": {"compute": monthly_revenue_estimate,
+                                 "depends_on": ["sample_orders", "sample_strata"]},
+    "top_states_estimate": {"compute": top_states_estimate, "depends_on": ["sample_orders", "sample_strata"]},
+    "revenue_forecast": {"compute": revenue_forecast,
+                         "depends_on": ["order_items_fact", "orders_transformed", "products_dim"]},
+    "revenue_forecast_series": {"compute": revenue_forecast_series,
+                                "depends_on": ["order_items_fact", "orders_transformed", "products_dim"]},
+    "late_risk_orders": {"compute": late_risk_orders, "depends_on": ["delivery_risk", "orders_transformed"]},
+    "late_risk_by_state": {"compute": late_risk_by_state, "depends_on": ["delivery_risk"]},
+}
+
+
+def _flag(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes")
+
+
+PARAM_PARSERS = {
+    "start_date": str,
+    "end_date": str,
+    "states": lambda v: [s for s in v.split(",") if s],
+    "categories": lambda v: [c for c in v.split(",") if c],
+    "exact": _flag,
+    "limit": int,
+    "max_period": int,
+    "query": str,
+    "min_reviews": int,
+    "worst": _flag,
+    "metric": str,
+    "min_orders": int,
+    "seller_id": str,
+    "entity": str,
+    "sort": str,
+    "descending": _flag,
+    "cursor": json.loads,
+    "page_size": int,
+    "category": str,
+    "state": str,
+    "horizon": int,
+    "min_risk": float,
+    "band": str,
+}
+
+# Parameters that are not plain scalars/lists travel as JSON
+PARAM_ENCODERS = {
+    "cursor": json.dumps,
+}
+
+
+def kpi_params(name: str) -> dict:
+    """Declared parameters of a KPI and their defaults."""
+    if name not in KPIS:
+        raise KeyError(f"Unknown KPI '{name}'")
+    parameters = list(inspect.signature(KPIS[name]["compute"]).parameters.values())[1:]
+    return {p.name: p.default for p in parameters}
+
+
+def _is_unset(value) -> bool:
+    return value is None or (isinstance(value, (list, tuple, str)) and len(value) == 0)
+
+
+def canonical_params(name: str, params: dict) -> dict:
+    """Complete `params` with the KPI's defaults, so equivalent requests share one result."""
+    declared = kpi_params(name)
+    unknown = set(params) - set(declared)
+    if unknown:
+        raise ValueError(f"KPI '{name}' has no parameter(s) {sorted(unknown)}")
+    # None and empty filters mean "not given", like in the query string
+    return {k: default if _is_unset(params.get(k)) else params[k] for k, default in declared.items()}
+
+
+def compute_kpi(backend, name: str, **params) -> pd.DataFrame:
+    """Run a KPI in-process, bypassing the results store."""
+    return KPIS[name]["compute"](backend, **canonical_params(name, params))
@@ -0,0 +1,103 @@
+import sys
+import json
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# Add project root to Python path BEFORE any imports that need it
+sys.path.append(str(Path(__file__).resolve().parent.parent.parent))
+
+import streamlit as st
+import pandas as pd
+from dashboard.kpi_client import fetch_kpi
+from dashboard.kpis import EXPLORER_ENTITIES
+
+# --- Page setup ---
+st.set_page_config(
+    page_title="Drill-down Explorer",
+    layout="wide"
+)
+st.title("🔎 Drill-down Explorer")
+
+PAGE_SIZES = [25, 50, 100]
+
+
+@st.cache_resource
+def prefetcher():
+    """Background threads that load the next page while the current one is shown."""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="explorer")
+
+
+def load_page(view, cursor):
+    entity, sort, descending, page_size = view
+    return fetch_kpi(
+        "explore_page", entity=entity, sort=sort, descending=descending, cursor=cursor, page_size=page_size
+    )
+
+
+def page_key(cursor) -> str:
+    return json.dumps(cursor)
+
+
+def plain(value):
+    """numpy/pandas scalar -> exact JSON-able Python value for a cursor."""
+    if isinstance(value, pd.Timestamp):
+        return str(value)
+    return value.item() if hasattr(value, "item") else value
+
+
+# --- Controls ---
+col1, col2, col3, col4 = st.columns(4)
+entity = col1.selectbox("Browse", list(EXPLORER_ENTITIES), format_func=str.title)
+spec = EXPLORER_ENTITIES[entity]
+sort = col2.selectbox("Sort by", spec["sort"], format_func=lambda c: c.replace("_", " ").title())
+descending = col3.radio("Order", ["Descending", "Ascending"], horizontal=True) == "Descending"
+page_size = col4.selectbox("Rows per page", PAGE_SIZES, index=1)
+
+# --- Pagination state: the cursors of the pages visited, plus at most one prefetched page ---
+view = (entity, sort, descending, page_size)
+state = st.session_state
+if state.get("explorer_view") != view:
+    state.explorer_view = view
+    state.explorer_cursors = [None]
+    state.explorer_prefetch = {}
+
+cursor = state.explorer_cursors[-1]
+future = state.explorer_prefetch.pop(page_key(cursor), None)
+page = future.result() if future is not None else load_page(view, cursor)
+
+has_next = len(page) > page_size
+rows = page.iloc[:page_size]
+next_cursor = None
+if has_next:
+    # (sort value, key) of the last visible row
+    next_cursor = [plain(v) for v in rows[[sort, spec["key"]]].iloc[-1]]
+    state.explorer_prefetch = {page_key(next_cursor): prefetcher().submit(load_page, view, next_cursor)}
+else:
+    state.explorer_prefetch = {}
+
+# --- Page ---
+page_number = len(state.explorer_cursors)
+first_row = (page_number - 1) * page_size + 1
+if rows.empty:
+    st.caption("No rows with a value for this sort column")
+else:
+    st.caption(f"Page {page_number} · rows {first_row:,}–{first_row + len(rows) - 1:,}")
+
+display = rows.copy()
+display[spec["key"]] = display[spec["key"]].apply(lambda x: f"***{str(x)[-4:]}")
+st.dataframe(
+    display.rename(columns=lambda c: c.replace("_", " ").title()),
+    hide_index=True,
+)
+
+col1, col2, _ = st.columns([1, 1, 6])
+col1.button(
+    "⬅️ Previous",
+    disabled=page_number == 1,
+    on_click=lambda: state.explorer_cursors.pop(),
+)
+col2.button(
+    "Next ➡️",
+    disabled=not has_next,
+    on_click=lambda: state.explorer_cursors.append(next_cursor),
+)
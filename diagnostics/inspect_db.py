@@ -1,6 +1,7 @@
 import sqlite3
+from dashboard.config import DB_PATH
 
-db_path = "data/ecommerce.sqlite"  # adjust path if needed
+db_path = DB_PATH
 conn = sqlite3.connect(db_path)
 cursor = conn.cursor()
 
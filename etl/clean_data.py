@@ -1,7 +1,18 @@
 import pandas as pd
 import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from sqlalchemy import create_engine
-from dashboard.config import RAW_PATH, PROCESSED_PATH, DB_URL
+from dashboard.config import RAW_PATH, PROCESSED_PATH, DB_URL, ETL_SHARDS
+from etl.db import ORDER_TIMESTAMPS, create_indexes, encode_timestamps, export_parquet
+from etl.partitions import PARTITIONED_FACTS, save_partitioned
+from etl.customer_analytics import build_customer_analytics
+from etl.distinct_sketches import build_distinct_sketches
+from etl.review_text import build_review_analytics, score_chunk
+from etl.seller_scorecard import build_seller_scorecard
+from etl.product_scorecard import build_product_scorecard
+from etl.stratified_sample import build_stratified_samples
+from etl.delivery_risk import build_delivery_risk
 
 # --- Logging setup ---
 logging.basicConfig(
@@ -18,11 +29,7 @@ def load_raw_data():
 
     orders = pd.read_csv(
         RAW_PATH / "olist_orders_dataset.csv",
-        parse_dates=[
-            "order_purchase_timestamp", "order_approved_at",
-            "order_delivered_carrier_date", "order_delivered_customer_date",
-            "order_estimated_delivery_date"
-        ]
+        parse_dates=ORDER_TIMESTAMPS
     )
     customers = pd.read_csv(RAW_PATH / "olist_customers_dataset.csv")
     sellers = pd.read_csv(RAW_PATH / "olist_sellers_dataset.csv")
@@ -50,11 +57,10 @@ def transform_orders(orders: pd.DataFrame) -> pd.DataFrame:
     """Feature engineering for orders dataset."""
     logger.info("⚙️ Transforming orders dataset...")
 
-    # --- Compute delivery time only for delivered orders ---
+    # --- Delivery time in (fractional) days, NULL for orders not delivered yet ---
     orders["delivery_time_days"] = (
         orders["order_delivered_customer_date"] - orders["order_purchase_timestamp"]
-    ).dt.days
-    orders["delivery_time_days"] = orders["delivery_time_days"].fillna(0)
+    ) / pd.Timedelta(days=1)
 
     # --- Flags ---
     orders["approved_flag"] = orders["order_approved_at"].notna().astype(int)
@@ -72,6 +78,116 @@ def transform_orders(orders: pd.DataFrame) -> pd.DataFrame:
     return orders
 
 
+def build_orders_transformed(data: dict) -> pd.DataFrame:
+    """Build the order-grain wide table: flags, payment/item sums, customer geo, date parts."""
+    logger.info("🧱 Building orders_transformed wide table...")
+    orders = data["orders"]
+
+    payments = data["payments"].groupby("order_id").agg(
+        payment_value=("payment_value", "sum"),
+        payment_count=("payment_value", "size"),
+        payment_installments=("payment_installments", "max"),
+    )
+    items = data["order_items"].groupby("order_id").agg(
+        item_count=("order_item_id", "size"),
+        item_price=("price", "sum"),
+        item_freight=("freight_value", "sum"),
+        seller_count=("seller_id", "nunique"),
+    )
+    items["item_revenue"] = items["item_price"] + items["item_freight"]
+    customers = data["customers"].set_index("customer_id")[
+        ["customer_unique_id", "customer_city", "customer_state"]
+    ]
+
+    wide = (
+        orders
+        .join(payments, on="order_id")
+        .join(items, on="order_id")
+        .join(customers, on="customer_id")
+    )
+    sums = list(payments.columns) + list(items.columns)
+    wide[sums] = wide[sums].fillna(0)
+    count_cols = ["payment_count", "payment_installments", "item_count", "seller_count"]
+    wide[count_cols] = wide[count_cols].astype(int)
+
+    # --- Purchase date parts as YYYYMMDD / YYYYMM integers, so daily/monthly KPIs compare integers ---
+    purchased = wide["order_purchase_timestamp"]
+    wide["purchase_month"] = purchased.dt.year * 100 + purchased.dt.month
+    wide["purchase_date"] = wide["purchase_month"] * 100 + purchased.dt.day
+    wide["purchase_year"] = purchased.dt.year
+    wide["purchase_weekday"] = purchased.dt.dayofweek
+
+    return wide
+
+
+# --- Sharded execution ---
+# Orders and their items, payments and reviews are split by a hash of order_id, so
+# every order-grain transform sees whole orders; dimensions are broadcast to all
+# shards. Shard outputs are put back in the original row order, which makes the
+# merged tables identical to the single-process run.
+SHARDED_DATASETS = ["orders", "order_items", "payments", "reviews"]
+
+
+def shard_of(order_ids: pd.Series, shards: int):
+    """Stable shard number (0..shards-1) for each order_id."""
+    return pd.util.hash_pandas_object(order_ids, index=False).to_numpy() % shards
+
+
+def split_shards(data: dict, shards: int) -> list:
+    """Per-shard order-grain datasets plus the broadcast customers dimension."""
+    assignment = {name: shard_of(data[name]["order_id"], shards) for name in SHARDED_DATASETS}
+    return [
+        {**{name: data[name][assignment[name] == i] for name in SHARDED_DATASETS}, "customers": data["customers"]}
+        for i in range(shards)
+    ]
+
+
+def validate_shard(shard: dict) -> dict:
+    """Row counts plus duplicate orders and child rows without an order in the shard."""
+    order_ids = shard["orders"]["order_id"]
+    stats = {
+        "orders": len(order_ids),
+        "duplicate_orders": int(order_ids.duplicated().sum()),
+        "unknown_customers": int((~shard["orders"]["customer_id"].isin(shard["customers"]["customer_id"])).sum()),
+    }
+    for name in ["order_items", "payments", "reviews"]:
+        stats[f"orphan_{name}"] = int((~shard[name]["order_id"].isin(order_ids)).sum())
+    return stats
+
+
+def transform_shard(shard: dict) -> dict:
+    """Worker: validate and transform one shard (orders, wide table, review scores)."""
+    stats = validate_shard(shard)
+    orders = transform_orders(shard["orders"])
+    return {
+        "stats": stats,
+        "orders": orders,
+        "orders_transformed": build_orders_transformed({**shard, "orders": orders}),
+        "review_scores": score_chunk(shard["reviews"]),
+    }
+
+
+def run_sharded_transform(data: dict, shards: int):
+    """Transform order_id shards in `shards` worker processes and merge the results.
+
+    Returns (orders, orders_transformed, review scores), row-for-row as the single-process run.
+    """
+    logger.info(f"🧩 Transforming {shards} order_id shards in parallel...")
+    with ProcessPoolExecutor(max_workers=shards) as pool:
+        results = list(pool.map(transform_shard, split_shards(data, shards)))
+
+    for i, result in enumerate(results):
+        problems = {k: v for k, v in result["stats"].items() if k != "orders" and v}
+        if problems:
+            logger.warning(f"⚠️ Shard {i}: {problems}")
+    logger.info(f"✅ Shard sizes (orders): {[r['stats']['orders'] for r in results]}")
+
+    def merge(key):
+        return pd.concat([r[key] for r in results]).sort_index()
+
+    return merge("orders"), merge("orders_transformed"), merge("review_scores").reset_index(drop=True)
+
+
 def save_to_csv(data: dict):
     """Save cleaned datasets to CSV (processed folder)."""
     logger.info("💾 Saving processed CSVs...")
@@ -85,28 +201,65 @@ def save_to_csv(data: dict):
     data["geo"].to_csv(PROCESSED_PATH / "geolocation_clean.csv", index=False)
 
 
+# Dataset key -> table name, shared by the SQLite and Parquet outputs
+TABLE_NAMES = {
+    "customers": "customers_dim",
+    "sellers": "sellers_dim",
+    "products": "products_dim",
+    "geo": "geolocation_dim",
+    "orders": "orders_fact",
+    "order_items": "order_items_fact",
+    "payments": "payments_fact",
+    "reviews": "reviews_fact",
+    "orders_transformed": "orders_transformed",
+}
+
+# (index name, table, columns) created after every load; partitioned facts index each partition
+INDEXES = [
+    ("ix_orders_transformed_order_id", "orders_transformed", "order_id"),
+    ("ix_orders_transformed_customer_unique_id", "orders_transformed", "customer_unique_id"),
+    ("ix_orders_transformed_purchase_date", "orders_transformed", "purchase_date, order_id"),
+    ("ix_orders_transformed_month_state", "orders_transformed", "purchase_month, customer_state"),
+    ("ix_orders_transformed_state", "orders_transformed", "customer_state"),
+    # (sort key, order_id) pairs for keyset pagination in the explorer
+    ("ix_orders_transformed_item_revenue", "orders_transformed", "item_revenue, order_id"),
+    ("ix_orders_transformed_payment_value", "orders_transformed", "payment_value, order_id"),
+    ("ix_orders_transformed_item_count", "orders_transformed", "item_count, order_id"),
+    ("ix_orders_transformed_delivery_days", "orders_transformed", "delivery_time_days, order_id"),
+]
+
+
 def save_to_database(data: dict):
     """Save datasets into SQLite database."""
     logger.info("💾 Saving tables to SQLite database...")
     engine = create_engine(DB_URL)
 
-    # Dimensions
-    data["customers"].to_sql("customers_dim", engine, if_exists="replace", index=False)
-    data["sellers"].to_sql("sellers_dim", engine, if_exists="replace", index=False)
-    data["products"].to_sql("products_dim", engine, if_exists="replace", index=False)
-    data["geo"].to_sql("geolocation_dim", engine, if_exists="replace", index=False)
+    # Facts go to monthly partitions keyed on their order's purchase month
+    order_months = pd.Series(
+        data["orders"]["order_purchase_timestamp"].dt.strftime("%Y-%m").to_numpy(),
+        index=data["orders"]["order_id"]
+    )
 
-    # Facts
-    data["orders"].to_sql("orders_fact", engine, if_exists="replace", index=False)
-    data["order_items"].to_sql("order_items_fact", engine, if_exists="replace", index=False)
-    data["payments"].to_sql("payments_fact", engine, if_exists="replace", index=False)
-    data["reviews"].to_sql("reviews_fact", engine, if_exists="replace", index=False)
+    # Dimensions, then facts
+    for key, table in TABLE_NAMES.items():
+        if table in PARTITIONED_FACTS:
+            months = data[key]["order_id"].map(order_months)
+            save_partitioned(engine, table, encode_timestamps(data[key]), months)
+        else:
+            encode_timestamps(data[key]).to_sql(table, engine, if_exists="replace", index=False)
 
+    create_indexes(engine, INDEXES)
     logger.info(f"✅ All tables saved to database at {DB_URL}")
 
 
-def run_etl():
-    """Main ETL pipeline."""
+def save_to_parquet(data: dict):
+    """Export tables as Parquet files for the DuckDB query backend."""
+    logger.info("💾 Exporting tables to Parquet...")
+    export_parquet({table: encode_timestamps(data[key]) for key, table in TABLE_NAMES.items()})
+
+
+def run_etl(shards: int = ETL_SHARDS):
+    """Main ETL pipeline; `shards` > 1 runs the order transforms in that many processes."""
     logger.info("🚀 Starting ETL pipeline...")
 
     data = load_raw_data()
@@ -120,14 +273,43 @@ def run_etl():
     )
 
     # Transform
-    data["orders"] = transform_orders(data["orders"])
+    review_scores = None
+    if shards > 1:
+        data["orders"], data["orders_transformed"], review_scores = run_sharded_transform(data, shards)
+    else:
+        data["orders"] = transform_orders(data["orders"])
+        data["orders_transformed"] = build_orders_transformed(data)
 
     # Save outputs
     save_to_csv(data)
     save_to_database(data)
+    save_to_parquet(data)
+
+    # Customer cohorts, retention and RFM
+    build_customer_analytics(data["orders_transformed"])
+
+    # Mergeable distinct-count sketches per (day, state, category)
+    build_distinct_sketches(data)
+
+    # Weighted stratified samples of orders and items for the dashboard's fast preview
+    build_stratified_samples(data)
+
+    # Review full-text index and lexicon sentiment
+    build_review_analytics(data, scored=review_scores)
+
+    # Per-seller and per-product scorecards for ranking, drill-down and the explorer
+    build_seller_scorecard(data)
+    build_product_scorecard(data)
+
+    # Late-delivery risk of every open order, from a model retrained on the delivered ones
+    build_delivery_risk(data)
 
     logger.info("🎉 ETL pipeline complete!")
 
 
 if __name__ == "__main__":
-    run_etl()
+    parser = argparse.ArgumentParser(description="Run the e-commerce ETL pipeline")
+    parser.add_argument("--shards", type=int, default=ETL_SHARDS,
+                        help="order_id hash shards transformed in parallel worker processes (default: 1)")
+    args = parser.parse_args()
+    run_etl(shards=args.shards)
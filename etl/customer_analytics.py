@@ -0,0 +1,246 @@
+import logging
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from dashboard.config import DB_URL
+from etl.db import create_indexes, decode_timestamps, export_parquet
+
+logger = logging.getLogger(__name__)
+
+# Quintile cut points for recency (last purchase) and monetary scores
+RFM_QUANTILES = [0.2, 0.4, 0.6, 0.8]
+# Frequency is almost always 1 in Olist, so it is scored on fixed bins: 1, 2, 3, 4, 5+ orders
+MAX_FREQUENCY_SCORE = 5
+
+ANALYTICS_INDEXES = [
+    ("ix_customer_summary_customer", "customer_summary", "customer_unique_id"),
+    ("ix_customer_summary_cohort", "customer_summary", "cohort_month"),
+    ("ix_customer_summary_rfm", "customer_summary", "rfm_score, customer_unique_id"),
+    ("ix_customer_summary_monetary", "customer_summary", "monetary, customer_unique_id"),
+    ("ix_customer_summary_frequency", "customer_summary", "frequency, customer_unique_id"),
+    ("ix_customer_summary_last_purchase", "customer_summary", "last_purchase, customer_unique_id"),
+    ("ix_customer_activity_customer_month", "customer_activity", "customer_unique_id, activity_month"),
+    ("ix_cohort_retention_cohort_period", "cohort_retention", "cohort_month, period"),
+]
+
+
+def _month_label(ts: pd.Series) -> pd.Series:
+    return ts.dt.strftime("%Y-%m")
+
+
+def _epoch_seconds(ts: pd.Series) -> np.ndarray:
+    return ((ts - pd.Timestamp(0)) // pd.Timedelta(seconds=1)).to_numpy(dtype=float)
+
+
+def _month_index(label: pd.Series) -> pd.Series:
+    """'YYYY-MM' -> months since year 0, so period offsets are plain subtraction."""
+    return label.str[:4].astype(int) * 12 + label.str[5:7].astype(int) - 1
+
+
+def summarize_customers(orders: pd.DataFrame) -> pd.DataFrame:
+    """Per customer_unique_id: first/last purchase, order count and spend."""
+    return orders.groupby("customer_unique_id").agg(
+        first_purchase=("order_purchase_timestamp", "min"),
+        last_purchase=("order_purchase_timestamp", "max"),
+        frequency=("order_id", "nunique"),
+        monetary=("payment_value", "sum"),
+    ).reset_index()
+
+
+def merge_summaries(old: pd.DataFrame, new: pd.DataFrame) -> pd.DataFrame:
+    """Combine two customer summaries; all aggregates are mergeable (min/max/sum)."""
+    return pd.concat([old, new], ignore_index=True).groupby("customer_unique_id").agg(
+        first_purchase=("first_purchase", "min"),
+        last_purchase=("last_purchase", "max"),
+        frequency=("frequency", "sum"),
+        monetary=("monetary", "sum"),
+    ).reset_index()
+
+
+def compute_rfm_thresholds(summary: pd.DataFrame) -> pd.DataFrame:
+    """Quintile cut points for recency (as last purchase epoch) and monetary value."""
+    cuts = np.quantile(
+        [_epoch_seconds(summary["last_purchase"]), summary["monetary"].to_numpy()],
+        RFM_QUANTILES, axis=1
+    ).T
+    thresholds = pd.DataFrame(cuts, columns=[f"cut_{i + 1}" for i in range(len(RFM_QUANTILES))])
+    thresholds.insert(0, "metric", ["recency", "monetary"])
+    return thresholds
+
+
+def score_rfm(summary: pd.DataFrame, thresholds: pd.DataFrame) -> pd.DataFrame:
+    """Attach cohort month and R/F/M scores (1-5) using stored cut points."""
+    cuts = thresholds.set_index("metric")[[f"cut_{i + 1}" for i in range(len(RFM_QUANTILES))]]
+    last_epoch = _epoch_seconds(summary["last_purchase"])
+
+    summary["cohort_month"] = _month_label(summary["first_purchase"])
+    # Recency is scored on the last purchase date, so scores stay stable between rebuilds
+    summary["r_score"] = np.searchsorted(cuts.loc["recency"].to_numpy(), last_epoch, side="right") + 1
+    summary["f_score"] = np.clip(summary["frequency"].to_numpy(), 1, MAX_FREQUENCY_SCORE)
+    summary["m_score"] = np.searchsorted(
+        cuts.loc["monetary"].to_numpy(), summary["monetary"].to_numpy(), side="right"
+    ) + 1
+    summary["rfm_score"] = summary["r_score"] * 100 + summary["f_score"] * 10 + summary["m_score"]
+    return summary
+
+
+def customer_activity(orders: pd.DataFrame) -> pd.DataFrame:
+    """Distinct (customer, month) pairs with at least one order."""
+    activity = pd.DataFrame({
+        "customer_unique_id": orders["customer_unique_id"],
+        "activity_month": _month_label(orders["order_purchase_timestamp"]),
+    })
+    return activity.drop_duplicates(ignore_index=True)
+
+
+def retention_matrix(activity: pd.DataFrame, summary: pd.DataFrame) -> pd.DataFrame:
+    """Long-form retention: active customers per (cohort month, months since first purchase)."""
+    df = activity.merge(summary[["customer_unique_id", "cohort_month"]], on="customer_unique_id")
+    df["period"] = _month_index(df["activity_month"]) - _month_index(df["cohort_month"])
+    matrix = df.groupby(["cohort_month", "period"]).size().rename("customers").reset_index()
+    sizes = matrix.loc[matrix["period"] == 0].set_index("cohort_month")["customers"]
+    matrix["cohort_size"] = matrix["cohort_month"].map(sizes)
+    matrix["retention_rate"] = (100.0 * matrix["customers"] / matrix["cohort_size"]).round(2)
+    return matrix
+
+
+def _prepare_orders(orders: pd.DataFrame) -> pd.DataFrame:
+    orders = orders[["order_id", "customer_unique_id", "order_purchase_timestamp", "payment_value"]].copy()
+    orders["order_purchase_timestamp"] = pd.to_datetime(orders["order_purchase_timestamp"])
+    return orders
+
+
+def build_customer_analytics(orders: pd.DataFrame, engine=None):
+    """Full build of customer_summary (with RFM), customer_activity and cohort_retention."""
+    logger.info("👥 Building customer cohorts and RFM scores...")
+    engine = engine or create_engine(DB_URL)
+    orders = _prepare_orders(orders)
+
+    summary = summarize_customers(orders)
+    thresholds = compute_rfm_thresholds(summary)
+    summary = score_rfm(summary, thresholds)
+    activity = customer_activity(orders)
+    retention = retention_matrix(activity, summary)
+
+    tables = {
+        "customer_summary": summary,
+        "customer_activity": activity,
+        "cohort_retention": retention,
+        "rfm_thresholds": thresholds,
+    }
+    with engine.begin() as conn:
+        for table, df in tables.items():
+            df.to_sql(table, conn, if_exists="replace", index=False)
+    create_indexes(engine, ANALYTICS_INDEXES)
+    export_parquet(tables)
+
+    logger.info(f"✅ Customer analytics built for {len(summary)} customers, {summary['cohort_month'].nunique()} cohorts")
+
+
+def _read_batch_customers(conn):
+    """Existing summary and activity rows of the customers listed in _customer_batch."""
+    old_summary = pd.read_sql(
+        """
+        SELECT s.customer_unique_id, s.first_purchase, s.last_purchase, s.frequency,
+               s.monetary, s.cohort_month
+        FROM customer_summary s
+        JOIN _customer_batch b ON s.customer_unique_id = b.customer_unique_id
+        """, conn, parse_dates=["first_purchase", "last_purchase"]
+    )
+    old_activity = pd.read_sql(
+        """
+        SELECT a.customer_unique_id, a.activity_month
+        FROM customer_activity a
+        JOIN _customer_batch b ON a.customer_unique_id = b.customer_unique_id
+        """, conn
+    )
+    return old_summary, old_activity
+
+
+def _write_batch_customers(conn, summary: pd.DataFrame, activity: pd.DataFrame, old_cohorts: pd.Series) -> int:
+    """Replace the batch customers' rows and recompute the retention of every touched cohort."""
+    for table in ["customer_summary", "customer_activity"]:
+        conn.exec_driver_sql(
+            f"DELETE FROM {table} WHERE customer_unique_id IN (SELECT customer_unique_id FROM _customer_batch)"
+        )
+    summary.to_sql("customer_summary", conn, if_exists="append", index=False)
+    activity.to_sql("customer_activity", conn, if_exists="append", index=False)
+
+    # Cohorts touched by the batch: the customers' old and new cohort months
+    cohorts = pd.DataFrame({"cohort_month": pd.concat([old_cohorts, summary["cohort_month"]]).unique()})
+    cohorts.to_sql("_cohort_batch", conn, if_exists="replace", index=False)
+    cohort_rows = pd.read_sql(
+        """
+        SELECT a.customer_unique_id, a.activity_month, s.cohort_month
+        FROM customer_activity a
+        JOIN customer_summary s ON a.customer_unique_id = s.customer_unique_id
+        WHERE s.cohort_month IN (SELECT cohort_month FROM _cohort_batch)
+        """, conn
+    )
+    retention = retention_matrix(
+        cohort_rows[["customer_unique_id", "activity_month"]],
+        cohort_rows[["customer_unique_id", "cohort_month"]].drop_duplicates(),
+    )
+    conn.exec_driver_sql(
+        "DELETE FROM cohort_retention WHERE cohort_month IN (SELECT cohort_month FROM _cohort_batch)"
+    )
+    retention.to_sql("cohort_retention", conn, if_exists="append", index=False)
+
+    conn.exec_driver_sql("DROP TABLE _customer_batch")
+    conn.exec_driver_sql("DROP TABLE _cohort_batch")
+    return len(cohorts)
+
+
+def update_customer_analytics(new_orders: pd.DataFrame, engine=None):
+    """Fold a batch of *new* orders into the customer tables.
+
+    Only the batch's customers and the cohorts they belong to are rewritten;
+    RFM scores reuse the cut points of the last full build.
+    """
+    engine = engine or create_engine(DB_URL)
+    new_orders = _prepare_orders(new_orders)
+    if new_orders.empty:
+        return
+
+    with engine.begin() as conn:
+        new_orders[["customer_unique_id"]].drop_duplicates().to_sql(
+            "_customer_batch", conn, if_exists="replace", index=False
+        )
+        old_summary, old_activity = _read_batch_customers(conn)
+        thresholds = pd.read_sql("SELECT * FROM rfm_thresholds", conn)
+
+        summary = merge_summaries(old_summary.drop(columns="cohort_month"), summarize_customers(new_orders))
+        summary = score_rfm(summary, thresholds)
+        activity = pd.concat([old_activity, customer_activity(new_orders)]).drop_duplicates(ignore_index=True)
+        cohorts = _write_batch_customers(conn, summary, activity, old_summary["cohort_month"])
+
+    logger.info(f"👥 Updated {len(summary)} customers across {cohorts} cohorts")
+
+
+def refresh_customer_analytics(customer_ids, engine=None):
+    """Recompute the given customers from all their orders in orders_transformed.
+
+    Unlike `update_customer_analytics` this is safe for re-sent or corrected
+    orders, at the cost of reading each affected customer's order history.
+    """
+    engine = engine or create_engine(DB_URL)
+    keys = pd.DataFrame({"customer_unique_id": pd.unique(pd.Series(customer_ids).dropna())})
+    if keys.empty:
+        return
+
+    with engine.begin() as conn:
+        keys.to_sql("_customer_batch", conn, if_exists="replace", index=False)
+        old_summary, _ = _read_batch_customers(conn)
+        orders = _prepare_orders(decode_timestamps(pd.read_sql(
+            """
+            SELECT o.order_id, o.customer_unique_id, o.order_purchase_timestamp, o.payment_value
+            FROM orders_transformed o
+            JOIN _customer_batch b ON o.customer_unique_id = b.customer_unique_id
+            """, conn
+        )))
+        thresholds = pd.read_sql("SELECT * FROM rfm_thresholds", conn)
+
+        summary = score_rfm(summarize_customers(orders), thresholds)
+        cohorts = _write_batch_customers(conn, summary, customer_activity(orders), old_summary["cohort_month"])
+
+    logger.info(f"👥 Refreshed {len(summary)} customers across {cohorts} cohorts")
@@ -0,0 +1,83 @@
+import logging
+import pandas as pd
+from dashboard.config import PARQUET_PATH
+
+try:
+    import duckdb
+except ImportError:  # optional dependency, only needed for the columnar backend
+    duckdb = None
+
+logger = logging.getLogger(__name__)
+
+# --- Timestamp storage ---
+# The order timestamps are stored as integer Unix epoch seconds (NULL when missing)
+# and purchase dates/months as YYYYMMDD / YYYYMM integers, so date filters and
+# monthly grouping compare integers instead of parsing text on every row.
+ORDER_TIMESTAMPS = [
+    "order_purchase_timestamp", "order_approved_at", "order_delivered_carrier_date",
+    "order_delivered_customer_date", "order_estimated_delivery_date",
+]
+EPOCH = pd.Timestamp(0)
+
+
+def encode_timestamps(df: pd.DataFrame, columns=ORDER_TIMESTAMPS) -> pd.DataFrame:
+    """Copy of `df` with its datetime `columns` as nullable epoch seconds, ready to store."""
+    present = [col for col in columns if col in df.columns]
+    if not present:
+        return df
+    return df.assign(**{
+        col: ((pd.to_datetime(df[col]) - EPOCH) // pd.Timedelta(seconds=1)).astype("Int64") for col in present
+    })
+
+
+def decode_timestamps(df: pd.DataFrame, columns=ORDER_TIMESTAMPS) -> pd.DataFrame:
+    """Stored epoch-second `columns` back to datetimes, in place."""
+    for col in columns:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], unit="s")
+    return df
+
+
+def epoch_bounds(start_date, end_date) -> list:
+    """[first, last] epoch second of an inclusive date range."""
+    return [
+        int((pd.Timestamp(str(start_date)) - EPOCH) // pd.Timedelta(seconds=1)),
+        int((pd.Timestamp(str(end_date)) + pd.Timedelta(days=1) - EPOCH) // pd.Timedelta(seconds=1)) - 1,
+    ]
+
+
+def date_key(value) -> int:
+    """Date (or 'YYYY-MM-DD') -> YYYYMMDD integer, the stored form of purchase_date."""
+    return int(pd.Timestamp(str(value)).strftime("%Y%m%d"))
+
+
+def month_label(keys: pd.Series) -> pd.Series:
+    """YYYYMM integers -> 'YYYY-MM' labels (NULL stays NULL)."""
+    keys = pd.to_numeric(keys).astype("Int64")
+    return (keys // 100).astype(str).str.cat((keys % 100).astype(str).str.zfill(2), sep="-").where(keys.notna())
+
+
+def create_indexes(engine, indexes):
+    """Create (index name, table, columns) indexes if they do not exist yet."""
+    with engine.begin() as conn:
+        for name, table, columns in indexes:
+            conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+    logger.info(f"🗂️ Ensured {len(indexes)} indexes")
+
+
+def export_parquet(frames: dict):
+    """Export {table name: DataFrame} as Parquet files for the DuckDB query backend."""
+    if duckdb is None:
+        logger.warning("⚠️ duckdb not installed, skipping Parquet export")
+        return
+    PARQUET_PATH.mkdir(parents=True, exist_ok=True)
+    conn = duckdb.connect()
+    try:
+        for table, df in frames.items():
+            conn.register("export_df", df)
+            path = (PARQUET_PATH / f"{table}.parquet").as_posix()
+            conn.execute(f"COPY export_df TO '{path}' (FORMAT PARQUET)")
+            conn.unregister("export_df")
+    finally:
+        conn.close()
+    logger.info(f"✅ Exported {len(frames)} Parquet tables to {PARQUET_PATH}")
@@ -0,0 +1,334 @@
+import logging
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from dashboard.config import DB_URL
+from etl.db import ORDER_TIMESTAMPS, create_indexes, decode_timestamps, export_parquet
+
+logger = logging.getLogger(__name__)
+
+# --- Late-delivery risk ---
+# Every open order (not delivered, not canceled) gets the probability that it will
+# arrive after its estimated date. A logistic regression on delivered orders is
+# fitted with NumPy only (Newton / IRLS steps with a small ridge penalty), on
+# features built for the whole order table at once:
+#   - seller, route (seller state -> customer state) and category late rates,
+#     smoothed towards the overall rate; delivered orders leave their own outcome
+#     out, so the model does not learn from the label it is trained on
+#   - seller volume, same-state flag, zip-centroid distance, freight, items
+#   - promised days (estimate - purchase) and approval delay
+# Orders are keyed on their first item's seller and category. Missing values are
+# imputed with the training mean. Open orders are scored in SCORE_BATCH chunks.
+#
+# The full ETL retrains the model and stores it (delivery_risk_model) with the
+# late-rate encodings it was fitted with (delivery_risk_encodings); micro-batches
+# re-score the affected orders with that stored model.
+PRIOR_WEIGHT = 20
+L2_PENALTY = 1.0
+MAX_ITERATIONS = 25
+HOLDOUT_SHARE = 0.2
+SCORE_BATCH = 50_000
+EARTH_RADIUS_KM = 6371.0
+CLOSED_STATUSES = ["canceled", "unavailable"]
+
+# Risk bands as multiples of the overall late rate the model was trained on
+RISK_BANDS = [(2.0, "high"), (1.0, "elevated")]
+
+ENCODED_KEYS = ["seller_id", "route", "category"]
+
+FEATURES = [
+    "seller_late_rate", "route_late_rate", "category_late_rate", "seller_log_orders",
+    "same_state", "log_distance_km", "log_freight", "freight_share", "item_count",
+    "promised_days", "approval_hours",
+]
+
+RISK_COLUMNS = [
+    "order_id", "order_status", "customer_state", "seller_id", "seller_state", "category",
+    "purchase_date", "estimated_date", "risk_score", "risk_band",
+]
+
+RISK_INDEXES = [
+    ("ix_delivery_risk_order", "delivery_risk", "order_id"),
+    ("ix_delivery_risk_score", "delivery_risk", "risk_score, order_id"),
+    ("ix_delivery_risk_state_score", "delivery_risk", "customer_state, risk_score, order_id"),
+    ("ix_delivery_risk_band", "delivery_risk", "risk_band, risk_score, order_id"),
+    ("ix_delivery_risk_encodings_key", "delivery_risk_encodings", "kind, key"),
+    ("ix_geolocation_dim_zip", "geolocation_dim", "geolocation_zip_code_prefix"),
+]
+
+
+def zip_centroids(geo: pd.DataFrame) -> pd.DataFrame:
+    """Mean latitude/longitude per zip code prefix."""
+    return geo.groupby("geolocation_zip_code_prefix")[["geolocation_lat", "geolocation_lng"]].mean()
+
+
+def haversine_km(lat1, lng1, lat2, lng2) -> np.ndarray:
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def order_frame(orders: pd.DataFrame, order_items: pd.DataFrame, products: pd.DataFrame,
+                sellers: pd.DataFrame, customers: pd.DataFrame, centroids: pd.DataFrame) -> pd.DataFrame:
+    """One row per order: keys, raw features and outcome."""
+    first_items = (
+        order_items.sort_values(["order_id", "order_item_id"])
+        .drop_duplicates("order_id")[["order_id", "product_id", "seller_id"]]
+        .merge(products[["product_id", "product_category_name_english"]], on="product_id", how="left")
+        .merge(sellers[["seller_id", "seller_state", "seller_zip_code_prefix"]], on="seller_id", how="left")
+        .set_index("order_id")
+    )
+    frame = orders[[
+        "order_id", "order_status", "customer_id", "customer_state", "purchase_date", "delivered_flag",
+        "late_delivery_flag", "item_count", "item_price", "item_freight",
+        "order_purchase_timestamp", "order_approved_at", "order_estimated_delivery_date",
+    ]].join(first_items, on="order_id")
+    frame["category"] = frame["product_category_name_english"].fillna("unknown")
+    frame["seller_id"] = frame["seller_id"].fillna("unknown")
+    frame["customer_state"] = frame["customer_state"].fillna("unknown")
+    frame["seller_state"] = frame["seller_state"].fillna("unknown")
+    frame["route"] = frame["seller_state"] + ">" + frame["customer_state"]
+
+    customer_zip = frame["customer_id"].map(customers.set_index("customer_id")["customer_zip_code_prefix"])
+    customer_at = centroids.reindex(customer_zip.to_numpy())
+    seller_at = centroids.reindex(frame["seller_zip_code_prefix"].to_numpy())
+    frame["distance_km"] = haversine_km(
+        customer_at["geolocation_lat"], customer_at["geolocation_lng"],
+        seller_at["geolocation_lat"], seller_at["geolocation_lng"],
+    )
+
+    purchased = frame["order_purchase_timestamp"]
+    frame["promised_days"] = (frame["order_estimated_delivery_date"] - purchased) / pd.Timedelta(days=1)
+    frame["approval_hours"] = (frame["order_approved_at"] - purchased) / pd.Timedelta(hours=1)
+    estimated = frame["order_estimated_delivery_date"]
+    frame["estimated_date"] = (estimated.dt.year * 10000 + estimated.dt.month * 100 + estimated.dt.day).astype("Int64")
+    return frame
+
+
+def late_rate_encodings(frame: pd.DataFrame) -> pd.DataFrame:
+    """Delivered and late order counts per seller, route and category, plus the overall ('all', 'all') row."""
+    delivered = frame[frame["delivered_flag"] == 1]
+    counts = [
+        delivered.groupby(key)["late_delivery_flag"].agg(["size", "sum"]).reset_index()
+        .rename(columns={key: "key"}).assign(kind=key)
+        for key in ENCODED_KEYS
+    ]
+    overall = pd.DataFrame({"kind": ["all"], "key": ["all"], "size": [len(delivered)],
+                            "sum": [delivered["late_delivery_flag"].sum()]})
+    enc = pd.concat(counts + [overall], ignore_index=True).rename(
+        columns={"size": "delivered_orders", "sum": "late_orders"}
+    )
+    enc["late_orders"] = enc["late_orders"].astype(int)
+    enc["late_rate"] = enc["late_orders"] / enc["delivered_orders"].where(enc["delivered_orders"] > 0)
+    return enc[["kind", "key", "delivered_orders", "late_orders", "late_rate"]]
+
+
+def feature_matrix(frame: pd.DataFrame, encodings: pd.DataFrame, leave_out: bool = False) -> np.ndarray:
+    """(orders x FEATURES) array; `leave_out` drops each delivered order's own outcome from its encodings."""
+    overall = encodings.loc[encodings["kind"] == "all"].iloc[0]
+    prior = overall["late_orders"] / max(overall["delivered_orders"], 1)
+    own_delivered = frame["delivered_flag"].to_numpy() if leave_out else 0
+    own_late = frame["late_delivery_flag"].to_numpy() if leave_out else 0
+
+    columns = {}
+    for key in ENCODED_KEYS:
+        stats = encodings[encodings["kind"] == key].set_index("key")
+        delivered = frame[key].map(stats["delivered_orders"]).fillna(0).to_numpy() - own_delivered
+        late = frame[key].map(stats["late_orders"]).fillna(0).to_numpy() - own_late
+        columns[f"{key.removesuffix('_id')}_late_rate"] = (late + PRIOR_WEIGHT * prior) / (delivered + PRIOR_WEIGHT)
+        if key == "seller_id":
+            columns["seller_log_orders"] = np.log1p(delivered)
+
+    price, freight = frame["item_price"].to_numpy(float), frame["item_freight"].to_numpy(float)
+    columns.update({
+        "same_state": (frame["seller_state"] == frame["customer_state"]).to_numpy(float),
+        "log_distance_km": np.log1p(frame["distance_km"].to_numpy(float)),
+        "log_freight": np.log1p(freight),
+        "freight_share": freight / np.where(price + freight > 0, price + freight, np.nan),
+        "item_count": frame["item_count"].to_numpy(float),
+        "promised_days": frame["promised_days"].to_numpy(float),
+        "approval_hours": frame["approval_hours"].to_numpy(float),
+    })
+    return np.column_stack([columns[name] for name in FEATURES])
+
+
+# --- Model ---
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+def _design(X: np.ndarray, mean: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    """Standardized features with an intercept column; missing values become the mean (0)."""
+    Z = np.nan_to_num((X - mean) / scale, nan=0.0)
+    return np.column_stack([np.ones(len(Z)), Z])
+
+
+def fit_logistic(X: np.ndarray, y: np.ndarray) -> dict:
+    """Ridge logistic regression by Newton steps; returns standardization and weights (intercept first)."""
+    mean = np.nanmean(X, axis=0)
+    scale = np.nanstd(X, axis=0)
+    mean, scale = np.nan_to_num(mean), np.where(np.nan_to_num(scale) > 0, np.nan_to_num(scale), 1.0)
+    Z = _design(X, mean, scale)
+    penalty = L2_PENALTY * np.eye(Z.shape[1])
+    penalty[0, 0] = 0.0
+    weights = np.zeros(Z.shape[1])
+    for _ in range(MAX_ITERATIONS):
+        p = _sigmoid(Z @ weights)
+        gradient = Z.T @ (y - p) - penalty @ weights
+        hessian = (Z * (p * (1 - p))[:, None]).T @ Z + penalty
+        step = np.linalg.solve(hessian, gradient)
+        weights += step
+        if np.abs(step).max() < 1e-6:
+            break
+    return {"mean": mean, "scale": scale, "weights": weights}
+
+
+def score(X: np.ndarray, model: dict, batch_size: int = SCORE_BATCH) -> np.ndarray:
+    """Late-delivery probability of every row of `X`, batch_size rows at a time."""
+    scores = np.empty(len(X))
+    for start in range(0, len(X), batch_size):
+        chunk = _design(X[start:start + batch_size], model["mean"], model["scale"])
+        scores[start:start + batch_size] = _sigmoid(chunk @ model["weights"])
+    return scores
+
+
+def auc(y: np.ndarray, scores: np.ndarray) -> float:
+    """Area under the ROC curve from score ranks (ties share their mean rank)."""
+    positives = int(y.sum())
+    negatives = len(y) - positives
+    if not positives or not negatives:
+        return float("nan")
+    ranks = pd.Series(scores).rank().to_numpy()
+    return (ranks[y == 1].sum() - positives * (positives + 1) / 2) / (positives * negatives)
+
+
+def model_table(model: dict) -> pd.DataFrame:
+    return pd.DataFrame({
+        "feature": ["intercept"] + FEATURES,
+        "mean": np.concatenate([[0.0], model["mean"]]),
+        "scale": np.concatenate([[1.0], model["scale"]]),
+        "weight": model["weights"],
+    })
+
+
+def model_from_table(table: pd.DataFrame) -> dict:
+    table = table.set_index("feature").loc[["intercept"] + FEATURES]
+    return {
+        "mean": table["mean"].to_numpy()[1:],
+        "scale": table["scale"].to_numpy()[1:],
+        "weights": table["weight"].to_numpy(),
+    }
+
+
+def risk_scores(frame: pd.DataFrame, encodings: pd.DataFrame, model: dict) -> pd.DataFrame:
+    """RISK_COLUMNS rows for the open orders of `frame`."""
+    open_orders = frame[(frame["delivered_flag"] == 0) & ~frame["order_status"].isin(CLOSED_STATUSES)]
+    overall = encodings.loc[encodings["kind"] == "all"].iloc[0]
+    base_rate = overall["late_orders"] / max(overall["delivered_orders"], 1)
+    scores = score(feature_matrix(open_orders, encodings), model)
+    bands = np.select([scores >= ratio * base_rate for ratio, _ in RISK_BANDS], [b for _, b in RISK_BANDS], "low")
+    return open_orders.assign(risk_score=scores.round(4), risk_band=bands)[RISK_COLUMNS].reset_index(drop=True)
+
+
+def delivery_risk_tables(data: dict) -> dict:
+    """Train on the delivered orders and score the open ones; {table: DataFrame}."""
+    orders = data["orders_transformed"]
+    frame = order_frame(orders, data["order_items"], data["products"], data["sellers"], data["customers"],
+                        zip_centroids(data["geo"]))
+    encodings = late_rate_encodings(frame)
+    delivered = frame["delivered_flag"].to_numpy() == 1
+    X = feature_matrix(frame[delivered], encodings, leave_out=True)
+    y = frame.loc[delivered, "late_delivery_flag"].to_numpy(float)
+
+    # Quality check on a stable hash holdout before fitting on every delivered order
+    holdout = pd.util.hash_pandas_object(frame.loc[delivered, "order_id"], index=False).to_numpy() % 100 \
+        < HOLDOUT_SHARE * 100
+    if 0 < holdout.sum() < len(y):
+        check = fit_logistic(X[~holdout], y[~holdout])
+        logger.info(f"🚚 Late-delivery model holdout AUC: {auc(y[holdout], score(X[holdout], check)):.3f}")
+    model = fit_logistic(X, y)
+    return {
+        "delivery_risk": risk_scores(frame, encodings, model),
+        "delivery_risk_model": model_table(model),
+        "delivery_risk_encodings": encodings,
+    }
+
+
+def build_delivery_risk(data: dict, engine=None):
+    """Full build: retrain the late-delivery model and score every open order."""
+    logger.info("🚚 Scoring open orders for late-delivery risk...")
+    engine = engine or create_engine(DB_URL)
+    tables = delivery_risk_tables(data)
+    with engine.begin() as conn:
+        for table, df in tables.items():
+            df.to_sql(table, conn, if_exists="replace", index=False)
+    create_indexes(engine, RISK_INDEXES)
+    export_parquet(tables)
+    scores, encodings = tables["delivery_risk"], tables["delivery_risk_encodings"]
+    trained = encodings.loc[encodings["kind"] == "all", "delivered_orders"].iloc[0]
+    logger.info(
+        f"✅ Scored {len(scores)} open orders ({(scores['risk_band'] == 'high').sum()} high risk) "
+        f"with a model trained on {trained} deliveries"
+    )
+
+
+def refresh_delivery_risk(order_ids, engine=None):
+    """Re-score `order_ids` with the stored model; orders no longer open drop out of delivery_risk."""
+    engine = engine or create_engine(DB_URL)
+    keys = pd.DataFrame({"order_id": pd.unique(pd.Series(list(order_ids), dtype=object).dropna())})
+    if keys.empty:
+        return
+
+    with engine.begin() as conn:
+        keys.to_sql("_risk_orders", conn, if_exists="replace", index=False)
+        orders = decode_timestamps(pd.read_sql(
+            "SELECT * FROM orders_transformed WHERE order_id IN (SELECT order_id FROM _risk_orders)", conn
+        ), ORDER_TIMESTAMPS)
+        items = pd.read_sql(
+            """
+            SELECT order_id, order_item_id, product_id, seller_id FROM order_items_fact
+            WHERE order_id IN (SELECT order_id FROM _risk_orders)
+            """, conn
+        )
+        products = pd.read_sql(
+            """
+            SELECT product_id, product_category_name_english FROM products_dim
+            WHERE product_id IN (SELECT product_id FROM order_items_fact
+                                 WHERE order_id IN (SELECT order_id FROM _risk_orders))
+            """, conn
+        )
+        sellers = pd.read_sql(
+            """
+            SELECT seller_id, seller_zip_code_prefix, seller_state FROM sellers_dim
+            WHERE seller_id IN (SELECT seller_id FROM order_items_fact
+                                WHERE order_id IN (SELECT order_id FROM _risk_orders))
+            """, conn
+        )
+        customers = pd.read_sql(
+            """
+            SELECT customer_id, customer_zip_code_prefix FROM customers_dim
+            WHERE customer_id IN (SELECT customer_id FROM orders_transformed
+                                  WHERE order_id IN (SELECT order_id FROM _risk_orders))
+            """, conn
+        )
+        zips = pd.DataFrame({"geolocation_zip_code_prefix": pd.unique(pd.concat([
+            customers["customer_zip_code_prefix"], sellers["seller_zip_code_prefix"]
+        ]).dropna())})
+        zips.to_sql("_risk_zips", conn, if_exists="replace", index=False)
+        geo = pd.read_sql(
+            """
+            SELECT geolocation_zip_code_prefix, geolocation_lat, geolocation_lng FROM geolocation_dim
+            WHERE geolocation_zip_code_prefix IN (SELECT geolocation_zip_code_prefix FROM _risk_zips)
+            """, conn
+        )
+        encodings = pd.read_sql("SELECT * FROM delivery_risk_encodings", conn)
+        model = model_from_table(pd.read_sql("SELECT * FROM delivery_risk_model", conn))
+
+        frame = order_frame(orders, items, products, sellers, customers, zip_centroids(geo))
+        scores = risk_scores(frame, encodings, model)
+        conn.exec_driver_sql("DELETE FROM delivery_risk WHERE order_id IN (SELECT order_id FROM _risk_orders)")
+        scores.to_sql("delivery_risk", conn, if_exists="append", index=False)
+        conn.exec_driver_sql("DROP TABLE _risk_orders")
+        conn.exec_driver_sql("DROP TABLE _risk_zips")
+    logger.info(f"🚚 Re-scored {len(keys)} orders, {len(scores)} still open")
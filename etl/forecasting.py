@@ -0,0 +1,156 @@
+import logging
+import threading
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# --- Batch revenue forecasting ---
+# Every (category, state) monthly revenue series is a row of one (series x months)
+# array. All series are fitted together with damped-trend Holt-Winters, additive
+# seasonality included once there are two full seasons of history. The model
+# loops over months only: each step updates the level/trend/season of every
+# series and every candidate smoothing setting at once. Each series then keeps
+# the setting with the lowest one-step-ahead squared error.
+# Intervals are approximate 95% intervals, +/- 1.96 * sigma * sqrt(h), with sigma
+# the series' one-step error.
+SEASON = 12
+MAX_HORIZON = 12
+DAMPING = 0.9
+CONFIDENCE_Z = 1.96
+ALPHAS = np.array([0.1, 0.3, 0.5, 0.8])
+BETAS = np.array([0.0, 0.1, 0.3])
+GAMMAS = np.array([0.0, 0.1, 0.3])
+
+SERIES_KEYS = ["category", "state"]
+
+# Forecast batches are cached per backend and data version
+_batches = {}
+_batches_lock = threading.Lock()
+
+
+def revenue_series(backend):
+    """(series keys, months, revenue array of shape (series, months)) from the facts.
+
+    Months run from the first purchase month to the last complete one, with zero
+    revenue where a series had no sales.
+    """
+    # CROSS JOIN keeps the items as the outer loop in SQLite: one pass over the item
+    # partitions with order_id lookups, instead of an automatic index over all items
+    cells = backend.query("""
+        SELECT o.purchase_month AS month,
+               COALESCE(p.product_category_name_english, 'unknown') AS category,
+               COALESCE(o.customer_state, 'unknown') AS state,
+               SUM(oi.price + oi.freight_value) AS revenue
+        FROM order_items_fact oi
+        CROSS JOIN orders_transformed o
+        LEFT JOIN products_dim p ON oi.product_id = p.product_id
+        WHERE oi.order_id = o.order_id
+        GROUP BY month, category, state;
+    """)
+    last_day = backend.query("SELECT MAX(purchase_date) AS last_day FROM orders_transformed;")["last_day"].iloc[0]
+    if cells.empty:
+        return pd.DataFrame(columns=SERIES_KEYS), pd.PeriodIndex([], freq="M"), np.zeros((0, 0))
+
+    # YYYYMM -> months since year 0, so a month's column is a subtraction
+    index = (cells["month"] // 100 * 12 + cells["month"] % 100 - 1).to_numpy()
+    first, last = int(index.min()), int(index.max())
+    months = pd.period_range(pd.Period(year=first // 12, month=first % 12 + 1, freq="M"),
+                             periods=last - first + 1, freq="M")
+    # The newest month only counts once complete, i.e. it has sales on its last day
+    if pd.Timestamp(str(int(last_day))) < months[-1].end_time.normalize():
+        months, keep = months[:-1], index < last
+        cells, index = cells[keep], index[keep]
+
+    keys = cells[SERIES_KEYS].drop_duplicates().sort_values(SERIES_KEYS, ignore_index=True)
+    rows = cells.merge(keys.reset_index(), on=SERIES_KEYS, how="left")["index"].to_numpy()
+    history = np.zeros((len(keys), len(months)))
+    np.add.at(history, (rows, index - first), cells["revenue"].to_numpy())
+    return keys, months, history
+
+
+def _initial_state(history: np.ndarray, seasonal: bool):
+    """Level, trend and seasonal indices to start the recursion from."""
+    series, _ = history.shape
+    if seasonal:
+        # Trend from the first two seasonal means; the season is what remains of the
+        # first season around that line, and the level sits at the season's last month
+        first_mean, second_mean = history[:, :SEASON].mean(axis=1), history[:, SEASON:2 * SEASON].mean(axis=1)
+        trend = (second_mean - first_mean) / SEASON
+        line = first_mean[:, None] + trend[:, None] * (np.arange(SEASON) - (SEASON - 1) / 2)
+        season = history[:, :SEASON] - line
+        level = line[:, -1]
+    else:
+        level, trend, season = history[:, 0].copy(), np.zeros(series), np.zeros((series, SEASON))
+    return level, trend, season
+
+
+def fit_forecast(history: np.ndarray, horizon: int = MAX_HORIZON) -> dict:
+    """Fit every row of `history` and forecast `horizon` months ahead.
+
+    Returns the forecast (clipped at 0) and its 95% interval half-width, both
+    (series, horizon), plus the one-step error sigma and the chosen smoothing
+    constants per series.
+    """
+    series, months = history.shape
+    seasonal = months >= 2 * SEASON
+    gammas = GAMMAS if seasonal else np.array([0.0])
+    grid = np.array(np.meshgrid(ALPHAS, BETAS, gammas, indexing="ij")).reshape(3, -1)
+    alpha, beta, gamma = (g[:, None] for g in grid)  # (settings, 1), broadcast over series
+
+    level0, trend0, season0 = _initial_state(history, seasonal)
+    level = np.broadcast_to(level0, (grid.shape[1], series)).copy()
+    trend = np.broadcast_to(trend0, (grid.shape[1], series)).copy()
+    season = np.broadcast_to(season0, (grid.shape[1], series, SEASON)).copy()
+    sse = np.zeros((grid.shape[1], series))
+
+    start = SEASON if seasonal else 1
+    for t in range(start, months):
+        y, s = history[:, t], t % SEASON
+        error = y - (level + DAMPING * trend + season[:, :, s])
+        sse += error ** 2
+        new_level = alpha * (y - season[:, :, s]) + (1 - alpha) * (level + DAMPING * trend)
+        trend = beta * (new_level - level) + (1 - beta) * DAMPING * trend
+        season[:, :, s] = gamma * (y - new_level) + (1 - gamma) * season[:, :, s]
+        level = new_level
+
+    best = sse.argmin(axis=0)
+    pick = (best, np.arange(series))
+    steps = np.arange(1, horizon + 1)
+    damped = np.cumsum(DAMPING ** steps)
+    future_season = season[pick][:, (months - 1 + steps) % SEASON]
+    forecast = level[pick][:, None] + damped[None, :] * trend[pick][:, None] + future_season
+    sigma = np.sqrt(sse[pick] / max(months - start, 1))
+    return {
+        "forecast": np.clip(forecast, 0, None),
+        "margin": CONFIDENCE_Z * sigma[:, None] * np.sqrt(steps)[None, :],
+        "sigma": sigma,
+        "alpha": grid[0, best], "beta": grid[1, best], "gamma": grid[2, best],
+    }
+
+
+def forecast_batch(backend) -> dict:
+    """All series with their history and forecast, computed once per data version."""
+    key = (backend.name, backend.data_version())
+    with _batches_lock:
+        if key not in _batches:
+            keys, months, history = revenue_series(backend)
+            fit = fit_forecast(history) if history.size else None
+            future = pd.period_range(months[-1] + 1, periods=MAX_HORIZON, freq="M") if len(months) else months
+            # Older versions of this backend can never be asked for again
+            for stale in [k for k in _batches if k[0] == backend.name]:
+                del _batches[stale]
+            _batches[key] = {"keys": keys, "months": months, "future": future, "history": history, "fit": fit}
+            logger.info(f"🔮 Forecast {len(keys)} series x {MAX_HORIZON} months from {len(months)} months of history")
+        return _batches[key]
+
+
+def series_mask(batch: dict, category=None, state=None) -> np.ndarray:
+    """Rows of the batch matching a category and/or state (None matches all)."""
+    keys = batch["keys"]
+    mask = np.ones(len(keys), dtype=bool)
+    if category:
+        mask &= (keys["category"] == category).to_numpy()
+    if state:
+        mask &= (keys["state"] == state).to_numpy()
+    return mask
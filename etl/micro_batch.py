@@ -0,0 +1,313 @@
+import time
+import shutil
+import logging
+import argparse
+from datetime import datetime
+import pandas as pd
+from sqlalchemy import create_engine
+from dashboard.config import INBOX_PATH, DB_URL
+from etl.clean_data import transform_orders, build_orders_transformed
+from etl.db import ORDER_TIMESTAMPS, decode_timestamps, encode_timestamps, month_label
+from etl.customer_analytics import refresh_customer_analytics
+from etl.distinct_sketches import sketch_rows, update_distinct_sketches
+from etl.partitions import compact_partitions, upsert_partitions
+from etl.review_text import update_review_analytics
+from etl.seller_scorecard import refresh_seller_scorecard
+from etl.product_scorecard import refresh_product_scorecard
+from etl.stratified_sample import refresh_stratified_samples
+from etl.delivery_risk import refresh_delivery_risk
+
+# --- Logging setup ---
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+PROCESSED_INBOX = INBOX_PATH / "processed"
+REJECTED_INBOX = INBOX_PATH / "rejected"
+
+# Dataset -> file prefix, target table, upsert key, all columns and the non-null ones.
+# Datasets are applied in this order so children can resolve their order's month.
+DATASETS = {
+    "customers": {
+        "prefix": "customers_",
+        "table": "customers_dim",
+        "key": ["customer_id"],
+        "columns": ["customer_id", "customer_unique_id", "customer_zip_code_prefix",
+                    "customer_city", "customer_state"],
+        "required": ["customer_id", "customer_unique_id"],
+    },
+    "orders": {
+        "prefix": "orders_",
+        "table": "orders_fact",
+        "key": ["order_id"],
+        "columns": ["order_id", "customer_id", "order_status"] + ORDER_TIMESTAMPS,
+        "required": ["order_id", "customer_id", "order_purchase_timestamp"],
+    },
+    "order_items": {
+        "prefix": "order_items_",
+        "table": "order_items_fact",
+        "key": ["order_id", "order_item_id"],
+        "columns": ["order_id", "order_item_id", "product_id", "seller_id",
+                    "shipping_limit_date", "price", "freight_value"],
+        "required": ["order_id", "order_item_id", "product_id", "seller_id", "price", "freight_value"],
+    },
+    "payments": {
+        "prefix": "payments_",
+        "table": "payments_fact",
+        "key": ["order_id", "payment_sequential"],
+        "columns": ["order_id", "payment_sequential", "payment_type",
+                    "payment_installments", "payment_value"],
+        "required": ["order_id", "payment_sequential", "payment_value"],
+    },
+    "reviews": {
+        "prefix": "reviews_",
+        "table": "reviews_fact",
+        "key": ["review_id", "order_id"],
+        "columns": ["review_id", "order_id", "review_score", "review_comment_title",
+                    "review_comment_message", "review_creation_date", "review_answer_timestamp"],
+        "required": ["review_id", "order_id", "review_score"],
+    },
+}
+
+NUMERIC_COLUMNS = [
+    "order_item_id", "price", "freight_value", "payment_sequential",
+    "payment_installments", "payment_value", "review_score", "customer_zip_code_prefix",
+]
+
+
+def _dataset_for(path):
+    for name, spec in DATASETS.items():
+        if path.name.startswith(spec["prefix"]):
+            return name
+    return None
+
+
+def read_event_file(path) -> pd.DataFrame:
+    """Read a CSV or JSON-lines drop file."""
+    if path.suffix == ".csv":
+        return pd.read_csv(path)
+    return pd.read_json(path, lines=True, dtype=False)
+
+
+def collect_batch(inbox=INBOX_PATH, settle_seconds: float = 1.0):
+    """Group ready drop files by dataset; files still being written (recent mtime) wait."""
+    now = time.time()
+    batch = {}
+    for path in sorted(inbox.glob("*")):
+        if path.suffix not in (".csv", ".jsonl") or now - path.stat().st_mtime < settle_seconds:
+            continue
+        name = _dataset_for(path)
+        if name is None:
+            logger.warning(f"⚠️ Skipping {path.name}: unknown dataset prefix")
+            continue
+        batch.setdefault(name, []).append(path)
+    return batch
+
+
+def validate_batch(name: str, df: pd.DataFrame):
+    """Split a dataset batch into (valid rows, rejected rows with a reason)."""
+    spec = DATASETS[name]
+    missing = [col for col in spec["required"] if col not in df.columns]
+    if missing:
+        raise ValueError(f"{name} batch is missing required columns: {missing}")
+
+    df = df.reindex(columns=spec["columns"])
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    if name == "orders":
+        for col in ORDER_TIMESTAMPS:
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+
+    reason = pd.Series("", index=df.index)
+    reason[df[spec["required"]].isna().any(axis=1)] = "missing required value"
+    if name == "order_items":
+        reason[(df["price"] < 0) | (df["freight_value"] < 0)] = "negative amount"
+    if name == "payments":
+        reason[df["payment_value"] < 0] = "negative amount"
+    if name == "reviews":
+        reason[~df["review_score"].between(1, 5)] = "review_score outside 1-5"
+
+    rejected = df[reason != ""].assign(reject_reason=reason[reason != ""])
+    # Later rows in the batch win over earlier ones with the same key
+    valid = df[reason == ""].drop_duplicates(subset=spec["key"], keep="last")
+    return valid, rejected
+
+
+def _order_months(conn, order_ids: pd.Series, batch_orders: pd.DataFrame) -> pd.Series:
+    """Purchase month of each order id, from this batch or the already loaded orders."""
+    months = pd.Series(
+        batch_orders["order_purchase_timestamp"].dt.strftime("%Y-%m").to_numpy(),
+        index=batch_orders["order_id"]
+    ) if not batch_orders.empty else pd.Series(dtype=object)
+    unknown = order_ids[~order_ids.isin(months.index)].drop_duplicates()
+    if not unknown.empty:
+        pd.DataFrame({"order_id": unknown}).to_sql("_batch_orders", conn, if_exists="replace", index=False)
+        known = pd.read_sql(
+            """
+            SELECT o.order_id, o.purchase_month
+            FROM orders_transformed o
+            JOIN _batch_orders b ON o.order_id = b.order_id
+            """, conn
+        )
+        conn.exec_driver_sql("DROP TABLE _batch_orders")
+        months = pd.concat([months, month_label(known.set_index("order_id")["purchase_month"])])
+    return order_ids.map(months)
+
+
+def _load_matching(conn, table: str, column: str, values) -> pd.DataFrame:
+    """Rows of `table` whose `column` is in `values` (via a scratch key table)."""
+    pd.DataFrame({column: pd.unique(pd.Series(values))}).to_sql("_match_keys", conn, if_exists="replace", index=False)
+    df = pd.read_sql(
+        f"SELECT t.* FROM {table} t WHERE t.{column} IN (SELECT {column} FROM _match_keys)", conn
+    )
+    conn.exec_driver_sql("DROP TABLE _match_keys")
+    return df
+
+
+def _rebuild_orders_transformed(conn, affected: pd.Series):
+    """Rebuild the wide rows of every order whose facts changed."""
+    data = {
+        "orders": decode_timestamps(_load_matching(conn, "orders_fact", "order_id", affected)),
+        "order_items": _load_matching(conn, "order_items_fact", "order_id", affected),
+        "payments": _load_matching(conn, "payments_fact", "order_id", affected),
+    }
+    data["customers"] = _load_matching(conn, "customers_dim", "customer_id", data["orders"]["customer_id"])
+    wide = build_orders_transformed(data)
+    affected.to_frame().to_sql("_affected_orders", conn, if_exists="replace", index=False)
+    conn.exec_driver_sql(
+        "DELETE FROM orders_transformed WHERE order_id IN (SELECT order_id FROM _affected_orders)"
+    )
+    conn.exec_driver_sql("DROP TABLE _affected_orders")
+    encode_timestamps(wide).to_sql("orders_transformed", conn, if_exists="append", index=False)
+    products = pd.read_sql("SELECT product_id, product_category_name_english FROM products_dim", conn)
+    return wide, data["order_items"], products
+
+
+def apply_batch(frames: dict, engine=None) -> dict:
+    """Upsert validated dataset frames and refresh everything derived from the affected orders.
+
+    Returns {dataset: rows applied}, plus rejected row counts under "<dataset>_rejected".
+    """
+    engine = engine or create_engine(DB_URL)
+    stats = {}
+    with engine.begin() as conn:
+        if not frames.get("customers", pd.DataFrame()).empty:
+            customers = frames["customers"]
+            customers[["customer_id"]].to_sql("_upsert_keys", conn, if_exists="replace", index=False)
+            conn.exec_driver_sql(
+                "DELETE FROM customers_dim WHERE customer_id IN (SELECT customer_id FROM _upsert_keys)"
+            )
+            conn.exec_driver_sql("DROP TABLE _upsert_keys")
+            customers.to_sql("customers_dim", conn, if_exists="append", index=False)
+            stats["customers"] = len(customers)
+
+        # Only the new order rows go through the order feature engineering
+        orders = frames.get("orders", pd.DataFrame(columns=DATASETS["orders"]["columns"]))
+        if not orders.empty:
+            orders = transform_orders(orders.copy())
+            months = orders["order_purchase_timestamp"].dt.strftime("%Y-%m")
+            upsert_partitions(conn, "orders_fact", encode_timestamps(orders), months, DATASETS["orders"]["key"])
+            stats["orders"] = len(orders)
+
+        affected = set(orders["order_id"])
+        reviews = pd.DataFrame(columns=DATASETS["reviews"]["columns"])
+        for name in ["order_items", "payments", "reviews"]:
+            df = frames.get(name)
+            if df is None or df.empty:
+                continue
+            months = _order_months(conn, df["order_id"], orders)
+            orphans = months.isna()
+            if orphans.any():
+                logger.warning(f"⚠️ {orphans.sum()} {name} rows reference unknown orders; rejected")
+                stats[f"{name}_rejected"] = stats.get(f"{name}_rejected", 0) + int(orphans.sum())
+            df, months = df[~orphans], months[~orphans]
+            upsert_partitions(conn, DATASETS[name]["table"], df, months, DATASETS[name]["key"])
+            stats[name] = len(df)
+            if name == "reviews":
+                reviews = df
+            else:
+                affected |= set(df["order_id"])
+
+        wide = None
+        if affected:
+            affected = pd.Series(sorted(affected), name="order_id")
+            wide, order_items, products = _rebuild_orders_transformed(conn, affected)
+
+    # Rollups maintained incrementally from the affected orders only
+    if wide is not None:
+        refresh_customer_analytics(wide["customer_unique_id"], engine)
+        update_distinct_sketches(sketch_rows(wide, order_items, products), engine)
+        refresh_stratified_samples(affected, engine)
+        refresh_delivery_risk(affected, engine)
+    update_review_analytics(reviews, affected, engine)
+    scored_orders = list(affected) + list(reviews["order_id"])
+    refresh_seller_scorecard(scored_orders, engine)
+    refresh_product_scorecard(scored_orders, engine)
+    compact_partitions(engine)
+    return stats
+
+
+def process_inbox(inbox=INBOX_PATH, engine=None) -> dict:
+    """Validate and apply every ready drop file as one micro-batch, then archive the files."""
+    batch = collect_batch(inbox)
+    if not batch:
+        return {}
+
+    started = time.perf_counter()
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+    PROCESSED_INBOX.mkdir(parents=True, exist_ok=True)
+    REJECTED_INBOX.mkdir(parents=True, exist_ok=True)
+
+    frames, rejected, bad_files = {}, {}, []
+    for name, paths in batch.items():
+        parts = []
+        for path in paths:
+            try:
+                valid, bad = validate_batch(name, read_event_file(path))
+            except ValueError as exc:
+                logger.error(f"❌ Rejecting {path.name}: {exc}")
+                bad_files.append(path)
+                continue
+            parts.append(valid)
+            if not bad.empty:
+                bad.to_csv(REJECTED_INBOX / f"{stamp}_{path.stem}.rejected.csv", index=False)
+                rejected[name] = rejected.get(name, 0) + len(bad)
+        if parts:
+            frames[name] = pd.concat(parts, ignore_index=True).drop_duplicates(
+                subset=DATASETS[name]["key"], keep="last"
+            )
+
+    stats = apply_batch(frames, engine)
+    for name, count in rejected.items():
+        stats[f"{name}_rejected"] = stats.get(f"{name}_rejected", 0) + count
+
+    for paths in batch.values():
+        for path in paths:
+            target = REJECTED_INBOX if path in bad_files else PROCESSED_INBOX
+            shutil.move(str(path), target / f"{stamp}_{path.name}")
+
+    logger.info(f"📬 Micro-batch applied in {time.perf_counter() - started:.2f}s: {stats}")
+    return stats
+
+
+def watch_inbox(interval: float = 2.0, once: bool = False):
+    """Poll the drop folder and apply new files as micro-batches."""
+    INBOX_PATH.mkdir(parents=True, exist_ok=True)
+    logger.info(f"👀 Watching {INBOX_PATH} every {interval}s for new order events...")
+    while True:
+        process_inbox()
+        if once:
+            return
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-batch ingestion of new order events")
+    parser.add_argument("--interval", type=float, default=2.0, help="Polling interval in seconds")
+    parser.add_argument("--once", action="store_true", help="Process the current inbox and exit")
+    args = parser.parse_args()
+    watch_inbox(args.interval, args.once)
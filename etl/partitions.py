@@ -0,0 +1,197 @@
+import re
+import logging
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# --- Month-partitioned facts ---
+# Each fact is stored as one table per order purchase month (orders_fact_p201708, ...)
+# behind a UNION ALL view with the original name, so unfiltered SQL is unchanged.
+# Items, payments and reviews follow their order's purchase month.
+# fact_partitions is the catalog the query router prunes from.
+PARTITIONED_FACTS = {
+    "orders_fact": {"sort_key": "order_id", "indexes": ["order_id", "customer_id"]},
+    "order_items_fact": {"sort_key": "order_id, order_item_id", "indexes": ["order_id", "product_id", "seller_id"]},
+    "payments_fact": {"sort_key": "order_id, payment_sequential", "indexes": ["order_id"]},
+    "reviews_fact": {"sort_key": "order_id, review_id", "indexes": ["order_id"]},
+}
+
+# Months older than the newest month minus this many are closed: immutable and compacted
+OPEN_MONTHS = 2
+
+CATALOG = "fact_partitions"
+
+_TABLE_REF = re.compile(r"\b(FROM|JOIN)\s+(" + "|".join(PARTITIONED_FACTS) + r")\b", re.IGNORECASE)
+
+
+def partition_name(table: str, month: str) -> str:
+    """'orders_fact', '2017-08' -> 'orders_fact_p201708'."""
+    return f"{table}_p{month.replace('-', '')}"
+
+
+def _create_view(conn, table: str, months):
+    conn.exec_driver_sql(f"DROP VIEW IF EXISTS {table}")
+    union = "\nUNION ALL\n".join(f"SELECT * FROM {partition_name(table, m)}" for m in sorted(months))
+    conn.exec_driver_sql(f"CREATE VIEW {table} AS\n{union}")
+
+
+def _index_partition(conn, table: str, partition: str):
+    for col in PARTITIONED_FACTS[table]["indexes"]:
+        conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS ix_{partition}_{col} ON {partition} ({col})")
+
+
+def _closed_months(months) -> set:
+    months = sorted(months)
+    return set(months[:-OPEN_MONTHS]) if len(months) > OPEN_MONTHS else set()
+
+
+def drop_partitions(conn, table: str):
+    """Drop the view, every partition and the catalog rows of a fact table."""
+    # An unpartitioned load left a plain table under the view's name
+    kind = conn.exec_driver_sql("SELECT type FROM sqlite_master WHERE name = ?", (table,)).scalar()
+    if kind:
+        conn.exec_driver_sql(f"DROP {kind.upper()} {table}")
+    names = conn.exec_driver_sql(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ?", (f"{table}_p%",)
+    ).fetchall()
+    for (name,) in names:
+        if re.fullmatch(rf"{table}_p\d{{6}}", name):
+            conn.exec_driver_sql(f"DROP TABLE {name}")
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS {CATALOG} "
+        "(table_name TEXT, partition_month TEXT, partition_table TEXT, row_count INTEGER, closed INTEGER)"
+    )
+    conn.exec_driver_sql(f"DELETE FROM {CATALOG} WHERE table_name = ?", (table,))
+
+
+def save_partitioned(engine, table: str, df: pd.DataFrame, months: pd.Series):
+    """Replace a fact table with per-month partitions (months: 'YYYY-MM' per row)."""
+    with engine.begin() as conn:
+        drop_partitions(conn, table)
+        sort_cols = [c.strip() for c in PARTITIONED_FACTS[table]["sort_key"].split(",")]
+        closed = _closed_months(months.dropna().unique())
+        catalog = []
+        for month, part in df.groupby(months.to_numpy(), sort=True):
+            partition = partition_name(table, month)
+            part.sort_values(sort_cols).to_sql(partition, conn, if_exists="replace", index=False)
+            _index_partition(conn, table, partition)
+            catalog.append((table, month, partition, len(part), int(month in closed)))
+        conn.exec_driver_sql(f"INSERT INTO {CATALOG} VALUES (?, ?, ?, ?, ?)", catalog)
+        _create_view(conn, table, [month for _, month, *_ in catalog])
+    logger.info(f"🗃️ {table}: {len(catalog)} monthly partitions ({sum(c[4] for c in catalog)} closed)")
+
+
+def append_to_partitions(conn, table: str, df: pd.DataFrame, months: pd.Series):
+    """Append rows to their month partitions, creating new months as needed.
+
+    Closed months are immutable: writing to one reopens it (with a warning) until
+    the next `compact_partitions` run closes and compacts it again.
+    """
+    known = dict(conn.exec_driver_sql(
+        f"SELECT partition_month, closed FROM {CATALOG} WHERE table_name = ?", (table,)
+    ).fetchall())
+    for month, part in df.groupby(months.to_numpy(), sort=True):
+        partition = partition_name(table, month)
+        if known.get(month):
+            logger.warning(f"⚠️ Late rows for closed partition {partition}; reopening it")
+            conn.exec_driver_sql(
+                f"UPDATE {CATALOG} SET closed = 0 WHERE table_name = ? AND partition_month = ?", (table, month)
+            )
+        part.to_sql(partition, conn, if_exists="append", index=False)
+        if month not in known:
+            _index_partition(conn, table, partition)
+            conn.exec_driver_sql(f"INSERT INTO {CATALOG} VALUES (?, ?, ?, 0, 0)", (table, month, partition))
+            known[month] = 0
+        conn.exec_driver_sql(
+            f"UPDATE {CATALOG} SET row_count = (SELECT COUNT(*) FROM {partition}) "
+            "WHERE table_name = ? AND partition_month = ?", (table, month)
+        )
+    _create_view(conn, table, known)
+
+
+def upsert_partitions(conn, table: str, df: pd.DataFrame, months: pd.Series, keys):
+    """Replace rows matching `df` on `keys` in any partition, then append `df`.
+
+    Deleting from a closed month reopens it, like appending to one does.
+    """
+    existing = {m for (m,) in conn.exec_driver_sql(
+        f"SELECT partition_month FROM {CATALOG} WHERE table_name = ?", (table,)
+    ).fetchall()}
+    key_list = ", ".join(keys)
+    df[list(keys)].to_sql("_upsert_keys", conn, if_exists="replace", index=False)
+    # Every partition is checked (an indexed probe each), so a row whose month changed moves
+    for month in sorted(existing):
+        deleted = conn.exec_driver_sql(
+            f"DELETE FROM {partition_name(table, month)} "
+            f"WHERE ({key_list}) IN (SELECT {key_list} FROM _upsert_keys)"
+        ).rowcount
+        if deleted:
+            conn.exec_driver_sql(
+                f"UPDATE {CATALOG} SET row_count = row_count - ?, closed = 0 "
+                "WHERE table_name = ? AND partition_month = ?",
+                (deleted, table, month)
+            )
+    conn.exec_driver_sql("DROP TABLE _upsert_keys")
+    append_to_partitions(conn, table, df, months)
+
+
+def compact_partitions(engine):
+    """Close months that fell out of the open window and rewrite reopened ones in key order."""
+    compacted = 0
+    with engine.begin() as conn:
+        for table, spec in PARTITIONED_FACTS.items():
+            rows = conn.exec_driver_sql(
+                f"SELECT partition_month, partition_table, closed FROM {CATALOG} WHERE table_name = ?", (table,)
+            ).fetchall()
+            closed = _closed_months([month for month, *_ in rows])
+            pending = [(m, p) for m, p, is_closed in rows if m in closed and not is_closed]
+            if not pending:
+                continue
+            # Renaming tables under a live view fails, so rebuild it afterwards
+            conn.exec_driver_sql(f"DROP VIEW IF EXISTS {table}")
+            for month, partition in pending:
+                conn.exec_driver_sql(
+                    f"CREATE TABLE {partition}__compact AS SELECT * FROM {partition} ORDER BY {spec['sort_key']}"
+                )
+                conn.exec_driver_sql(f"DROP TABLE {partition}")
+                conn.exec_driver_sql(f"ALTER TABLE {partition}__compact RENAME TO {partition}")
+                _index_partition(conn, table, partition)
+                conn.exec_driver_sql(
+                    f"UPDATE {CATALOG} SET closed = 1 WHERE table_name = ? AND partition_month = ?", (table, month)
+                )
+            _create_view(conn, table, [month for month, *_ in rows])
+            compacted += len(pending)
+    if compacted:
+        with engine.connect() as conn:
+            conn.exec_driver_sql("VACUUM")
+    logger.info(f"🧹 Compacted {compacted} closed partitions")
+
+
+def route_partitions(conn, sql: str, start_date, end_date) -> str:
+    """Rewrite fact references in `sql` to UNION ALLs of the months overlapping [start, end].
+
+    Only `FROM <fact>` / `JOIN <fact>` references are rewritten; the query must
+    still filter the exact dates itself, pruning only skips whole months.
+    """
+    has_catalog = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (CATALOG,)
+    ).fetchone()
+    if not has_catalog:
+        return sql
+    start_month, end_month = str(start_date)[:7], str(end_date)[:7]
+    catalog = pd.read_sql(
+        f"SELECT table_name, partition_month, partition_table FROM {CATALOG} "
+        "WHERE partition_month BETWEEN ? AND ? ORDER BY partition_month",
+        conn, params=(start_month, end_month)
+    )
+    pruned = catalog.groupby("table_name")["partition_table"].apply(list).to_dict()
+
+    def rewrite(match):
+        keyword, table = match.group(1), match.group(2)
+        partitions = pruned.get(table)
+        if not partitions:
+            return f"{keyword} (SELECT * FROM {table} WHERE 0)"
+        union = " UNION ALL ".join(f"SELECT * FROM {p}" for p in partitions)
+        return f"{keyword} ({union})"
+
+    return _TABLE_REF.sub(rewrite, sql)
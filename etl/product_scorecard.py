@@ -0,0 +1,102 @@
+import logging
+import pandas as pd
+from sqlalchemy import create_engine
+from dashboard.config import DB_URL
+from etl.db import create_indexes, export_parquet
+
+logger = logging.getLogger(__name__)
+
+# --- Product scorecard ---
+# One row per product with its sales and review KPIs, the product counterpart of
+# seller_scorecard. Each sortable metric is indexed together with product_id so
+# top-k and keyset pagination read the index in order.
+
+PRODUCT_METRICS = ["revenue", "order_count", "items_sold", "avg_price", "avg_review_score"]
+
+PRODUCT_INDEXES = [("ix_product_scorecard_product", "product_scorecard", "product_id")] + [
+    (f"ix_product_scorecard_{metric}", "product_scorecard", f"{metric}, product_id") for metric in PRODUCT_METRICS
+]
+
+
+def product_scorecard(order_items: pd.DataFrame, reviews: pd.DataFrame, products: pd.DataFrame) -> pd.DataFrame:
+    """Per-product revenue, order/item counts, average price and average review score."""
+    product_orders = order_items.assign(revenue=order_items["price"] + order_items["freight_value"]).groupby(
+        ["product_id", "order_id"]
+    ).agg(revenue=("revenue", "sum"), items_sold=("revenue", "size"), price=("price", "sum")).reset_index()
+    order_reviews = reviews.groupby("order_id")["review_score"].mean().rename("review_score")
+    product_orders = product_orders.join(order_reviews, on="order_id")
+
+    card = product_orders.groupby("product_id").agg(
+        revenue=("revenue", "sum"),
+        order_count=("order_id", "size"),
+        items_sold=("items_sold", "sum"),
+        price=("price", "sum"),
+        reviewed_orders=("review_score", "count"),
+        avg_review_score=("review_score", "mean"),
+    ).reset_index()
+    card["avg_price"] = card.pop("price") / card["items_sold"]
+    card = card.merge(
+        products[["product_id", "product_category_name_english"]].rename(
+            columns={"product_category_name_english": "category"}
+        ),
+        on="product_id", how="left"
+    )
+    return card.round({"revenue": 2, "avg_price": 2, "avg_review_score": 3})[[
+        "product_id", "category", "revenue", "order_count", "items_sold", "avg_price",
+        "reviewed_orders", "avg_review_score",
+    ]]
+
+
+def build_product_scorecard(data: dict, engine=None):
+    """Full build of the product_scorecard table."""
+    logger.info("📦 Building product scorecard...")
+    engine = engine or create_engine(DB_URL)
+    card = product_scorecard(data["order_items"], data["reviews"], data["products"])
+    card.to_sql("product_scorecard", engine, if_exists="replace", index=False)
+    create_indexes(engine, PRODUCT_INDEXES)
+    export_parquet({"product_scorecard": card})
+    logger.info(f"✅ Scorecard built for {len(card)} products")
+
+
+def refresh_product_scorecard(order_ids, engine=None):
+    """Recompute every product with items in `order_ids` from all of that product's orders."""
+    engine = engine or create_engine(DB_URL)
+    keys = pd.DataFrame({"order_id": pd.unique(pd.Series(list(order_ids), dtype=object).dropna())})
+    if keys.empty:
+        return
+
+    with engine.begin() as conn:
+        keys.to_sql("_scorecard_orders", conn, if_exists="replace", index=False)
+        conn.exec_driver_sql("DROP TABLE IF EXISTS _scorecard_products")
+        conn.exec_driver_sql(
+            """
+            CREATE TABLE _scorecard_products AS
+            SELECT DISTINCT product_id FROM order_items_fact
+            WHERE order_id IN (SELECT order_id FROM _scorecard_orders)
+            """
+        )
+        items = pd.read_sql(
+            """
+            SELECT order_id, product_id, price, freight_value FROM order_items_fact
+            WHERE product_id IN (SELECT product_id FROM _scorecard_products)
+            """, conn
+        )
+        items[["order_id"]].drop_duplicates().to_sql("_scorecard_orders", conn, if_exists="replace", index=False)
+        reviews = pd.read_sql(
+            "SELECT order_id, review_score FROM reviews_fact WHERE order_id IN (SELECT order_id FROM _scorecard_orders)",
+            conn
+        )
+        products = pd.read_sql(
+            """
+            SELECT product_id, product_category_name_english FROM products_dim
+            WHERE product_id IN (SELECT product_id FROM _scorecard_products)
+            """, conn
+        )
+        card = product_scorecard(items, reviews, products)
+        conn.exec_driver_sql(
+            "DELETE FROM product_scorecard WHERE product_id IN (SELECT product_id FROM _scorecard_products)"
+        )
+        card.to_sql("product_scorecard", conn, if_exists="append", index=False)
+        conn.exec_driver_sql("DROP TABLE _scorecard_orders")
+        conn.exec_driver_sql("DROP TABLE _scorecard_products")
+    logger.info(f"📦 Refreshed scorecard for {len(card)} products")
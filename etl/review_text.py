@@ -0,0 +1,246 @@
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from dashboard.config import DB_URL
+from etl.db import create_indexes, export_parquet
+
+logger = logging.getLogger(__name__)
+
+# --- Review text analytics ---
+# reviews_search is an FTS5 index over the raw comment title/message; its unicode61
+# tokenizer folds case and accents, so "horrivel" finds "horrível".
+# review_sentiment holds a lexicon score per review and product_review_sentiment
+# the per-product aggregates (a review counts for every product in its order).
+
+FTS_TABLE = "reviews_search"
+
+# Reviews per scoring task; smaller inputs are scored in-process
+CHUNK_SIZE = 20_000
+
+# Accent-free, lower-case Portuguese terms -> polarity weight
+LEXICON = {
+    # positive
+    "bom": 1.0, "boa": 1.0, "bons": 1.0, "boas": 1.0, "otimo": 2.0, "otima": 2.0,
+    "excelente": 2.0, "perfeito": 2.0, "perfeita": 2.0, "maravilhoso": 2.0, "maravilhosa": 2.0,
+    "adorei": 2.0, "amei": 2.0, "gostei": 1.5, "recomendo": 2.0, "satisfeito": 1.5,
+    "satisfeita": 1.5, "parabens": 1.5, "rapido": 1.0, "rapida": 1.0, "rapidez": 1.0,
+    "lindo": 1.5, "linda": 1.5, "certinho": 1.0, "correto": 1.0, "eficiente": 1.0,
+    "pontual": 1.0, "obrigado": 0.5, "obrigada": 0.5, "super": 0.5, "top": 1.0,
+    "recebi": 0.5, "chegou": 0.5, "funciona": 1.0, "confiavel": 1.5, "qualidade": 0.5,
+    # negative
+    "ruim": -1.5, "pessimo": -2.0, "pessima": -2.0, "horrivel": -2.0, "defeito": -1.5,
+    "defeituoso": -1.5, "quebrado": -1.5, "quebrada": -1.5, "atraso": -1.5, "atrasado": -1.5,
+    "atrasada": -1.5, "errado": -1.5, "errada": -1.5, "faltando": -1.5, "falta": -1.0,
+    "decepcionado": -2.0, "decepcionada": -2.0, "insatisfeito": -1.5, "insatisfeita": -1.5,
+    "problema": -1.0, "problemas": -1.0, "devolver": -1.0, "devolucao": -1.0,
+    "reclamacao": -1.0, "enganosa": -2.0, "fraude": -2.0, "lixo": -2.0, "demora": -1.0,
+    "demorou": -1.0, "cancelado": -1.0, "cancelei": -1.0,
+}
+
+# A negator flips the polarity of the next term ("nao recebi", "nao funciona")
+NEGATORS = {"nao", "nem", "nunca", "jamais", "sem"}
+
+SENTIMENT_INDEXES = [
+    ("ix_review_sentiment_review_order", "review_sentiment", "review_id, order_id"),
+    ("ix_review_sentiment_order", "review_sentiment", "order_id"),
+    ("ix_product_review_sentiment_product", "product_review_sentiment", "product_id"),
+    ("ix_product_review_sentiment_sentiment", "product_review_sentiment", "avg_sentiment"),
+]
+
+
+def normalize_text(text: pd.Series) -> pd.Series:
+    """Lower-case, strip accents (NFKD) and reduce to space-separated alphanumeric tokens."""
+    return (
+        text.fillna("").astype(str)
+        .str.normalize("NFKD")
+        .str.encode("ascii", "ignore").str.decode("ascii")
+        .str.lower()
+        .str.replace(r"[^a-z0-9]+", " ", regex=True)
+        .str.strip()
+    )
+
+
+def score_chunk(reviews: pd.DataFrame) -> pd.DataFrame:
+    """Lexicon sentiment of one chunk of reviews (title and message together)."""
+    text = normalize_text(
+        reviews["review_comment_title"].fillna("") + " " + reviews["review_comment_message"].fillna("")
+    )
+    tokens = text.str.split().explode().dropna()
+    row = tokens.index.to_numpy()
+
+    weights = tokens.map(LEXICON).fillna(0.0).to_numpy()
+    # Negation applies to the previous token of the same review only
+    negated = np.zeros(len(tokens), dtype=bool)
+    negated[1:] = tokens.isin(NEGATORS).to_numpy()[:-1] & (row[1:] == row[:-1])
+    weights = np.where(negated, -weights, weights)
+
+    terms = pd.DataFrame({
+        "row": row,
+        "token_count": 1,
+        "positive": np.where(weights > 0, weights, 0.0),
+        "negative": np.where(weights < 0, -weights, 0.0),
+        "positive_terms": weights > 0,
+        "negative_terms": weights < 0,
+    }).groupby("row").sum()
+    terms = terms.reindex(reviews.index, fill_value=0)
+
+    hits = terms["positive"] + terms["negative"]
+    sentiment = ((terms["positive"] - terms["negative"]) / hits.where(hits > 0)).fillna(0.0)
+    return pd.DataFrame({
+        "review_id": reviews["review_id"],
+        "order_id": reviews["order_id"],
+        "review_score": reviews["review_score"],
+        "has_comment": (text != "").astype(int),
+        "token_count": terms["token_count"].astype(int),
+        "positive_terms": terms["positive_terms"].astype(int),
+        "negative_terms": terms["negative_terms"].astype(int),
+        "sentiment": sentiment.round(4),
+        "sentiment_label": np.select([sentiment > 0, sentiment < 0], ["positive", "negative"], "neutral"),
+    })
+
+
+def score_reviews(reviews: pd.DataFrame, workers: int = None, chunk_size: int = CHUNK_SIZE) -> pd.DataFrame:
+    """Score reviews in parallel chunks on a process pool."""
+    reviews = reviews.reset_index(drop=True)
+    if len(reviews) <= chunk_size:
+        return score_chunk(reviews)
+    chunks = [reviews.iloc[i:i + chunk_size] for i in range(0, len(reviews), chunk_size)]
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        scored = list(pool.map(score_chunk, chunks))
+    logger.info(f"💬 Scored {len(reviews)} reviews in {len(chunks)} chunks on {workers} processes")
+    return pd.concat(scored, ignore_index=True)
+
+
+def product_sentiment(scored: pd.DataFrame, order_items: pd.DataFrame, products: pd.DataFrame) -> pd.DataFrame:
+    """Per-product review count, average star rating and sentiment."""
+    pairs = order_items[["order_id", "product_id"]].drop_duplicates()
+    rows = scored.merge(pairs, on="order_id").assign(
+        is_positive=lambda d: d["sentiment_label"].eq("positive"),
+        is_negative=lambda d: d["sentiment_label"].eq("negative"),
+    )
+    agg = rows.groupby("product_id").agg(
+        reviews=("review_id", "size"),
+        commented_reviews=("has_comment", "sum"),
+        avg_review_score=("review_score", "mean"),
+        avg_sentiment=("sentiment", "mean"),
+        positive_share=("is_positive", "mean"),
+        negative_share=("is_negative", "mean"),
+    ).reset_index()
+    agg = agg.merge(
+        products[["product_id", "product_category_name_english"]].rename(
+            columns={"product_category_name_english": "category"}
+        ),
+        on="product_id", how="left"
+    )
+    return agg.round({"avg_review_score": 3, "avg_sentiment": 4, "positive_share": 4, "negative_share": 4})
+
+
+def _fts_rows(reviews: pd.DataFrame) -> pd.DataFrame:
+    rows = reviews[["review_id", "order_id", "review_comment_title", "review_comment_message"]]
+    rows = rows[rows["review_comment_title"].notna() | rows["review_comment_message"].notna()]
+    return rows.rename(columns={"review_comment_title": "title", "review_comment_message": "message"})
+
+
+def _insert_fts(conn, rows: pd.DataFrame):
+    if rows.empty:
+        return
+    rows = rows[["title", "message", "review_id", "order_id"]].astype(object)
+    conn.exec_driver_sql(
+        f"INSERT INTO {FTS_TABLE} (title, message, review_id, order_id) VALUES (?, ?, ?, ?)",
+        list(rows.where(rows.notna(), None).itertuples(index=False, name=None))
+    )
+
+
+def build_review_index(reviews: pd.DataFrame, engine):
+    """(Re)build the FTS5 index over review titles and messages."""
+    rows = _fts_rows(reviews)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+        conn.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+            "title, message, review_id UNINDEXED, order_id UNINDEXED, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        _insert_fts(conn, rows)
+        conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+    logger.info(f"🔎 Indexed {len(rows)} review comments for full-text search")
+
+
+def build_review_analytics(data: dict, engine=None, workers: int = None, scored: pd.DataFrame = None):
+    """Full build of the review search index, review_sentiment and product_review_sentiment.
+
+    `scored` takes review scores already computed elsewhere (e.g. by the sharded ETL).
+    """
+    logger.info("💬 Building review text analytics...")
+    engine = engine or create_engine(DB_URL)
+    build_review_index(data["reviews"], engine)
+    if scored is None:
+        scored = score_reviews(data["reviews"], workers=workers)
+    products = product_sentiment(scored, data["order_items"], data["products"])
+    scored.to_sql("review_sentiment", engine, if_exists="replace", index=False)
+    products.to_sql("product_review_sentiment", engine, if_exists="replace", index=False)
+    create_indexes(engine, SENTIMENT_INDEXES)
+    export_parquet({"review_sentiment": scored, "product_review_sentiment": products})
+    logger.info(f"✅ Review sentiment for {len(scored)} reviews and {len(products)} products")
+
+
+def update_review_analytics(reviews: pd.DataFrame, order_ids, engine=None):
+    """Re-score upserted reviews and refresh the products of the affected orders.
+
+    `order_ids` are orders whose items changed; their products are refreshed too.
+    """
+    engine = engine or create_engine(DB_URL)
+    order_ids = pd.Series(pd.unique(pd.concat([pd.Series(list(order_ids), dtype=object),
+                                               reviews["order_id"]])), name="order_id")
+    if order_ids.empty:
+        return
+    with engine.begin() as conn:
+        if not reviews.empty:
+            scored = score_chunk(reviews.reset_index(drop=True))
+            scored[["review_id", "order_id"]].to_sql("_review_batch", conn, if_exists="replace", index=False)
+            for table in ["review_sentiment", FTS_TABLE]:
+                conn.exec_driver_sql(
+                    f"DELETE FROM {table} WHERE (review_id, order_id) IN (SELECT review_id, order_id FROM _review_batch)"
+                )
+            conn.exec_driver_sql("DROP TABLE _review_batch")
+            scored.to_sql("review_sentiment", conn, if_exists="append", index=False)
+            _insert_fts(conn, _fts_rows(reviews))
+
+        # Every review of every order containing an affected product
+        order_ids.to_frame().to_sql("_affected_orders", conn, if_exists="replace", index=False)
+        items = pd.read_sql(
+            """
+            SELECT DISTINCT oi.order_id, oi.product_id
+            FROM order_items_fact oi
+            WHERE oi.product_id IN (
+                SELECT product_id FROM order_items_fact
+                WHERE order_id IN (SELECT order_id FROM _affected_orders)
+            )
+            """, conn
+        )
+        conn.exec_driver_sql("DROP TABLE _affected_orders")
+        items.drop_duplicates("order_id")[["order_id"]].to_sql("_affected_orders", conn, if_exists="replace", index=False)
+        scored = pd.read_sql(
+            "SELECT * FROM review_sentiment WHERE order_id IN (SELECT order_id FROM _affected_orders)", conn
+        )
+        conn.exec_driver_sql("DROP TABLE _affected_orders")
+        products = pd.read_sql("SELECT product_id, product_category_name_english FROM products_dim", conn)
+        refreshed = product_sentiment(scored, items, products)
+
+        items[["product_id"]].drop_duplicates().to_sql("_affected_products", conn, if_exists="replace", index=False)
+        conn.exec_driver_sql(
+            "DELETE FROM product_review_sentiment WHERE product_id IN (SELECT product_id FROM _affected_products)"
+        )
+        conn.exec_driver_sql("DROP TABLE _affected_products")
+        refreshed.to_sql("product_review_sentiment", conn, if_exists="append", index=False)
+    logger.info(f"💬 Refreshed review sentiment for {len(reviews)} reviews and {len(refreshed)} products")
+
+
+def fts_query(text: str) -> str:
+    """User search text -> FTS5 query of quoted prefix terms (all must match)."""
+    tokens = normalize_text(pd.Series([text])).iloc[0].split()
+    return " ".join(f'"{t}"*' for t in tokens)
@@ -0,0 +1,122 @@
+import logging
+import pandas as pd
+from sqlalchemy import create_engine
+from dashboard.config import DB_URL
+from etl.db import create_indexes, export_parquet
+
+logger = logging.getLogger(__name__)
+
+# --- Seller scorecard ---
+# One row per seller, so ranking is an index scan on (metric, seller_id) and
+# drill-down is a primary-key lookup. Order-level measures (delivery, review)
+# count each of a seller's orders once, whatever its number of items.
+
+# Rankable metric -> (label, higher is better)
+SCORECARD_METRICS = {
+    "revenue": ("Revenue (R$)", True),
+    "order_count": ("Orders", True),
+    "late_delivery_rate": ("Late Delivery %", False),
+    "avg_review_score": ("Avg Review Score", True),
+    "avg_delivery_days": ("Avg Delivery Days", False),
+}
+
+SCORECARD_INDEXES = [("ix_seller_scorecard_seller", "seller_scorecard", "seller_id")] + [
+    (f"ix_seller_scorecard_{metric}", "seller_scorecard", f"{metric}, seller_id") for metric in SCORECARD_METRICS
+]
+
+
+def seller_scorecard(order_items: pd.DataFrame, orders: pd.DataFrame, reviews: pd.DataFrame,
+                     sellers: pd.DataFrame) -> pd.DataFrame:
+    """Per-seller revenue, order count, late-delivery rate, review score and delivery days."""
+    seller_orders = order_items.assign(revenue=order_items["price"] + order_items["freight_value"]).groupby(
+        ["seller_id", "order_id"]
+    ).agg(revenue=("revenue", "sum"), items_sold=("revenue", "size")).reset_index()
+
+    delivery = orders.loc[orders["delivered_flag"] == 1, ["order_id", "late_delivery_flag", "delivery_time_days"]]
+    order_reviews = reviews.groupby("order_id")["review_score"].mean().rename("review_score")
+    seller_orders = (
+        seller_orders
+        .merge(delivery, on="order_id", how="left")
+        .join(order_reviews, on="order_id")
+    )
+
+    card = seller_orders.groupby("seller_id").agg(
+        revenue=("revenue", "sum"),
+        order_count=("order_id", "size"),
+        items_sold=("items_sold", "sum"),
+        delivered_orders=("late_delivery_flag", "count"),
+        late_orders=("late_delivery_flag", "sum"),
+        avg_delivery_days=("delivery_time_days", "mean"),
+        reviewed_orders=("review_score", "count"),
+        avg_review_score=("review_score", "mean"),
+    ).reset_index()
+    card["late_orders"] = card["late_orders"].astype(int)
+    # NULL, not 0%, for sellers with nothing delivered yet
+    card["late_delivery_rate"] = 100.0 * card["late_orders"] / card["delivered_orders"].where(card["delivered_orders"] > 0)
+    card = card.merge(sellers[["seller_id", "seller_city", "seller_state"]], on="seller_id", how="left")
+    return card.round({"revenue": 2, "late_delivery_rate": 2, "avg_delivery_days": 2, "avg_review_score": 3})[[
+        "seller_id", "seller_city", "seller_state", "revenue", "order_count", "items_sold",
+        "delivered_orders", "late_orders", "late_delivery_rate", "avg_delivery_days",
+        "reviewed_orders", "avg_review_score",
+    ]]
+
+
+def build_seller_scorecard(data: dict, engine=None):
+    """Full build of the seller_scorecard table."""
+    logger.info("🏪 Building seller scorecard...")
+    engine = engine or create_engine(DB_URL)
+    card = seller_scorecard(data["order_items"], data["orders_transformed"], data["reviews"], data["sellers"])
+    card.to_sql("seller_scorecard", engine, if_exists="replace", index=False)
+    create_indexes(engine, SCORECARD_INDEXES)
+    export_parquet({"seller_scorecard": card})
+    logger.info(f"✅ Scorecard built for {len(card)} sellers")
+
+
+def refresh_seller_scorecard(order_ids, engine=None):
+    """Recompute every seller with items in `order_ids` from all of that seller's orders."""
+    engine = engine or create_engine(DB_URL)
+    keys = pd.DataFrame({"order_id": pd.unique(pd.Series(list(order_ids), dtype=object).dropna())})
+    if keys.empty:
+        return
+
+    with engine.begin() as conn:
+        keys.to_sql("_scorecard_orders", conn, if_exists="replace", index=False)
+        conn.exec_driver_sql("DROP TABLE IF EXISTS _scorecard_sellers")
+        conn.exec_driver_sql(
+            """
+            CREATE TABLE _scorecard_sellers AS
+            SELECT DISTINCT seller_id FROM order_items_fact
+            WHERE order_id IN (SELECT order_id FROM _scorecard_orders)
+            """
+        )
+        items = pd.read_sql(
+            """
+            SELECT order_id, seller_id, price, freight_value FROM order_items_fact
+            WHERE seller_id IN (SELECT seller_id FROM _scorecard_sellers)
+            """, conn
+        )
+        items[["order_id"]].drop_duplicates().to_sql("_scorecard_orders", conn, if_exists="replace", index=False)
+        orders = pd.read_sql(
+            """
+            SELECT order_id, delivered_flag, late_delivery_flag, delivery_time_days FROM orders_transformed
+            WHERE order_id IN (SELECT order_id FROM _scorecard_orders)
+            """, conn
+        )
+        reviews = pd.read_sql(
+            "SELECT order_id, review_score FROM reviews_fact WHERE order_id IN (SELECT order_id FROM _scorecard_orders)",
+            conn
+        )
+        sellers = pd.read_sql(
+            """
+            SELECT seller_id, seller_city, seller_state FROM sellers_dim
+            WHERE seller_id IN (SELECT seller_id FROM _scorecard_sellers)
+            """, conn
+        )
+        card = seller_scorecard(items, orders, reviews, sellers)
+        conn.exec_driver_sql(
+            "DELETE FROM seller_scorecard WHERE seller_id IN (SELECT seller_id FROM _scorecard_sellers)"
+        )
+        card.to_sql("seller_scorecard", conn, if_exists="append", index=False)
+        conn.exec_driver_sql("DROP TABLE _scorecard_orders")
+        conn.exec_driver_sql("DROP TABLE _scorecard_sellers")
+    logger.info(f"🏪 Refreshed scorecard for {len(card)} sellers")
@@ -0,0 +1,197 @@
+import logging
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from dashboard.config import DB_URL, SAMPLE_RATE
+from etl.db import create_indexes, export_parquet
+
+logger = logging.getLogger(__name__)
+
+# --- Stratified samples ---
+# Orders are stratified by (purchase month, customer state, category of the order's
+# first item) and a fixed share of each stratum is sampled, at least MIN_PER_STRATUM
+# orders (or the whole stratum if smaller). Orders are sampled whole: sample_order_items
+# holds every item of the sampled orders. An order's position in its stratum is a
+# hash of its order_id, so the same orders are drawn by full builds and micro-batch
+# refreshes. Each sampled order carries the weight N_h / n_h of its stratum.
+#
+# Totals are Horvitz-Thompson estimates. Their variance is the stratified-sampling
+# variance with finite population correction, sum_h N_h^2 (1 - n_h/N_h) s_h^2 / n_h,
+# with orders as the sampling units. Ratios (averages, rates) are linearized.
+# Intervals are normal 95% intervals.
+MIN_PER_STRATUM = 2
+CONFIDENCE_Z = 1.96
+
+STRATUM_KEYS = ["purchase_month", "customer_state", "stratum_category"]
+
+ORDER_COLUMNS = [
+    "order_id", "purchase_date", "approved_flag", "delivered_flag", "late_delivery_flag",
+    "payment_count", "payment_value", "item_revenue",
+]
+
+SAMPLE_INDEXES = [
+    ("ix_sample_orders_date", "sample_orders", "purchase_date"),
+    ("ix_sample_orders_cell", "sample_orders", "purchase_month, customer_state"),
+    ("ix_sample_order_items_date", "sample_order_items", "purchase_date"),
+    ("ix_sample_order_items_cell", "sample_order_items", "purchase_month, customer_state"),
+    ("ix_sample_strata_cell", "sample_strata", "purchase_month, customer_state, stratum_category"),
+]
+
+
+def order_strata(orders: pd.DataFrame, order_items: pd.DataFrame, products: pd.DataFrame) -> pd.DataFrame:
+    """Stratum keys of every order; orders without items fall in the 'unknown' category."""
+    first_items = (
+        order_items.sort_values(["order_id", "order_item_id"])
+        .drop_duplicates("order_id")[["order_id", "product_id"]]
+        .merge(products[["product_id", "product_category_name_english"]], on="product_id", how="left")
+        .set_index("order_id")["product_category_name_english"]
+    )
+    strata = orders[["order_id", "purchase_month", "customer_state"]].copy()
+    strata["stratum_category"] = strata["order_id"].map(first_items).fillna("unknown")
+    strata["customer_state"] = strata["customer_state"].fillna("unknown")
+    return strata
+
+
+def draw_sample(strata: pd.DataFrame, rate: float = SAMPLE_RATE):
+    """Sampled orders with their stratum keys and weight, plus the per-stratum sizes."""
+    sizes = strata.groupby(STRATUM_KEYS).size().rename("stratum_size").reset_index()
+    sizes["sample_size"] = np.minimum(
+        np.maximum(np.ceil(rate * sizes["stratum_size"]), MIN_PER_STRATUM), sizes["stratum_size"]
+    ).astype(int)
+
+    rank_key = pd.util.hash_pandas_object(strata["order_id"].astype(str), index=False).to_numpy()
+    ranked = strata.assign(_key=rank_key).sort_values(STRATUM_KEYS + ["_key"])
+    ranked["_rank"] = ranked.groupby(STRATUM_KEYS).cumcount()
+    sample = ranked.merge(sizes, on=STRATUM_KEYS)
+    sample = sample[sample["_rank"] < sample["sample_size"]]
+    sample["weight"] = sample["stratum_size"] / sample["sample_size"]
+    return sample[["order_id"] + STRATUM_KEYS + ["weight"]].reset_index(drop=True), sizes
+
+
+def sample_tables(orders: pd.DataFrame, order_items: pd.DataFrame, products: pd.DataFrame) -> dict:
+    """{table: DataFrame} of the sample tables for a set of complete strata."""
+    sample, sizes = draw_sample(order_strata(orders, order_items, products))
+    sample_orders = sample.merge(orders[ORDER_COLUMNS], on="order_id")
+    items = order_items[["order_id", "order_item_id", "product_id", "seller_id", "price", "freight_value"]].merge(
+        products[["product_id", "product_category_name_english"]], on="product_id", how="left"
+    ).rename(columns={"product_category_name_english": "category"})
+    sample_items = sample_orders[["order_id", "purchase_date"] + STRATUM_KEYS + ["weight"]].merge(items, on="order_id")
+    return {"sample_orders": sample_orders, "sample_order_items": sample_items, "sample_strata": sizes}
+
+
+def build_stratified_samples(data: dict, engine=None):
+    """Full build of sample_orders, sample_order_items and sample_strata."""
+    logger.info("🎯 Building stratified samples...")
+    engine = engine or create_engine(DB_URL)
+    tables = sample_tables(data["orders_transformed"], data["order_items"], data["products"])
+    with engine.begin() as conn:
+        for table, df in tables.items():
+            df.to_sql(table, conn, if_exists="replace", index=False)
+    create_indexes(engine, SAMPLE_INDEXES)
+    export_parquet(tables)
+    logger.info(
+        f"✅ Sampled {len(tables['sample_orders'])} of {tables['sample_strata']['stratum_size'].sum()} orders "
+        f"in {len(tables['sample_strata'])} strata"
+    )
+
+
+def refresh_stratified_samples(order_ids, engine=None):
+    """Redraw every (month, state) cell holding one of `order_ids`, from all of the cell's orders."""
+    engine = engine or create_engine(DB_URL)
+    keys = pd.DataFrame({"order_id": pd.unique(pd.Series(list(order_ids), dtype=object).dropna())})
+    if keys.empty:
+        return
+
+    with engine.begin() as conn:
+        keys.to_sql("_sample_orders", conn, if_exists="replace", index=False)
+        conn.exec_driver_sql("DROP TABLE IF EXISTS _sample_cells")
+        # The orders' current cells, plus the cells they were sampled in before
+        conn.exec_driver_sql(
+            """
+            CREATE TABLE _sample_cells AS
+            SELECT purchase_month, COALESCE(customer_state, 'unknown') AS customer_state FROM orders_transformed
+            WHERE order_id IN (SELECT order_id FROM _sample_orders)
+            UNION
+            SELECT purchase_month, customer_state FROM sample_orders
+            WHERE order_id IN (SELECT order_id FROM _sample_orders)
+            """
+        )
+        cells = pd.read_sql("SELECT * FROM _sample_cells", conn)
+        # Whole months are read through the (purchase_month, customer_state) index, then cut to the cells
+        orders = pd.read_sql(
+            f"""
+            SELECT {", ".join(ORDER_COLUMNS)}, purchase_month, customer_state FROM orders_transformed
+            WHERE purchase_month IN (SELECT purchase_month FROM _sample_cells)
+            """, conn
+        )
+        orders["customer_state"] = orders["customer_state"].fillna("unknown")
+        orders = orders.merge(cells, on=["purchase_month", "customer_state"])
+        orders[["order_id"]].to_sql("_sample_orders", conn, if_exists="replace", index=False)
+        items = pd.read_sql(
+            """
+            SELECT order_id, order_item_id, product_id, seller_id, price, freight_value FROM order_items_fact
+            WHERE order_id IN (SELECT order_id FROM _sample_orders)
+            """, conn
+        )
+        products = pd.read_sql(
+            """
+            SELECT product_id, product_category_name_english FROM products_dim
+            WHERE product_id IN (SELECT product_id FROM order_items_fact
+                                 WHERE order_id IN (SELECT order_id FROM _sample_orders))
+            """, conn
+        )
+        tables = sample_tables(orders, items, products)
+        for table, df in tables.items():
+            conn.exec_driver_sql(
+                f"DELETE FROM {table} WHERE (purchase_month, customer_state) IN (SELECT * FROM _sample_cells)"
+            )
+            df.to_sql(table, conn, if_exists="append", index=False)
+        conn.exec_driver_sql("DROP TABLE _sample_orders")
+        conn.exec_driver_sql("DROP TABLE _sample_cells")
+    logger.info(f"🎯 Redrew {len(tables['sample_strata'])} strata ({len(tables['sample_orders'])} sampled orders)")
+
+
+# --- Estimation ---
+
+def _stratified_sums(units: pd.DataFrame, strata: pd.DataFrame, value: str, by: list) -> pd.DataFrame:
+    """Estimated total of `value` and its variance per `by` group.
+
+    `units` has one row per sampled order and group (orders outside a group
+    simply have no row, i.e. contribute 0) with the order's stratum keys.
+    """
+    by = by or ["_all"]
+    units = units.assign(_all=0, _sq=units[value] ** 2)
+    sums = (
+        units.groupby(by + STRATUM_KEYS, dropna=False)[[value, "_sq"]].sum()
+        .reset_index()
+        .merge(strata, on=STRATUM_KEYS)
+    )
+    N, n = sums["stratum_size"], sums["sample_size"]
+    s2 = ((sums["_sq"] - sums[value] ** 2 / n) / (n - 1).where(n > 1)).fillna(0).clip(lower=0)
+    sums["total"] = N / n * sums[value]
+    sums["variance"] = N ** 2 * (1 - n / N) * s2 / n
+    totals = sums.groupby(by, dropna=False)[["total", "variance"]].sum()
+    # An ungrouped estimate is always one row, even when no sampled order matches
+    return totals.reindex([0], fill_value=0.0) if by == ["_all"] else totals
+
+
+def estimate_totals(units: pd.DataFrame, strata: pd.DataFrame, value: str, by: list = None) -> pd.DataFrame:
+    """Estimated total of `value` per `by` group with its 95% interval (<value>_low / <value>_high)."""
+    est = _stratified_sums(units, strata, value, by)
+    margin = CONFIDENCE_Z * np.sqrt(est["variance"])
+    out = pd.DataFrame({value: est["total"], f"{value}_low": est["total"] - margin,
+                        f"{value}_high": est["total"] + margin})
+    return out.reset_index(drop=not by)
+
+
+def estimate_ratio(units: pd.DataFrame, strata: pd.DataFrame, numerator: str, denominator: str,
+                   name: str) -> pd.DataFrame:
+    """Estimated sum(numerator) / sum(denominator) with its linearized 95% interval."""
+    y = _stratified_sums(units, strata, numerator, None)["total"].iloc[0]
+    x = _stratified_sums(units, strata, denominator, None)["total"].iloc[0]
+    if not x:
+        return pd.DataFrame({name: [np.nan], f"{name}_low": [np.nan], f"{name}_high": [np.nan]})
+    ratio = y / x
+    residuals = units.assign(_z=units[numerator] - ratio * units[denominator])
+    margin = CONFIDENCE_Z * np.sqrt(_stratified_sums(residuals, strata, "_z", None)["variance"].iloc[0]) / x
+    return pd.DataFrame({name: [ratio], f"{name}_low": [ratio - margin], f"{name}_high": [ratio + margin]})
@@ -53,7 +53,19 @@ def validate_transformed_orders():
         print(msg)
         logging.info(msg)
 
-    # --- Summary stats ---
+    # --- Sanity check: delivery time is set exactly for delivered orders ---
+    mismatched = orders[orders["delivery_time_days"].notna() != (orders["delivered_flag"] == 1)]
+
+    if len(mismatched) > 0:
+        msg = f"⚠️ {len(mismatched)} rows have a delivery time that does not match delivered_flag"
+        print(msg)
+        logging.warning(msg)
+    else:
+        msg = "✅ Delivery times are set for delivered orders only."
+        print(msg)
+        logging.info(msg)
+
+    # --- Summary stats (delivery times of delivered orders) ---
     avg = orders["delivery_time_days"].mean()
     med = orders["delivery_time_days"].median()
     late_pct = orders["late_delivery_flag"].mean() * 100